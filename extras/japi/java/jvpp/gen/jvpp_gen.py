@@ -14,8 +14,11 @@
 # limitations under the License.
 #
 import argparse
+import hashlib
 import logging
+import multiprocessing
 import os
+import pickle
 import sys
 
 from jvppgen.types_gen import generate_types
@@ -29,22 +32,94 @@ from jvppgen.jni_gen import generate_jni
 from jvppgen.notification_gen import generate_notifications
 from jvppgen.jvpp_future_facade_gen import generate_future_facade
 from jvppgen.jvpp_callback_facade_gen import generate_callback_facade
-from jvppgen.jvpp_model import JVppModel
+from jvppgen.jvpp_model import JVppModel, load_bundle
+from jvppgen import jvpp_common_gen
 
+# Bump when the layout of the plugin cache changes
+_CACHE_VERSION = 1
 
-def generate_jvpp(root_dir, model, logger):
+# Stages of the current run, inherited by the pool workers
+_stages = None
+
+
+def generate_jvpp(root_dir, model, logger, jobs=None):
+    """Runs all generation stages on the model, the stages are independent and run in a pool of processes.
+
+    Returns the generated files: path -> content.
+    """
+    global _stages
     base_dir = "%s/target/%s" % (root_dir, model.plugin_package.replace(".", "/"))
-    generate_types(_work_dir(base_dir, "types"), model, logger)
-    generate_enums(_work_dir(base_dir, "types"), model, logger)
-    generate_unions(_work_dir(base_dir, "types"), model, logger)
-    generate_dtos(_work_dir(base_dir, "dto"), model, logger)
-    generate_java_ifc(_work_dir(base_dir), model, logger)
-    generate_java_impl(_work_dir(base_dir), model, logger)
-    generate_callbacks(_work_dir(base_dir, "callback"), model, logger)
-    generate_jni(root_dir, model, logger)
-    generate_notifications(_work_dir(base_dir, "notification"), model, logger)
-    generate_future_facade(_work_dir(base_dir, "future"), model, logger)
-    generate_callback_facade(_work_dir(base_dir, "callfacade"), model, logger)
+    _stages = ([(generate_types, _work_dir(base_dir, "types")),
+                (generate_enums, _work_dir(base_dir, "types")),
+                (generate_unions, _work_dir(base_dir, "types")),
+                (generate_dtos, _work_dir(base_dir, "dto")),
+                (generate_java_ifc, _work_dir(base_dir)),
+                (generate_java_impl, _work_dir(base_dir)),
+                (generate_callbacks, _work_dir(base_dir, "callback")),
+                (generate_jni, root_dir),
+                (generate_notifications, _work_dir(base_dir, "notification")),
+                (generate_future_facade, _work_dir(base_dir, "future")),
+                (generate_callback_facade, _work_dir(base_dir, "callfacade"))],
+               model, logger)
+    stages = range(len(_stages[0]))
+    processes = min(jobs or multiprocessing.cpu_count(), len(stages))
+    if processes <= 1:
+        results = [_generate_stage(i) for i in stages]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_generate_stage, stages, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    files = {}
+    for r in results:
+        files.update(r)
+    return files
+
+
+def _generate_stage(index):
+    stages, model, logger = _stages
+    generate, work_dir = stages[index]
+    jvpp_common_gen.generated.clear()
+    generate(work_dir, model, logger)
+    return dict(jvpp_common_gen.generated)
+
+
+def _cache_key(json_api_files, plugin_name, bundle_file=None):
+    """Hash of everything the generated files depend on: the plugin name, the json files (or the bundle holding them)
+    and the generator."""
+    gen_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.join(gen_dir, "jvpp_gen.py")]
+    sources += sorted(os.path.join(gen_dir, "jvppgen", f)
+                      for f in os.listdir(os.path.join(gen_dir, "jvppgen")) if f.endswith(".py"))
+    h = hashlib.sha1("%d %s" % (_CACHE_VERSION, plugin_name))
+    # the file names select the messages, not just their contents
+    h.update(" ".join(json_api_files))
+    if bundle_file:
+        json_api_files = [bundle_file]
+    for path in list(json_api_files) + sources:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _load_cache(path, key):
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(cache, dict) or cache.get("key") != key:
+        return None
+    return cache["files"]
+
+
+def _save_cache(path, key, files):
+    tmp = "%s.%d" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        pickle.dump({"key": key, "files": files}, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, path)
 
 
 def _work_dir(work_dir, sub_dir=None):
@@ -81,13 +156,29 @@ if __name__ == '__main__':
 
     argparser = argparse.ArgumentParser(description="VPP Java API generator")
     argparser.add_argument('-i', nargs='+', metavar='api_file.json', help="json vpp api file(s)")
+    argparser.add_argument('--bundle', help="schema bundle holding the json vpp api files given by -i")
     argparser.add_argument('--plugin_name')
     argparser.add_argument('--root_dir')
+    argparser.add_argument('--jobs', type=int, default=None, help="number of processes")
+    argparser.add_argument('--no-cache', action='store_true', help="always rebuild the model")
     args = argparser.parse_args()
 
     logger.info("Generating Java API for %s" % args.i)
     logger.debug("plugin_name: %s" % args.plugin_name)
     logger.debug("root_dir: %s" % args.root_dir)
 
-    model = JVppModel(logger, args.i, args.plugin_name)
-    generate_jvpp(args.root_dir, model, logger)
+    # Generated files are cached per plugin relative to root_dir, the build removes them once packaged
+    cache_path = "%s/.jvpp_gen.cache" % args.root_dir
+    key = _cache_key(args.i, args.plugin_name, args.bundle)
+    files = None if args.no_cache else _load_cache(cache_path, key)
+    if files is not None:
+        logger.info("Java API for %s is unchanged, restoring %d files from cache" % (args.plugin_name, len(files)))
+        for name, content in files.items():
+            jvpp_common_gen.write_file(_work_dir(args.root_dir, os.path.dirname(name)) + "/" + os.path.basename(name),
+                                       content)
+    else:
+        bundle = load_bundle(args.bundle) if args.bundle else None
+        model = JVppModel(logger, args.i, args.plugin_name, bundle)
+        generated = generate_jvpp(args.root_dir, model, logger, args.jobs)
+        files = dict((os.path.relpath(path, args.root_dir), content) for path, content in generated.items())
+        _save_cache(cache_path, key, files)
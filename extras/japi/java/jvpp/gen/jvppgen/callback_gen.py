@@ -15,6 +15,7 @@
 #
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import is_request, is_dump, is_control_ping, is_control_ping_reply
 
 
@@ -38,17 +39,15 @@ def generate_callbacks(work_dir, model, logger):
             json_filename=json_api_files,
             name=name)
 
-        with open("%s/%sCallback.java" % (work_dir, name), "w") as f:
-            f.write(callback)
+        write_file("%s/%sCallback.java" % (work_dir, name), callback)
 
     plugin_name = model.plugin_java_name
-    with open("%s/JVpp%sGlobalCallback.java" % (work_dir, plugin_name), "w") as f:
-        f.write(_GLOBAL_CALLBACK_TEMPLATE.substitute(
-            plugin_package=plugin_package,
-            json_filename=json_api_files,
-            plugin_name=plugin_name,
-            callbacks=", ".join(callbacks)
-        ))
+    write_file("%s/JVpp%sGlobalCallback.java" % (work_dir, plugin_name), _GLOBAL_CALLBACK_TEMPLATE.substitute(
+        plugin_package=plugin_package,
+        json_filename=json_api_files,
+        plugin_name=plugin_name,
+        callbacks=", ".join(callbacks)
+    ))
 
 _CALLBACK_TEMPLATE = Template("""package $plugin_package.callback;
 
@@ -15,7 +15,7 @@
 
 from string import Template
 
-from jvpp_common_gen import generate_hash_code, generate_equals, generate_to_string, generate_fields
+from jvpp_common_gen import generate_hash_code, generate_equals, generate_to_string, generate_fields, write_file
 from jvpp_model import is_request, is_reply, is_retval, is_dump, is_details, is_event, is_control_ping, \
     is_control_ping_reply
 
@@ -45,8 +45,7 @@ def _generate_message_dtos(work_dir, model, logger):
         else:
             logger.warn("Failed to generate DTO for: %s. Message type is not supported." % msg)
             continue
-        with open("%s/%s.java" % (work_dir, class_name), "w") as f:
-            f.write(dto)
+        write_file("%s/%s.java" % (work_dir, class_name), dto)
 
 
 def _generate_request_dto(msg, model, base_type):
@@ -179,8 +178,7 @@ def _generate_dump_reply_wrappers(work_dir, model, logger):
                 details_field=msg.java_name_lower,
                 dump_class=msg.request_java
             )
-            with open("%s/%sReplyDump.java" % (work_dir, details_class), "w") as f:
-                f.write(dto)
+            write_file("%s/%sReplyDump.java" % (work_dir, details_class), dto)
 
 _REPLY_DUMP_TEMPLATE = Template("""
 package $plugin_package.dto;
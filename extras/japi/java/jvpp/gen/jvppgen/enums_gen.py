@@ -14,6 +14,7 @@
 # limitations under the License.
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import Enum
 
 
@@ -34,8 +35,7 @@ def generate_enums(work_dir, model, logger):
             constants=_generate_constants(t.constants),
             value_type=t.value.type.java_name
         )
-        with open("%s/%s.java" % (work_dir, type_class_name), "w") as f:
-            f.write(type_class)
+        write_file("%s/%s.java" % (work_dir, type_class_name), type_class)
 
 _ENUM_TEMPLATE = Template("""
 package $plugin_package.types;
@@ -18,6 +18,7 @@ from string import Template
 from jni_impl_gen import generate_jni_impl
 from jni_msg_handlers_gen import generate_jni_handlers
 from jni_type_handlers_gen import generate_type_handlers
+from jvpp_common_gen import write_file
 from jvpp_model import is_control_ping, is_dump, is_request, is_control_ping_reply
 
 
@@ -26,15 +27,14 @@ def generate_jni(work_dir, model, logger):
     plugin_name = model.plugin_name
     messages = model.messages
 
-    with open("%s/jvpp_%s_gen.h" % (work_dir, plugin_name), "w") as f:
-        f.write(_JVPP_C_TEMPLATE.substitute(
-            json_filename=model.json_api_files,
-            class_cache=_generate_class_cache(plugin_name, messages),
-            api_verification=_generate_api_verification(messages),
-            type_handlers=generate_type_handlers(model, logger),
-            jni_implementations=generate_jni_impl(model),
-            msg_handlers=generate_jni_handlers(model),
-            handler_registration=_generate_handler_registration(messages)))
+    write_file("%s/jvpp_%s_gen.h" % (work_dir, plugin_name), _JVPP_C_TEMPLATE.substitute(
+        json_filename=model.json_api_files,
+        class_cache=_generate_class_cache(plugin_name, messages),
+        api_verification=_generate_api_verification(messages),
+        type_handlers=generate_type_handlers(model, logger),
+        jni_implementations=generate_jni_impl(model),
+        msg_handlers=generate_jni_handlers(model),
+        handler_registration=_generate_handler_registration(messages)))
 
 _JVPP_C_TEMPLATE = Template("""/**
  * This file contains JNI bindings for jvpp Java API.
@@ -14,6 +14,7 @@
 # limitations under the License.
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import is_control_ping, is_dump, is_request, is_event, is_control_ping_reply
 
 
@@ -26,13 +27,12 @@ def generate_callback_facade(work_dir, model, logger):
 
 
 def _generate_ifc(work_dir, model):
-    with open("%s/CallbackJVpp%s.java" % (work_dir, model.plugin_java_name), "w") as f:
-        f.write(_IFC_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            json_filename=model.json_api_files,
-            plugin_name=model.plugin_java_name,
-            methods=_generate_ifc_methods(model)
-        ))
+    write_file("%s/CallbackJVpp%s.java" % (work_dir, model.plugin_java_name), _IFC_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        json_filename=model.json_api_files,
+        plugin_name=model.plugin_java_name,
+        methods=_generate_ifc_methods(model)
+    ))
 
 _IFC_TEMPLATE = Template("""
 package $plugin_package.callfacade;
@@ -79,13 +79,12 @@ _IFC_METHOD_TEMPLATE = Template(
 
 
 def _generate_impl(work_dir, model):
-    with open("%s/CallbackJVpp%sFacade.java" % (work_dir, model.plugin_java_name), "w") as f:
-        f.write(_IMPL_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            json_filename=model.json_api_files,
-            plugin_name=model.plugin_java_name,
-            methods=_generate_impl_methods(model)
-        ))
+    write_file("%s/CallbackJVpp%sFacade.java" % (work_dir, model.plugin_java_name), _IMPL_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        json_filename=model.json_api_files,
+        plugin_name=model.plugin_java_name,
+        methods=_generate_impl_methods(model)
+    ))
 
 _IMPL_TEMPLATE = Template("""
 package $plugin_package.callfacade;
@@ -170,13 +169,12 @@ _IMPL_METHOD_TEMPLATE = Template("""    public final void $name($plugin_package.
 
 
 def _generate_callback(work_dir, model):
-    with open("%s/CallbackJVpp%sFacadeCallback.java" % (work_dir, model.plugin_java_name), "w") as f:
-        f.write(_CALLBACK_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            json_filename=model.json_api_files,
-            plugin_name=model.plugin_java_name,
-            methods=_generate_callback_methods(model)
-        ))
+    write_file("%s/CallbackJVpp%sFacadeCallback.java" % (work_dir, model.plugin_java_name), _CALLBACK_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        json_filename=model.json_api_files,
+        plugin_name=model.plugin_java_name,
+        methods=_generate_callback_methods(model)
+    ))
 
 _CALLBACK_TEMPLATE = Template("""
 package $plugin_package.callfacade;
@@ -16,6 +16,22 @@ from string import Template
 
 from jvpp_model import is_array
 
+# Files generated by this process: path -> content
+generated = {}
+
+
+def write_file(path, content):
+    """Writes content to path unless the file already holds it, so unchanged sources keep their timestamps."""
+    generated[path] = content
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return
+    except IOError:
+        pass
+    with open(path, "w") as f:
+        f.write(content)
+
 
 def generate_fields(fields, access_modifier="public"):
     return "\n".join(_FIELD_TEMPLATE
@@ -14,6 +14,7 @@
 # limitations under the License.
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import is_control_ping, is_control_ping_reply, is_dump, is_request, is_details, is_reply, is_event
 
 
@@ -25,13 +26,12 @@ def generate_future_facade(work_dir, model, logger):
 
 
 def _generate_future_jvpp(work_dir, model):
-    with open("%s/FutureJVpp%s.java" % (work_dir, model.plugin_java_name), "w") as f:
-        f.write(_FUTURE_JVPP_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            json_filename=model.json_api_files,
-            plugin_name=model.plugin_java_name,
-            methods=_generate_future_jvpp_methods(model)
-        ))
+    write_file("%s/FutureJVpp%s.java" % (work_dir, model.plugin_java_name), _FUTURE_JVPP_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        json_filename=model.json_api_files,
+        plugin_name=model.plugin_java_name,
+        methods=_generate_future_jvpp_methods(model)
+    ))
 
 _FUTURE_JVPP_TEMPLATE = Template('''
 package $plugin_package.future;
@@ -79,13 +79,12 @@ _FUTURE_JVPP_METHOD_TEMPLATE = Template('''
 
 
 def _generate_future_jvpp_facade(work_dir, model):
-    with open("%s/FutureJVpp%sFacade.java" % (work_dir, model.plugin_java_name), "w") as f:
-        f.write(_FUTURE_JVPP_FACADE_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            json_filename=model.json_api_files,
-            plugin_name=model.plugin_java_name,
-            methods=_generate_future_jvpp_facade_methods(model)
-        ))
+    write_file("%s/FutureJVpp%sFacade.java" % (work_dir, model.plugin_java_name), _FUTURE_JVPP_FACADE_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        json_filename=model.json_api_files,
+        plugin_name=model.plugin_java_name,
+        methods=_generate_future_jvpp_facade_methods(model)
+    ))
 
 _FUTURE_JVPP_FACADE_TEMPLATE = Template('''
 package $plugin_package.future;
@@ -161,13 +160,12 @@ _FUTURE_JVPP_FACADE_DUMP_TEMPLATE = Template('''
 
 
 def _generate_future_jvpp_callback(work_dir, model):
-    with open("%s/FutureJVpp%sFacadeCallback.java" % (work_dir, model.plugin_java_name), "w") as f:
-        f.write(_FUTURE_JVPP_CALLBACK_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            json_filename=model.json_api_files,
-            plugin_name=model.plugin_java_name,
-            methods=_generate_future_jvpp_callback_methods(model)
-        ))
+    write_file("%s/FutureJVpp%sFacadeCallback.java" % (work_dir, model.plugin_java_name), _FUTURE_JVPP_CALLBACK_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        json_filename=model.json_api_files,
+        plugin_name=model.plugin_java_name,
+        methods=_generate_future_jvpp_callback_methods(model)
+    ))
 
 _FUTURE_JVPP_CALLBACK_TEMPLATE = Template("""
 package $plugin_package.future;
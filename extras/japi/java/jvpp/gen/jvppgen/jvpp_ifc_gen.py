@@ -15,6 +15,7 @@
 #
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import is_request, is_dump, is_event
 
 
@@ -39,8 +40,7 @@ def generate_java_ifc(work_dir, model, logger):
         plugin_name=plugin_name,
         methods="\n".join(methods)
     )
-    with open("%s/JVpp%s.java" % (work_dir, plugin_name), "w") as f:
-        f.write(jvpp_interface)
+    write_file("%s/JVpp%s.java" % (work_dir, plugin_name), jvpp_interface)
 
 
 def _jvpp_ifc_filter(msg):
@@ -15,6 +15,7 @@
 #
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import is_request, is_dump, is_event
 
 
@@ -42,8 +43,7 @@ def generate_java_impl(work_dir, model, logger):
         plugin_name_underscore=model.plugin_name,
         methods="\n".join(methods))
 
-    with open("%s/JVpp%sImpl.java" % (work_dir, plugin_name), "w") as f:
-        f.write(jvpp_impl)
+    write_file("%s/JVpp%sImpl.java" % (work_dir, plugin_name), jvpp_impl)
 
 
 def _jvpp_impl_filter(msg):
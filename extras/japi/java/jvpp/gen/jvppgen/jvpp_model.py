@@ -312,33 +312,57 @@ def crc(block):
     return binascii.crc32(s) & 0xffffffff
 
 
+def load_bundle(path):
+    """Loads a schema bundle written by vppapigen --bundle, holding the contents of many json api files."""
+    with open(path) as f:
+        bundle = json.load(f)
+    if bundle.get('version') != 1:
+        raise ParseException("Unsupported bundle version %s in %s" % (bundle.get('version'), path))
+    return bundle
+
+
+def bundle_member(bundle, name):
+    """Rebuilds the contents of json api file name from a bundle."""
+    if name not in bundle['files']:
+        raise ParseException("No json api file %s in bundle" % name)
+    f = bundle['files'][name]
+    index = bundle['index']
+    j = dict((k, [bundle[k][index[n][1]] for n in f[k]]) for k in ('enums', 'unions', 'types', 'messages'))
+    j['aliases'] = dict((n, bundle['aliases'][n]) for n in f['aliases'])
+    j['services'] = dict((n, bundle['services'][n]) for n in f['services'])
+    return j
+
+
 class JVppModel(object):
-    def __init__(self, logger, json_api_files, plugin_name):
+    def __init__(self, logger, json_api_files, plugin_name, bundle=None):
         self.logger = logger
         # TODO(VPP-1188): provide json_file_by_definition map to improve javadoc
         self.json_api_files = json_api_files
         self.plugin_package = BASE_PACKAGE + "." + plugin_name
         self.plugin_name = plugin_name
         self.plugin_java_name = _underscore_to_camelcase_upper(plugin_name)
-        self._load_json_files(json_api_files)
+        self._load_json_files(json_api_files, bundle)
         self._parse_services()
         self._parse_messages()
         self._validate_messages()
 
-    def _load_json_files(self, json_api_files):
+    def _load_json_files(self, json_api_files, bundle):
         types = {}
         self._messages = []
         self._services = {}
         self._aliases = {}
         for file_name in json_api_files:
-            with open(file_name) as f:
-                j = json.load(f)
-                types.update({d[0]: {'type': 'enum', 'data': d} for d in j['enums']})
-                types.update({d[0]: {'type': 'type', 'data': d} for d in j['types']})
-                types.update({d[0]: {'type': 'union', 'data': d} for d in j['unions']})
-                self._messages.extend(j['messages'])
-                self._services.update(j['services'])
-                self._aliases.update(j['aliases'])
+            if bundle:
+                j = bundle_member(bundle, file_name)
+            else:
+                with open(file_name) as f:
+                    j = json.load(f)
+            types.update({d[0]: {'type': 'enum', 'data': d} for d in j['enums']})
+            types.update({d[0]: {'type': 'type', 'data': d} for d in j['types']})
+            types.update({d[0]: {'type': 'union', 'data': d} for d in j['unions']})
+            self._messages.extend(j['messages'])
+            self._services.update(j['services'])
+            self._aliases.update(j['aliases'])
 
         self._parse_types(types)
 
@@ -14,6 +14,7 @@
 # limitations under the License.
 from string import Template
 
+from jvpp_common_gen import write_file
 from jvpp_model import is_control_ping, is_control_ping_reply, is_dump, is_request
 
 
@@ -48,13 +49,12 @@ def _generate_event_registry(work_dir, model, messages):
         # that the registration should be closed
         register_callback_methods.append("    java.lang.AutoCloseable register%s(%s callback);" % (name, fqn_name))
 
-    with open("%s/%sEventRegistry.java" % (work_dir, plugin_name), "w") as f:
-        f.write(_EVENT_REGISTRY_TEMPLATE.substitute(
-            plugin_package=plugin_package,
-            plugin_name=plugin_name,
-            json_filename=model.json_api_files,
-            register_callback_methods="\n".join(register_callback_methods)
-        ))
+    write_file("%s/%sEventRegistry.java" % (work_dir, plugin_name), _EVENT_REGISTRY_TEMPLATE.substitute(
+        plugin_package=plugin_package,
+        plugin_name=plugin_name,
+        json_filename=model.json_api_files,
+        register_callback_methods="\n".join(register_callback_methods)
+    ))
 
 _EVENT_REGISTRY_TEMPLATE = Template("""
 package $plugin_package.notification;
@@ -93,14 +93,13 @@ def _generate_event_registry_impl(work_dir, model, messages):
             callback=callback
         ))
 
-    with open("%s/%sEventRegistryImpl.java" % (work_dir, plugin_name), "w") as f:
-        f.write(_EVENT_REGISTRY_IMPL_TEMPLATE.substitute(
-            plugin_package=plugin_package,
-            plugin_name=plugin_name,
-            json_filename=model.json_api_files,
-            register_callback_methods="".join(register_callback_methods),
-            handler_methods="".join(handler_methods)
-        ))
+    write_file("%s/%sEventRegistryImpl.java" % (work_dir, plugin_name), _EVENT_REGISTRY_IMPL_TEMPLATE.substitute(
+        plugin_package=plugin_package,
+        plugin_name=plugin_name,
+        json_filename=model.json_api_files,
+        register_callback_methods="".join(register_callback_methods),
+        handler_methods="".join(handler_methods)
+    ))
 
 _REGISTER_CALLBACK_IMPL_TEMPLATE = Template("""
     public java.lang.AutoCloseable register$callback(final $plugin_package.callback.$callback callback){
@@ -173,13 +172,12 @@ def _generate_global_event_callback(work_dir, model, messages):
     if callback_list:
         callbacks = " extends %s" % ", ".join(callback_list)
 
-    with open("%s/Global%sEventCallback.java" % (work_dir, plugin_name), "w") as f:
-        f.write(_GLOBAL_EVENT_CALLBACK_TEMPLATE.substitute(
-            plugin_package=plugin_package,
-            plugin_name=plugin_name,
-            json_filename=model.json_api_files,
-            callbacks=callbacks
-        ))
+    write_file("%s/Global%sEventCallback.java" % (work_dir, plugin_name), _GLOBAL_EVENT_CALLBACK_TEMPLATE.substitute(
+        plugin_package=plugin_package,
+        plugin_name=plugin_name,
+        json_filename=model.json_api_files,
+        callbacks=callbacks
+    ))
 
 _GLOBAL_EVENT_CALLBACK_TEMPLATE = Template("""
 package $plugin_package.notification;
@@ -196,12 +194,11 @@ public interface Global${plugin_name}EventCallback$callbacks {
 
 def _generate_event_registry_provider(work_dir, model):
     plugin_name = model.plugin_java_name
-    with open("%s/%sEventRegistryProvider.java" % (work_dir, plugin_name), "w") as f:
-        f.write(_EVENT_REGISTRY_PROVIDER_TEMPLATE.substitute(
-            plugin_package=model.plugin_package,
-            plugin_name=plugin_name,
-            json_filename=model.json_api_files
-        ))
+    write_file("%s/%sEventRegistryProvider.java" % (work_dir, plugin_name), _EVENT_REGISTRY_PROVIDER_TEMPLATE.substitute(
+        plugin_package=model.plugin_package,
+        plugin_name=plugin_name,
+        json_filename=model.json_api_files
+    ))
 
 _EVENT_REGISTRY_PROVIDER_TEMPLATE = Template("""
 package $plugin_package.notification;
@@ -14,7 +14,7 @@
 # limitations under the License.
 from string import Template
 
-from jvpp_common_gen import generate_hash_code, generate_equals, generate_to_string, generate_fields
+from jvpp_common_gen import generate_hash_code, generate_equals, generate_to_string, generate_fields, write_file
 from jvpp_model import Class
 
 
@@ -38,8 +38,7 @@ def generate_types(work_dir, model, logger):
             equals=generate_equals(type_class_name, fields),
             to_string=generate_to_string(type_class_name, fields)
         )
-        with open("%s/%s.java" % (work_dir, type_class_name), "w") as f:
-            f.write(type_class)
+        write_file("%s/%s.java" % (work_dir, type_class_name), type_class)
 
 _TYPE_TEMPLATE = Template("""
 package $plugin_package.types;
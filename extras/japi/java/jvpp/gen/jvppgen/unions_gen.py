@@ -15,7 +15,7 @@
 
 from string import Template
 
-from jvpp_common_gen import generate_hash_code, generate_equals, generate_to_string, generate_fields
+from jvpp_common_gen import generate_hash_code, generate_equals, generate_to_string, generate_fields, write_file
 from jvpp_model import Union
 
 
@@ -41,8 +41,7 @@ def generate_unions(work_dir, model, logger):
             equals=generate_equals(java_union_name, fields),
             to_string=generate_to_string(java_union_name, fields)
         )
-        with open("%s/%s.java" % (work_dir, java_union_name), "w") as f:
-            f.write(type_class)
+        write_file("%s/%s.java" % (work_dir, java_union_name), type_class)
 
 _UNION_TEMPLATE = Template("""
 package ${plugin_package}.types;
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2018 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Report the API changes between two revisions of the VPP tree: the
+# messages and types added, removed and changed, with their CRCs and field
+# changes, and the messages whose CRC is unchanged but which use a changed
+# type.
+#
+# The .api files of a revision are listed with one git ls-tree and read
+# with one git cat-file. Each file is parsed on its own with vppapigen's
+# parser, without its imports, and the resulting definitions are cached by
+# blob hash, so a file is only parsed once for all the revisions it is in.
+#
+from __future__ import print_function
+import argparse
+import collections
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+
+vppapigen_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', '..', 'src', 'tools', 'vppapigen')
+sys.path.insert(0, vppapigen_dir)
+import vppapigen  # noqa: E402
+
+
+def git(repo, args, data=None):
+    p = subprocess.Popen(['git', '-C', repo] + args, stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE)
+    out, _ = p.communicate(data)
+    if p.returncode:
+        raise RuntimeError('git {} failed'.format(' '.join(args)))
+    return out
+
+
+def api_files(repo, rev, paths):
+    '''Return path -> blob hash of the .api files of a revision'''
+    files = {}
+    out = git(repo, ['ls-tree', '-r', '-z', rev, '--'] + paths)
+    for entry in out.decode('utf-8').split('\0'):
+        if not entry:
+            continue
+        info, path = entry.split('\t', 1)
+        mode, kind, sha = info.split()
+        if kind == 'blob' and path.endswith('.api'):
+            files[path] = sha
+    return files
+
+
+def git_blobs(repo, shas):
+    '''Return blob hash -> contents'''
+    out = git(repo, ['cat-file', '--batch'],
+              ''.join(sha + '\n' for sha in shas).encode())
+    blobs = {}
+    pos = 0
+    for sha in shas:
+        end = out.index(b'\n', pos)
+        size = int(out[pos:end].split()[2])
+        blobs[sha] = out[end + 1:end + 1 + size].decode('utf-8')
+        pos = end + 1 + size + 1
+    return blobs
+
+
+def parser_hash():
+    '''Hash of the parser and the JSON plugin, a new version may parse a
+    file differently so it has its own cache'''
+    h = hashlib.sha1()
+    for name in ('vppapigen.py', 'vppapigen_json.py'):
+        with open(os.path.join(vppapigen_dir, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def parse(path, data):
+    '''Parse an .api file, returns its definitions as in an .api.json file
+    or an error message'''
+    try:
+        s, file_crc = vppapigen.parse_api(path, io.StringIO(data),
+                                          imports=False)
+        plugin = vppapigen.plugin_load('JSON')
+        return json.loads(plugin.run(path, s, file_crc))
+    except Exception as err:
+        return {'error': '{}: {}'.format(type(err).__name__, err)}
+
+
+class ApiCache(object):
+    '''Definitions of .api files by blob hash, in memory and on disk'''
+
+    def __init__(self, repo, cachedir):
+        self.repo = repo
+        self.directory = (os.path.join(cachedir, 'api-' + parser_hash())
+                          if cachedir else None)
+        self.apis = {}
+
+    def path(self, sha):
+        return os.path.join(self.directory, sha + '.json')
+
+    def load(self, files):
+        '''Return path -> definitions of files (path -> blob hash)'''
+        missing = []
+        for sha in set(files.values()):
+            if sha in self.apis:
+                continue
+            try:
+                with open(self.path(sha)) as f:
+                    self.apis[sha] = json.load(f)
+            except (IOError, OSError, ValueError, TypeError,
+                    AttributeError):
+                missing.append(sha)
+        if missing:
+            names = {sha: path for path, sha in files.items()}
+            blobs = git_blobs(self.repo, missing)
+            for sha in missing:
+                self.apis[sha] = parse(names[sha], blobs[sha])
+                if self.directory:
+                    vppapigen.file_write(self.path(sha),
+                                         json.dumps(self.apis[sha]))
+        return {path: self.apis[sha] for path, sha in files.items()}
+
+
+def tree_definitions(apis):
+    '''Merge the definitions of the files of a tree.
+
+    Returns messages and types (name -> (path, definition)), and the
+    files that failed to parse (path -> error).'''
+    messages = {}
+    types = {}
+    errors = {}
+    for path, api in sorted(apis.items()):
+        if 'error' in api:
+            errors[path] = api['error']
+            continue
+        for m in api['messages']:
+            messages[m[0]] = (path, m)
+        for kind in ('types', 'unions', 'enums'):
+            for t in api[kind]:
+                types[t[0]] = (path, t)
+        for name, alias in api['aliases'].items():
+            types[name] = (path, alias)
+    return messages, types, errors
+
+
+def definition_crc(d):
+    if isinstance(d, list) and isinstance(d[-1], dict):
+        return d[-1].get('crc', '-')
+    return '-'
+
+
+def field_string(f):
+    if isinstance(f, dict):
+        # Alias
+        if 'length' in f:
+            return '{}[{}]'.format(f['type'], f['length'])
+        return f['type']
+    if isinstance(f[1], int):
+        # Enum value
+        return '{} = {}'.format(f[0], f[1])
+    s = '{} {}'.format(f[0], f[1])
+    if len(f) > 2:
+        s += '[{}]'.format(f[3] if len(f) > 3 else f[2])
+    return s
+
+
+def fields(d):
+    '''Fields of a definition, name -> field'''
+    if isinstance(d, dict):
+        return {'': d}
+    return collections.OrderedDict(
+        (f[0] if isinstance(f[1], int) else f[1], f)
+        for f in d[1:] if isinstance(f, list))
+
+
+def field_changes(old, new):
+    '''List of the field changes between two definitions'''
+    a = fields(old)
+    b = fields(new)
+    changes = []
+    for name in [n for n in b if n not in a]:
+        changes.append('added {}'.format(field_string(b[name])))
+    for name in [n for n in a if n not in b]:
+        changes.append('removed {}'.format(field_string(a[name])))
+    for name in [n for n in a if n in b and a[n] != b[n]]:
+        changes.append('changed {} -> {}'.format(field_string(a[name]),
+                                                 field_string(b[name])))
+    if not changes and [n for n in a if n in b] != [n for n in b if n in a]:
+        changes.append('reordered')
+    return changes
+
+
+def type_names(d):
+    '''Names of the API types a definition uses'''
+    if isinstance(d, dict):
+        return [type_name(d['type'])]
+    return [type_name(f[0]) for f in d[1:]
+            if isinstance(f, list) and not isinstance(f[1], int)]
+
+
+def type_name(t):
+    if t.startswith('vl_api_') and t.endswith('_t'):
+        return t[len('vl_api_'):-len('_t')]
+    return t
+
+
+def compare(old, new):
+    '''Compare the definitions of two trees, as returned by
+    tree_definitions()'''
+    old_messages, old_types, _ = old
+    new_messages, new_types, _ = new
+    report = {}
+    for kind, a, b in (('messages', old_messages, new_messages),
+                       ('types', old_types, new_types)):
+        report[kind + '_added'] = [
+            [n, b[n][0], definition_crc(b[n][1])]
+            for n in sorted(b) if n not in a]
+        report[kind + '_removed'] = [
+            [n, a[n][0], definition_crc(a[n][1])]
+            for n in sorted(a) if n not in b]
+        report[kind + '_changed'] = [
+            [n, b[n][0], definition_crc(a[n][1]), definition_crc(b[n][1]),
+             field_changes(a[n][1], b[n][1])]
+            for n in sorted(a) if n in b and a[n][1] != b[n][1]]
+
+    # Types changed directly or through the types they use
+    changed = set(t[0] for t in report['types_changed'])
+    changed.update(t[0] for t in report['types_removed'])
+    while True:
+        more = set(n for n, (path, d) in new_types.items()
+                   if n not in changed and changed.intersection(type_names(d)))
+        if not more:
+            break
+        changed.update(more)
+    crc_changed = set(m[0] for m in report['messages_changed'])
+    report['messages_type_changed'] = [
+        [n, path, sorted(changed.intersection(type_names(d)))]
+        for n, (path, d) in sorted(new_messages.items())
+        if n in old_messages and n not in crc_changed and
+        changed.intersection(type_names(d))]
+    return report
+
+
+def print_report(report, errors, f=sys.stdout):
+    titles = (('messages_added', 'Messages added'),
+              ('messages_removed', 'Messages removed'),
+              ('messages_changed', 'Messages changed'),
+              ('messages_type_changed', 'Messages using changed types'),
+              ('types_added', 'Types added'),
+              ('types_removed', 'Types removed'),
+              ('types_changed', 'Types changed'))
+    for key, title in titles:
+        entries = report[key]
+        if not entries:
+            continue
+        print('{} ({}):'.format(title, len(entries)), file=f)
+        for e in entries:
+            if key.endswith('_changed') and key != 'messages_type_changed':
+                print('  {} {} -> {} ({})'.format(e[0], e[2], e[3], e[1]),
+                      file=f)
+                for c in e[4]:
+                    print('    {}'.format(c), file=f)
+            elif key == 'messages_type_changed':
+                print('  {} uses {} ({})'.format(e[0], ', '.join(e[2]), e[1]),
+                      file=f)
+            else:
+                print('  {} {} ({})'.format(e[0], e[2], e[1]), file=f)
+        print(file=f)
+    for path, error in sorted(errors.items()):
+        print('Not parsed: {}: {}'.format(path, error), file=f)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Report the API changes between two revisions')
+    argparser.add_argument('old', help='old revision')
+    argparser.add_argument('new', nargs='?', default='HEAD',
+                           help='new revision (default HEAD)')
+    argparser.add_argument('--repo', default='.',
+                           help='git repository (default .)')
+    argparser.add_argument('--path', action='append',
+                           help='directories searched for .api files '
+                           '(default src)')
+    argparser.add_argument('--cachedir', default=vppapigen.cache_dir,
+                           help='directory the parsed files are cached in, '
+                           'empty to disable')
+    argparser.add_argument('--json', action='store_true',
+                           help='write the report as JSON')
+    argparser.add_argument('--check', action='store_true',
+                           help='exit with status 1 if messages were '
+                           'removed or changed')
+    args = argparser.parse_args()
+
+    vppapigen.cache_dir = args.cachedir
+    cache = ApiCache(args.repo, args.cachedir)
+    paths = args.path or ['src']
+    old = tree_definitions(cache.load(api_files(args.repo, args.old, paths)))
+    new = tree_definitions(cache.load(api_files(args.repo, args.new, paths)))
+    report = compare(old, new)
+    errors = dict(old[2])
+    errors.update(new[2])
+
+    if args.json:
+        report['errors'] = errors
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        print_report(report, errors)
+
+    if args.check and (report['messages_removed'] or
+                       report['messages_changed'] or
+                       report['messages_type_changed']):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
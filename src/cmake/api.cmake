@@ -49,15 +49,78 @@ function(vpp_generate_api_json_header file dir component)
   )
 endfunction()
 
+function(vpp_generate_api_python_module file dir component)
+  set (output_name ${CMAKE_CURRENT_BINARY_DIR}/${file}.py)
+  get_filename_component(output_dir ${output_name} DIRECTORY)
+  if(NOT VPP_APIGEN)
+     set(VPP_APIGEN ${CMAKE_SOURCE_DIR}/tools/vppapigen/vppapigen)
+  endif()
+  add_custom_command (OUTPUT ${output_name}
+    COMMAND mkdir -p ${output_dir}
+    COMMAND ${VPP_APIGEN}
+    ARGS --includedir ${CMAKE_SOURCE_DIR} --input ${CMAKE_CURRENT_SOURCE_DIR}/${file} PYTHON --output ${output_name}
+    DEPENDS ${VPP_APIGEN} ${CMAKE_CURRENT_SOURCE_DIR}/${file}
+    COMMENT "Generating API Python module ${output_name}"
+  )
+  install(
+    FILES ${output_name}
+    DESTINATION share/vpp/api/${dir}/
+    COMPONENT ${component}
+  )
+endfunction()
+
 ##############################################################################
-# generate the .h and .json files for a .api file
+# generate the .h, .json and .py files for a .api file
 #  @param file - the name of the .api
 #  @param dir  - the install directory under ROOT/share/vpp/api to place the
-#                generated .json file
+#                generated .json and .py files
 ##############################################################################
 function(vpp_generate_api_header file dir component)
     vpp_generate_api_c_header (${file})
     vpp_generate_api_json_header (${file} ${dir} ${component})
+    vpp_generate_api_python_module (${file} ${dir} ${component})
+endfunction()
+
+##############################################################################
+# generate the .h, .json and .py files for many .api files with a single
+# vppapigen batch run, each file is parsed once for all outputs
+#  @param dir  - the install directory under ROOT/share/vpp/api to place the
+#                generated .json and .py files
+#  @param ARGN - the names of the .api files
+##############################################################################
+function(vpp_generate_api_files dir component)
+  if(NOT VPP_APIGEN)
+     set(VPP_APIGEN ${CMAKE_SOURCE_DIR}/tools/vppapigen/vppapigen)
+  endif()
+  unset(inputs)
+  unset(outputs)
+  foreach(file ${ARGN})
+    list(APPEND inputs ${CMAKE_CURRENT_SOURCE_DIR}/${file})
+    list(APPEND outputs
+      ${CMAKE_CURRENT_BINARY_DIR}/${file}.h
+      ${CMAKE_CURRENT_BINARY_DIR}/${file}.json
+      ${CMAKE_CURRENT_BINARY_DIR}/${file}.py
+    )
+    install(
+      FILES ${CMAKE_CURRENT_BINARY_DIR}/${file}.json
+            ${CMAKE_CURRENT_BINARY_DIR}/${file}.py
+      DESTINATION share/vpp/api/${dir}/
+      COMPONENT ${component}
+    )
+  endforeach()
+  add_custom_command (OUTPUT ${outputs}
+    COMMAND ${VPP_APIGEN}
+    ARGS --includedir ${CMAKE_SOURCE_DIR}
+         --basedir ${CMAKE_CURRENT_SOURCE_DIR}
+         --outputdir ${CMAKE_CURRENT_BINARY_DIR}
+         --output-modules C JSON PYTHON
+         --batch ${inputs}
+    DEPENDS ${VPP_APIGEN} ${inputs}
+            ${CMAKE_SOURCE_DIR}/tools/vppapigen/vppapigen_c.py
+            ${CMAKE_SOURCE_DIR}/tools/vppapigen/vppapigen_json.py
+            ${CMAKE_SOURCE_DIR}/tools/vppapigen/vppapigen_python.py
+    COMMENT "Generating API files for ${dir} in ${CMAKE_CURRENT_BINARY_DIR}"
+  )
 endfunction()
 
 function(vpp_add_api_files name)
@@ -65,10 +128,10 @@ function(vpp_add_api_files name)
   set(target ${name}_api_headers)
   file(RELATIVE_PATH rpath ${CMAKE_SOURCE_DIR} ${CMAKE_CURRENT_SOURCE_DIR})
   foreach(file ${ARGN})
-    vpp_generate_api_header (${file} core vpp)
-    list(APPEND header_files ${file}.h ${file}.json)
+    list(APPEND header_files ${file}.h ${file}.json ${file}.py)
     set_property(GLOBAL APPEND PROPERTY VPP_API_FILES ${rpath}/${file})
   endforeach()
+  vpp_generate_api_files (core vpp ${ARGN})
   add_custom_target(${target} DEPENDS ${header_files})
 endfunction()
 
@@ -34,8 +34,7 @@ macro(add_vpp_plugin name)
   file(RELATIVE_PATH rpath ${CMAKE_SOURCE_DIR} ${CMAKE_CURRENT_SOURCE_DIR})
   foreach(f ${PLUGIN_API_FILES})
     get_filename_component(dir ${f} DIRECTORY)
-    vpp_generate_api_header(${f} plugins ${PLUGIN_COMPONENT})
-    list(APPEND api_includes ${f}.h ${f}.json)
+    list(APPEND api_includes ${f}.h ${f}.json ${f}.py)
     set_property(GLOBAL APPEND PROPERTY VPP_API_FILES ${rpath}/${f})
     install(
       FILES ${CMAKE_CURRENT_BINARY_DIR}/${f}.h
@@ -43,6 +42,9 @@ macro(add_vpp_plugin name)
       COMPONENT ${PLUGIN_DEV_COMPONENT}
     )
   endforeach()
+  if(PLUGIN_API_FILES)
+    vpp_generate_api_files(plugins ${PLUGIN_COMPONENT} ${PLUGIN_API_FILES})
+  endif()
   add_library(${plugin_name} SHARED ${PLUGIN_SOURCES} ${api_includes})
   target_compile_options(${plugin_name} PRIVATE -Wall)
   if(NOT VPP_EXTERNAL_PROJECT)
@@ -1,6 +1,13 @@
 #!/usr/bin/env python
 
 import unittest
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import vppapigen
 from vppapigen import VPPAPI, Option, ParseError
 
 # TODO
@@ -76,5 +83,213 @@ class TestService(unittest.TestCase):
         print('R', r)
 
 
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'types.api'), 'w') as f:
+            f.write('typedef bar { u32 x; }; typedef u8 mac[6];')
+        self.cache_dir = vppapigen.cache_dir
+        self.dirlist = vppapigen.dirlist
+        vppapigen.cache_dir = os.path.join(self.directory, 'cache')
+        vppapigen.dirlist = [self.directory]
+        vppapigen.import_cache.clear()
+
+    def tearDown(self):
+        vppapigen.cache_dir = self.cache_dir
+        vppapigen.dirlist = self.dirlist
+        vppapigen.import_cache.clear()
+        shutil.rmtree(self.directory)
+
+    def parse(self):
+        vppapigen.global_types.clear()
+        vppapigen.global_crc = 0
+        parser = VPPAPI()
+        result = []
+        parser.process_imports(parser.parse_string('''
+          import "types.api";
+          define foo { vl_api_bar_t bar; vl_api_mac_t mac; };
+          define foo_reply { i32 retval; };
+        '''), False, result)
+        return sorted(vppapigen.global_types), vppapigen.global_crc, result
+
+    def test_parse_tables(self):
+        VPPAPI()
+        files = os.listdir(vppapigen.cache_dir)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.pickle'))
+        # Damaged tables are regenerated
+        with open(os.path.join(vppapigen.cache_dir, files[0]), 'w') as f:
+            f.write('x')
+        VPPAPI()
+        self.assertEqual(os.listdir(vppapigen.cache_dir), files)
+
+    def test_imports(self):
+        types, crc, result = self.parse()
+        self.assertEqual(len(vppapigen.import_cache), 1)
+        self.assertEqual(self.parse()[:2], (types, crc))
+        self.assertIn('vl_api_mac_t', types)
+        self.assertEqual(len(result), 4)
+
+    def test_unresolved_imports(self):
+        s, crc = vppapigen.parse_api('foo.api', io.StringIO(u'''
+          import "missing.api";
+          define foo { vl_api_bar_t bar; };
+          define foo_reply { i32 retval; };
+          autoreply define baz { u32 x; };
+        '''), imports=False)
+        self.assertEqual(s['Import'][0].filename, 'missing.api')
+        self.assertEqual(s['Import'][0].result, [])
+        self.assertEqual([d.name for d in s['Define']],
+                         ['foo', 'foo_reply', 'baz', 'baz_reply'])
+        self.assertEqual(len(vppapigen.import_cache), 0)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dirlist = vppapigen.dirlist
+        vppapigen.dirlist = [self.directory]
+        os.mkdir(os.path.join(self.directory, 'a'))
+        with open(os.path.join(self.directory, 'a', 'types.api'), 'w') as f:
+            f.write('typedef bar { u32 x; };')
+        for name in ('one', 'two'):
+            with open(os.path.join(self.directory, 'a', name + '.api'),
+                      'w') as f:
+                f.write('import "a/types.api";'
+                        'define {0} {{ vl_api_bar_t bar; }};'
+                        'define {0}_reply {{ i32 retval; }};'.format(name))
+
+    def tearDown(self):
+        vppapigen.dirlist = self.dirlist
+        shutil.rmtree(self.directory)
+
+    def test_batch(self):
+        outputdir = os.path.join(self.directory, 'out')
+        args = argparse.Namespace(
+            batch=[os.path.join(self.directory, 'a')], batch_list=None,
+            output_modules=['JSON', 'PYTHON'], output_module='C',
+            basedir=self.directory, outputdir=outputdir, pluginpath='',
+            jobs=2)
+        self.assertEqual(vppapigen.batch_main(args), 0)
+        outputs = [n for n in os.listdir(os.path.join(outputdir, 'a'))
+                   if not n.endswith('.manifest')]
+        self.assertEqual(sorted(outputs),
+                         ['one.api.json', 'one.api.py', 'two.api.json',
+                          'two.api.py', 'types.api.json', 'types.api.py'])
+        with open(os.path.join(outputdir, 'a', 'two.api.json')) as f:
+            j = json.load(f)
+        self.assertEqual(j['messages'][0][0], 'two')
+        self.assertEqual(j['types'][0][0], 'bar')
+
+        # Errors are reported per file
+        args.batch.append(os.path.join(self.directory, 'missing.api'))
+        self.assertEqual(vppapigen.batch_main(args), 1)
+
+    def test_incremental(self):
+        outputdir = os.path.join(self.directory, 'out')
+        args = argparse.Namespace(
+            batch=[os.path.join(self.directory, 'a')], batch_list=None,
+            output_modules=['JSON'], output_module='C',
+            basedir=self.directory, outputdir=outputdir, pluginpath='',
+            jobs=1)
+        self.assertEqual(vppapigen.batch_main(args), 0)
+        outputs = [os.path.join(outputdir, 'a', name + '.api.json')
+                   for name in ('one', 'two', 'types')]
+        for o in outputs:
+            os.utime(o, (0, 0))
+
+        def written():
+            self.assertEqual(vppapigen.batch_main(args), 0)
+            r = [os.path.getmtime(o) != 0 for o in outputs]
+            for o in outputs:
+                os.utime(o, (0, 0))
+            return r
+
+        # Nothing changed
+        self.assertEqual(written(), [False, False, False])
+
+        # Same output
+        with open(os.path.join(self.directory, 'a', 'one.api'), 'a') as f:
+            f.write('/* comment */\n')
+        self.assertEqual(written(), [False, False, False])
+
+        # Changed import
+        with open(os.path.join(self.directory, 'a', 'types.api'), 'w') as f:
+            f.write('typedef bar { u32 x; u32 y; };')
+        self.assertEqual(written(), [True, True, True])
+
+        # Output modified behind our back
+        with open(outputs[1], 'w') as f:
+            f.write('garbage')
+        self.assertEqual(written(), [False, True, False])
+
+    def test_generation_date(self):
+        outputdir = os.path.join(self.directory, 'out')
+        args = argparse.Namespace(
+            batch=[os.path.join(self.directory, 'a')], batch_list=None,
+            output_modules=['C'], output_module='C',
+            basedir=self.directory, outputdir=outputdir, pluginpath='',
+            jobs=1)
+        self.assertEqual(vppapigen.batch_main(args), 0)
+        output = os.path.join(outputdir, 'a', 'one.api.h')
+        os.utime(output, (0, 0))
+
+        # A header regenerated at another date is left alone
+        plugin = vppapigen.plugin_load('C')
+        datestring = plugin.datestring
+        plugin.datestring = 'another date'
+        try:
+            with open(os.path.join(self.directory, 'a', 'one.api'),
+                      'a') as f:
+                f.write('/* comment */\n')
+            self.assertEqual(vppapigen.batch_main(args), 0)
+            self.assertEqual(os.path.getmtime(output), 0)
+        finally:
+            plugin.datestring = datestring
+
+    def test_bundle(self):
+        outputdir = os.path.join(self.directory, 'out')
+        args = argparse.Namespace(
+            batch=[os.path.join(self.directory, 'a')], batch_list=None,
+            output_modules=['JSON'], output_module='C',
+            basedir=self.directory, outputdir=outputdir, pluginpath='',
+            jobs=1)
+        self.assertEqual(vppapigen.batch_main(args), 0)
+        args.batch = [outputdir]
+        args.basedir = outputdir
+        args.bundle = os.path.join(self.directory, 'api.bundle.json')
+        self.assertEqual(vppapigen.bundle_main(args), 0)
+        with open(args.bundle) as f:
+            bundle = json.load(f)
+
+        # The type imported by both files is stored once
+        self.assertEqual([t[0] for t in bundle['types']], ['bar'])
+        self.assertEqual(sorted(bundle['files']),
+                         ['a/one.api.json', 'a/two.api.json',
+                          'a/types.api.json'])
+        self.assertEqual(bundle['files']['a/one.api.json']['types'], ['bar'])
+        self.assertEqual(bundle['index']['bar'], ['types', 0])
+        kind, i = bundle['index']['two_reply']
+        self.assertEqual(bundle[kind][i][0], 'two_reply')
+        self.assertEqual(bundle['crcs']['two'], bundle[kind][i - 1][-1]['crc'])
+
+        # Types follow their dependencies
+        bundle = vppapigen.bundle_create([
+            ('x.api.json', {'types': [['a', ['vl_api_b_t', 'b']],
+                                      ['b', ['vl_api_c_t', 'c']]],
+                            'enums': [], 'unions': [], 'messages': [],
+                            'services': {},
+                            'aliases': {'c': {'type': 'u8', 'length': 4}}})])
+        self.assertEqual([t[0] for t in bundle['types']], ['b', 'a'])
+        self.assertEqual(bundle['index']['c'], ['aliases', None])
+
+        # Conflicting definitions are rejected
+        with open(os.path.join(outputdir, 'a', 'types.api.json'), 'w') as f:
+            json.dump({'types': [['bar', ['u8', 'x']]], 'enums': [],
+                       'unions': [], 'messages': [], 'services': {},
+                       'aliases': {}}, f)
+        self.assertEqual(vppapigen.bundle_main(args), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
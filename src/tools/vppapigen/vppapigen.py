@@ -5,9 +5,14 @@ import ply.lex as lex
 import ply.yacc as yacc
 import sys
 import argparse
+import collections
 import logging
 import binascii
+import hashlib
+import io
+import json
 import os
+import tempfile
 
 # Ensure we don't leave temporary files around
 sys.dont_write_bytecode = True
@@ -20,6 +25,25 @@ sys.dont_write_bytecode = True
 global_types = {}
 global_crc = 0
 
+# Imported files already parsed by this process, path -> (mtime, objects,
+# side effects on the global type dictionary and CRC)
+import_cache = {}
+# Lists recording the side effects of the imports being parsed
+import_recorders = []
+
+# Directory the generated parser tables are cached in, empty to disable
+cache_dir = os.environ.get(
+    'VPPAPIGEN_CACHE_DIR',
+    os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                os.path.join(os.path.expanduser('~'),
+                                             '.cache')),
+                 'vppapigen'))
+
+
+def import_record(effect):
+    for r in import_recorders:
+        r.append(effect)
+
 
 def global_type_add(name):
     '''Add new type to the dictionary of types '''
@@ -27,6 +51,14 @@ def global_type_add(name):
     if type_name in global_types:
         raise KeyError('Type is already defined: {}'.format(name))
     global_types[type_name] = True
+    import_record(('type', name))
+
+
+def global_crc_update(s):
+    '''Add s to the CRC of the file being processed'''
+    global global_crc
+    global_crc = binascii.crc32(s, global_crc)
+    import_record(('crc', s))
 
 
 # All your trace are belong to us!
@@ -126,9 +158,8 @@ class VPPAPILexer(object):
 # Side-effect: Sets global_crc
 #
 def crc_block(block):
-    global global_crc
     s = str(block).encode()
-    global_crc = binascii.crc32(s, global_crc)
+    global_crc_update(s)
     return binascii.crc32(s) & 0xffffffff
 
 
@@ -161,7 +192,6 @@ class Typedef():
 
 class Using():
     def __init__(self, name, alias):
-        global global_crc
         self.name = name
 
         if isinstance(alias, Array):
@@ -170,8 +200,7 @@ class Using():
         else:
             a = { 'type': alias.fieldtype }
         self.alias = a
-        self.crc = binascii.crc32(str(alias)) & 0xffffffff
-        global_crc = binascii.crc32(str(alias), global_crc)
+        self.crc = crc_block(alias)
         global_type_add(name)
 
     def __repr__(self):
@@ -183,7 +212,6 @@ class Union():
         self.type = 'Union'
         self.manual_print = False
         self.manual_endian = False
-        global global_crc
         self.name = name
         self.block = block
         self.crc = crc_block(block)
@@ -245,24 +273,55 @@ class Enum():
         return self.name + str(self.block)
 
 
+def import_path(filename):
+    '''Locate an imported file in the include directories'''
+    f = filename
+    for dir in dirlist_get():
+        f = os.path.join(dir, filename)
+        if os.path.exists(f):
+            break
+    return os.path.realpath(f)
+
+
 class Import():
-    def __init__(self, filename):
+    def __init__(self, filename, resolve=True):
         self.filename = filename
 
+        # Unresolved imports are only named
+        if not resolve:
+            self.path = None
+            self.result = []
+            return
+
         # Deal with imports
-        parser = VPPAPI(filename=filename)
-        dirlist = dirlist_get()
-        f = filename
-        for dir in dirlist:
-            f = os.path.join(dir, filename)
-            if os.path.exists(f):
-                break
-        if sys.version[0] == '2':
-            with open(f) as fd:
-                self.result = parser.parse_file(fd, None)
-        else:
-            with open(f, encoding='utf-8') as fd:
-                self.result = parser.parse_file(fd, None)
+        f = path = self.path = import_path(filename)
+
+        # Each file is parsed once per process, later imports of it
+        # replay the effects its parse had on the types and CRC
+        mtime = os.path.getmtime(path)
+        cached = import_cache.get(path)
+        if cached and cached[0] == mtime:
+            self.result = cached[1]
+            for kind, value in cached[2]:
+                if kind == 'type':
+                    global_type_add(value)
+                else:
+                    global_crc_update(value)
+            return
+
+        effects = []
+        import_recorders.append(effects)
+        try:
+            parser = VPPAPI(filename=filename)
+            if sys.version[0] == '2':
+                with open(f) as fd:
+                    self.result = parser.parse_file(fd, None)
+            else:
+                with open(f, encoding='utf-8') as fd:
+                    self.result = parser.parse_file(fd, None)
+        finally:
+            import_recorders.pop()
+        import_cache[path] = (mtime, self.result, effects)
 
     def __repr__(self):
         return self.filename
@@ -337,9 +396,10 @@ class ParseError(Exception):
 class VPPAPIParser(object):
     tokens = VPPAPILexer.tokens
 
-    def __init__(self, filename, logger):
+    def __init__(self, filename, logger, imports=True):
         self.filename = filename
         self.logger = logger
+        self.imports = imports
         self.fields = []
 
     def _parse_error(self, msg, coord):
@@ -385,7 +445,7 @@ class VPPAPIParser(object):
 
     def p_import(self, p):
         '''import : IMPORT STRING_LITERAL ';' '''
-        p[0] = Import(p[2])
+        p[0] = Import(p[2], self.imports)
 
     def p_service(self, p):
         '''service : SERVICE '{' service_statements '}' ';' '''
@@ -573,9 +633,10 @@ class VPPAPIParser(object):
         p[0] = p[1]
 
     # Do a second pass later to verify that user defined types are defined
+    # Without imports the types they define are unknown
     def p_typedef_specifier(self, p):
         '''type_specifier : ID '''
-        if p[1] not in global_types:
+        if self.imports and p[1] not in global_types:
             self._parse_error('Undefined type: {}'.format(p[1]),
                               self._token_coord(p, 1))
         p[0] = p[1]
@@ -594,12 +655,63 @@ class VPPAPIParser(object):
             self._parse_error('At end of input', self.filename)
 
 
+def grammar_signature():
+    '''Hash of the grammar, names the cached parser tables'''
+    parts = [' '.join(VPPAPIParser.tokens)]
+    for name in sorted(dir(VPPAPIParser)):
+        if name.startswith('p_'):
+            parts.append(getattr(VPPAPIParser, name).__doc__ or '')
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def yacc_parser(module, debug):
+    '''Build the LALR parser, with the tables cached in cache_dir.
+
+    The cached tables are only used if PLY finds their signature matches
+    the grammar. New tables are written to a temporary file and renamed,
+    so concurrent builds never read a partial file. The parser.out debug
+    output goes to cache_dir too, never to the source tree.'''
+    if debug:
+        outputdir = cache_dir or tempfile.gettempdir()
+        try:
+            if not os.path.isdir(outputdir):
+                os.makedirs(outputdir)
+        except OSError:
+            outputdir = tempfile.gettempdir()
+        return yacc.yacc(module=module, write_tables=False, debug=True,
+                         outputdir=outputdir)
+    if not cache_dir:
+        return yacc.yacc(module=module, write_tables=False, debug=False)
+
+    path = os.path.join(cache_dir, 'parsetab-{}-{}.pickle'
+                        .format(yacc.__tabversion__, grammar_signature()))
+    if os.path.exists(path):
+        try:
+            return yacc.yacc(module=module, picklefile=path, debug=False)
+        except Exception:
+            # Damaged, regenerate it
+            pass
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    except OSError:
+        return yacc.yacc(module=module, write_tables=False, debug=False)
+    tmp = '{}.{}'.format(path, os.getpid())
+    parser = yacc.yacc(module=module, picklefile=tmp, debug=False)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        pass
+    return parser
+
+
 class VPPAPI(object):
 
-    def __init__(self, debug=False, filename='', logger=None):
+    def __init__(self, debug=False, filename='', logger=None, imports=True):
         self.lexer = lex.lex(module=VPPAPILexer(filename), debug=debug)
-        self.parser = yacc.yacc(module=VPPAPIParser(filename, logger),
-                                write_tables=False, debug=debug)
+        self.parser = yacc_parser(VPPAPIParser(filename, logger, imports),
+                                  debug)
         self.logger = logger
 
     def parse_string(self, code, debug=0, lineno=1):
@@ -749,10 +861,430 @@ def dirlist_get():
     return dirlist
 
 
+# Output file suffix of each output module, default is the module name
+output_suffixes = {'C': '.h', 'JSON': '.json', 'PYTHON': '.py'}
+
+# Output plugins loaded by this process
+plugins = {}
+
+
+def plugin_load(output_module, pluginpath=''):
+    import imp
+
+    name = output_module.lower()
+    if name in plugins:
+        return plugins[name]
+
+    # Default path
+    if not pluginpath:
+        cand = []
+        cand.append(os.path.dirname(os.path.realpath(__file__)))
+        cand.append(os.path.dirname(os.path.realpath(__file__)) +
+                    '/../share/vpp/')
+        for c in cand:
+            c += '/'
+            if os.path.isfile('{}vppapigen_{}.py'.format(c, name)):
+                pluginpath = c
+                break
+    else:
+        pluginpath = pluginpath + '/'
+    if pluginpath == '':
+        raise Exception('Output plugin not found')
+    module_path = '{}vppapigen_{}.py'.format(pluginpath, name)
+
+    try:
+        plugin = imp.load_source(output_module, module_path)
+    except Exception as err:
+        raise Exception('Error importing output plugin: {}, {}'
+                        .format(module_path, err))
+    plugins[name] = plugin
+    return plugin
+
+
+def parse_api(filename, fd, debug=False, log=None, imports=True):
+    '''Parse an API file, returns the processed objects and the file CRC.
+
+    If imports is False the imported files are not read, the result has
+    none of their definitions and the types they define aren't checked.'''
+    global global_crc
+    global_types.clear()
+    global_crc = 0
+
+    parser = VPPAPI(debug=debug, filename=filename, logger=log,
+                    imports=imports)
+    parsed_objects = parser.parse_file(fd, log)
+
+    # Build a list of objects. Hash of lists.
+    result = []
+    parser.process_imports(parsed_objects, False, result)
+    s = parser.process(result)
+
+    # Add msg_id field
+    s['Define'] = add_msg_id(s['Define'])
+
+    s['Import'] = [o for o in parsed_objects if isinstance(o, Import)]
+
+    return s, global_crc & 0xffffffff
+
+
+def import_list(imports, seen=None):
+    '''Transitive list of (name, path) of the imported files'''
+    if seen is None:
+        seen = set()
+    r = []
+    for o in imports:
+        if o.path in seen:
+            continue
+        seen.add(o.path)
+        r.append((o.filename, o.path))
+        r += import_list([i for i in o.result if isinstance(i, Import)],
+                         seen)
+    return r
+
+
+#
+# Incremental generation
+#
+# Each output has a manifest (<output>.manifest) recording the hashes of
+# everything it was generated from: the input, the transitively imported
+# files, vppapigen and the plugin. An output whose manifest still matches
+# is not generated again, and an output is only written when its content
+# changes, so the build doesn't recompile what depends on it.
+#
+manifest_version = 1
+
+
+def file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+generator = {}
+
+
+def generator_hash():
+    if 'hash' not in generator:
+        generator['hash'] = file_hash(os.path.realpath(__file__))
+    return generator['hash']
+
+
+def file_write(path, data):
+    '''Write data to path unless it already holds it, returns whether it
+    was written. The file is replaced atomically.'''
+    data = data.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except (IOError, OSError):
+        pass
+    output_dir = os.path.dirname(path)
+    if output_dir and not os.path.isdir(output_dir):
+        try:
+            os.makedirs(output_dir)
+        except OSError:
+            # Created concurrently
+            pass
+    tmp = '{}.{}'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.rename(tmp, path)
+    return True
+
+
+def manifest_current(filename, source, output_module, output,
+                     pluginpath=''):
+    '''True if output was generated from the current inputs.
+
+    filename is the name of the input given to the plugin, source the
+    path of the input file.'''
+    try:
+        with open(output + '.manifest') as f:
+            m = json.load(f)
+        if m['version'] != manifest_version or m['name'] != filename or \
+           m['module'] != output_module.upper():
+            return False
+        if m['input'] != file_hash(source) or \
+           m['generator'] != generator_hash() or \
+           m['plugin'] != file_hash(
+               plugin_load(output_module, pluginpath).__file__):
+            return False
+        for name, path, h in m['imports']:
+            if import_path(name) != path or file_hash(path) != h:
+                return False
+        return m['output'] == file_hash(output)
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def output_write(filename, source, s, output_module, output, result,
+                 pluginpath=''):
+    '''Write an output and its manifest, leaving them alone if unchanged.
+
+    A plugin may tell outputs which only differ by what doesn't matter,
+    e.g. their generation date, apart with an equivalent(old, new)
+    function. The previous output is kept then.'''
+    data = result + '\n'
+    equivalent = getattr(plugin_load(output_module, pluginpath),
+                         'equivalent', None)
+    if equivalent is not None:
+        try:
+            with io.open(output, encoding='utf-8') as f:
+                old = f.read()
+            if old != data and equivalent(old, data):
+                data = old
+        except (IOError, OSError, UnicodeDecodeError):
+            pass
+    written = file_write(output, data)
+    m = {'version': manifest_version,
+         'name': filename,
+         'module': output_module.upper(),
+         'input': file_hash(source),
+         'imports': [[name, path, file_hash(path)]
+                     for name, path in import_list(s['Import'])],
+         'generator': generator_hash(),
+         'plugin': file_hash(plugin_load(output_module, pluginpath).__file__),
+         'output': file_hash(output)}
+    file_write(output + '.manifest',
+               json.dumps(m, indent=4, sort_keys=True) + '\n')
+    return written
+
+
+def generate(filename, s, file_crc, output_module, pluginpath=''):
+    plugin = plugin_load(output_module, pluginpath)
+    result = plugin.run(filename, s, file_crc)
+    if not result:
+        raise Exception('Running plugin failed: {} {}'
+                        .format(filename, result))
+    return result
+
+
+def output_path(filename, output_module, basedir, outputdir):
+    suffix = output_suffixes.get(output_module.upper(),
+                                 '.' + output_module.lower())
+    return os.path.join(outputdir,
+                        os.path.relpath(filename, basedir) + suffix)
+
+
+def batch_init(includedirs, cachedir):
+    global dirlist, cache_dir
+    dirlist = includedirs
+    cache_dir = cachedir
+
+
+def batch_file(job):
+    '''Generate every output of one API file from a single parse.
+
+    Runs in a pool worker, returns an error message or None.'''
+    filename, outputs, pluginpath = job
+    try:
+        outputs = [(m, path) for m, path in outputs
+                   if not manifest_current(filename, filename, m, path,
+                                           pluginpath)]
+        if not outputs:
+            return None
+        if sys.version[0] == '2':
+            with open(filename) as fd:
+                s, file_crc = parse_api(filename, fd)
+        else:
+            with open(filename, encoding='utf-8') as fd:
+                s, file_crc = parse_api(filename, fd)
+        for output_module, path in outputs:
+            result = generate(filename, s, file_crc, output_module,
+                              pluginpath)
+            output_write(filename, filename, s, output_module, path, result,
+                         pluginpath)
+    except Exception as err:
+        return '{}: {}: {}'.format(filename, type(err).__name__, err)
+    return None
+
+
+def batch_inputs(paths, listfiles, suffix='.api'):
+    '''API files named on the command line, in list files and in
+    directories (searched recursively for names ending in suffix)'''
+    paths = list(paths or [])
+    for listfile in listfiles or []:
+        with open(listfile) as f:
+            paths += [line.strip() for line in f if line.strip()]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, n) for n in sorted(names)
+                          if n.endswith(suffix)]
+        else:
+            files.append(path)
+    return files
+
+
+def batch_main(args):
+    '''Generate the outputs of many API files with a pool of processes.
+
+    Every file is parsed once for all output modules. Each worker keeps
+    its parsed imports, so the common type files are parsed once per
+    worker rather than once per file and output.'''
+    import multiprocessing
+
+    files = batch_inputs(args.batch, args.batch_list)
+    modules = args.output_modules or [args.output_module]
+    basedir = args.basedir or os.getcwd()
+    jobs = [(f, [(m, output_path(f, m, basedir, args.outputdir))
+                 for m in modules], args.pluginpath)
+            for f in files]
+
+    processes = args.jobs or multiprocessing.cpu_count()
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        batch_init(dirlist, cache_dir)
+        errors = [batch_file(j) for j in jobs]
+    else:
+        pool = multiprocessing.Pool(processes, batch_init,
+                                    (dirlist, cache_dir))
+        try:
+            errors = pool.map(batch_file, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    errors = [e for e in errors if e]
+    for e in errors:
+        print(e, file=sys.stderr)
+    return 1 if errors else 0
+
+
+#
+# Schema bundle
+#
+# A single file holding the definitions of many .api.json files, so a
+# binding loads the whole API with one read instead of walking the tree.
+# It has the keys of an .api.json file with every definition stored once
+# and the types in dependency order, plus:
+#   version - bundle_version
+#   crcs    - message name -> CRC
+#   index   - name -> [key, position in bundle[key]] of every type, enum,
+#             union and message, aliases have no position
+#   files   - name of each .api.json file -> its vl_api_version and the
+#             names it defines, enough to rebuild the file
+#
+bundle_version = 1
+
+
+def bundle_type_name(t):
+    if t.startswith('vl_api_') and t.endswith('_t'):
+        return t[len('vl_api_'):-len('_t')]
+    return t
+
+
+def bundle_dependencies(kind, d):
+    if kind == 'enums':
+        return []
+    if kind == 'aliases':
+        return [d['type']]
+    return [bundle_type_name(f[0]) for f in d[1:] if isinstance(f, list)]
+
+
+def bundle_add(definitions, kind, name, d, filename):
+    if name in definitions:
+        if definitions[name] != (kind, d):
+            raise ValueError('Conflicting definitions of {} in {}'
+                             .format(name, filename))
+        return
+    definitions[name] = (kind, d)
+
+
+def bundle_create(members):
+    '''Create a bundle from a list of (name, decoded .api.json file)'''
+    types = collections.OrderedDict()
+    messages = collections.OrderedDict()
+    services = {}
+    files = {}
+    for filename, api in members:
+        for kind in ('enums', 'unions', 'types'):
+            for d in api[kind]:
+                bundle_add(types, kind, d[0], d, filename)
+        for name in sorted(api['aliases']):
+            bundle_add(types, 'aliases', name, api['aliases'][name],
+                       filename)
+        for d in api['messages']:
+            bundle_add(messages, 'messages', d[0], d, filename)
+        for name, service in api['services'].items():
+            if services.setdefault(name, service) != service:
+                raise ValueError('Conflicting services {} in {}'
+                                 .format(name, filename))
+        f = {k: [d[0] for d in api[k]]
+             for k in ('enums', 'unions', 'types', 'messages')}
+        f['aliases'] = sorted(api['aliases'])
+        f['services'] = sorted(api['services'])
+        f['vl_api_version'] = api.get('vl_api_version')
+        files[filename] = f
+
+    # Depth first, so that a type follows the types it uses
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if name in path:
+            raise ValueError('Circular type definition {}'.format(
+                ' -> '.join(path[path.index(name):] + [name])))
+        for d in bundle_dependencies(*types[name]):
+            if d in types:
+                visit(d, path + [name])
+        state[name] = 'done'
+        order.append(name)
+    for name in types:
+        visit(name, [])
+
+    bundle = {'version': bundle_version, 'enums': [], 'unions': [],
+              'types': [], 'aliases': {}, 'messages': [],
+              'services': services, 'crcs': {}, 'index': {},
+              'files': files}
+    for name in order:
+        kind, d = types[name]
+        if kind == 'aliases':
+            bundle['aliases'][name] = d
+            bundle['index'][name] = [kind, None]
+        else:
+            bundle['index'][name] = [kind, len(bundle[kind])]
+            bundle[kind].append(d)
+    for name, (kind, d) in messages.items():
+        if name in bundle['index']:
+            raise ValueError('Message {} has the name of a type'
+                             .format(name))
+        bundle['index'][name] = [kind, len(bundle[kind])]
+        bundle[kind].append(d)
+        bundle['crcs'][name] = d[-1]['crc']
+    return bundle
+
+
+def bundle_main(args):
+    '''Write the bundle of the .api.json files given in batch mode, named
+    by their path relative to --basedir.'''
+    basedir = args.basedir or os.getcwd()
+    members = []
+    for path in batch_inputs(args.batch, args.batch_list, '.api.json'):
+        with open(path) as f:
+            members.append((os.path.relpath(path, basedir), json.load(f)))
+    try:
+        bundle = bundle_create(members)
+    except ValueError as err:
+        print('{}: {}'.format(args.bundle, err), file=sys.stderr)
+        return 1
+    file_write(args.bundle, json.dumps(bundle, separators=(',', ':'),
+                                       sort_keys=True) + '\n')
+    return 0
+
+
 #
 # Main
 #
 def main():
+    global cache_dir
     cliparser = argparse.ArgumentParser(description='VPP API generator')
     cliparser.add_argument('--pluginpath', default=""),
     cliparser.add_argument('--includedir', action='append'),
@@ -763,18 +1295,45 @@ def main():
         cliparser.add_argument('--input',
                                type=argparse.FileType('r', encoding='UTF-8'),
                                default=sys.stdin)
-    cliparser.add_argument('--output', nargs='?', type=argparse.FileType('w'),
-                           default=sys.stdout)
+    cliparser.add_argument('--output', nargs='?')
 
     cliparser.add_argument('output_module', nargs='?', default='C')
     cliparser.add_argument('--debug', action='store_true')
+    cliparser.add_argument('--cachedir', default=cache_dir,
+                           help='directory to cache parser tables in, '
+                           'empty to disable')
     cliparser.add_argument('--show-name', nargs=1)
+    cliparser.add_argument('--batch', nargs='+', metavar='PATH',
+                           help='API files or directories to generate '
+                           'in batch mode')
+    cliparser.add_argument('--batch-list', action='append', metavar='FILE',
+                           help='file listing API files for batch mode')
+    cliparser.add_argument('--output-modules', nargs='+', metavar='MODULE',
+                           help='output modules generated in batch mode')
+    cliparser.add_argument('--outputdir', default='.',
+                           help='batch mode output directory')
+    cliparser.add_argument('--basedir',
+                           help='batch mode outputs are named by the input '
+                           'path relative to this directory')
+    cliparser.add_argument('--jobs', type=int,
+                           help='batch mode processes')
+    cliparser.add_argument('--bundle', metavar='FILE',
+                           help='write the schema bundle of the .api.json '
+                           'files given in batch mode to FILE')
     args = cliparser.parse_args()
 
     dirlist_add(args.includedir)
+    cache_dir = args.cachedir
     if not args.debug:
         sys.excepthook = exception_handler
 
+    if args.bundle:
+        sys.exit(bundle_main(args))
+    if args.batch or args.batch_list:
+        sys.exit(batch_main(args))
+    incremental = (args.output and args.input != sys.stdin and
+                   not args.debug)
+
     # Filename
     if args.show_name:
         filename = args.show_name[0]
@@ -789,18 +1348,12 @@ def main():
         logging.basicConfig()
     log = logging.getLogger('vppapigen')
 
-    parser = VPPAPI(debug=args.debug, filename=filename, logger=log)
-    parsed_objects = parser.parse_file(args.input, log)
-
-    # Build a list of objects. Hash of lists.
-    result = []
-    parser.process_imports(parsed_objects, False, result)
-    s = parser.process(result)
-
-    # Add msg_id field
-    s['Define'] = add_msg_id(s['Define'])
+    if incremental and manifest_current(filename, args.input.name,
+                                        args.output_module, args.output,
+                                        args.pluginpath):
+        return
 
-    file_crc = global_crc & 0xffffffff
+    s, file_crc = parse_api(filename, args.input, args.debug, log)
 
     #
     # Debug
@@ -815,40 +1368,16 @@ def main():
     #
     # Generate representation
     #
-    import imp
-
-    # Default path
-    pluginpath = ''
-    if not args.pluginpath:
-        cand = []
-        cand.append(os.path.dirname(os.path.realpath(__file__)))
-        cand.append(os.path.dirname(os.path.realpath(__file__)) +
-                    '/../share/vpp/')
-        for c in cand:
-            c += '/'
-            if os.path.isfile('{}vppapigen_{}.py'
-                              .format(c, args.output_module.lower())):
-                pluginpath = c
-                break
+    result = generate(filename, s, file_crc, args.output_module,
+                      args.pluginpath)
+    if incremental:
+        output_write(filename, args.input.name, s, args.output_module,
+                     args.output, result, args.pluginpath)
+    elif args.output:
+        with open(args.output, 'w') as f:
+            print(result, file=f)
     else:
-        pluginpath = args.pluginpath + '/'
-    if pluginpath == '':
-        raise Exception('Output plugin not found')
-    module_path = '{}vppapigen_{}.py'.format(pluginpath,
-                                             args.output_module.lower())
-
-    try:
-        plugin = imp.load_source(args.output_module, module_path)
-    except Exception as err:
-        raise Exception('Error importing output plugin: {}, {}'
-                        .format(module_path, err))
-
-    result = plugin.run(filename, s, file_crc)
-    if result:
-        print(result, file=args.output)
-    else:
-        raise Exception('Running plugin failed: {} {}'
-                        .format(filename, result))
+        print(result)
 
 
 if __name__ == '__main__':
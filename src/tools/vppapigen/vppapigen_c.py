@@ -1,11 +1,13 @@
 # C generation
 import datetime
 import os
+import re
 import time
 
 datestring = datetime.datetime.utcfromtimestamp(
     int(os.environ.get('SOURCE_DATE_EPOCH', time.time())))
 input_filename = 'inputfil'
+date_line = re.compile(r'^ \* VLIB API definitions .*$', re.M)
 top_boilerplate = '''\
 /*
  * VLIB API definitions {datestring}
@@ -301,3 +303,8 @@ def run(input_filename, s, file_crc):
                                         file_crc=file_crc)
 
     return output
+
+
+def equivalent(old, new):
+    '''Whether two headers only differ by their generation date'''
+    return date_line.sub('', old) == date_line.sub('', new)
@@ -0,0 +1,137 @@
+# Python generation
+#
+# Emits a module per .api file that vpp_papi loads instead of the .api.json
+# file: the definitions as Python literals, message name and CRC constants,
+# service metadata, and precompiled pack / unpack functions for every
+# message with a fixed layout of base types.
+import imp
+import os
+import pprint
+import struct
+
+# Reuse the JSON plugin's walkers, the definitions must be identical
+json_plugin = imp.load_source(
+    'vppapigen_json',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 'vppapigen_json.py'))
+
+# struct format characters of the base types, all in network byte order
+base_formats = {'u8': 'B', 'u16': 'H', 'u32': 'I', 'i32': 'i', 'u64': 'Q',
+                'f64': 'd', 'bool': '?'}
+
+header = '''\
+#
+# Generated by vppapigen from {filename}, do not edit.
+#
+import collections
+import struct
+from vpp_papi.vpp_serializer import VPPSerializerValueError
+
+
+def u8(data, num, name):
+    if not data:
+        return b''
+    if len(data) > num:
+        raise VPPSerializerValueError(
+            'Fixed list length error for "{{}}", got: {{}} expected: {{}}'
+            .format(name, len(data), num))
+    return data
+
+
+def check_length(data, offset, size, name):
+    if len(data) - offset < size:
+        raise VPPSerializerValueError(
+            'Invalid length for "{{}}" got {{}} expected {{}}'
+            .format(name, len(data) - offset, size))
+
+
+vl_api_version = {version!r}
+'''
+
+message_template = '''
+
+t_{name} = collections.namedtuple({name!r}, {fields!r}, rename=True)
+s_{name} = struct.Struct({format!r})
+
+
+def pack_{name}(data, kwargs=None):
+    g = data.get
+    return s_{name}.pack(
+        {args})
+
+
+def unpack_{name}(data, offset=0, result=None, ntc=False):
+    check_length(data, offset, {size}, {name!r})
+    return t_{name}._make(s_{name}.unpack_from(data, offset)), {size}
+'''
+
+
+def struct_format(d):
+    """Return the struct format of a message, or None if it has fields
+    that need the runtime serializer (variable length, strings, enums and
+    other API types)."""
+    f = []
+    for b in d.block:
+        if b.type == 'Field' and b.fieldtype in base_formats:
+            f.append(base_formats[b.fieldtype])
+        elif (b.type == 'Array' and b.fieldtype == 'u8' and
+              not b.lengthfield and isinstance(b.length, int) and
+              b.length > 0):
+            f.append('{}s'.format(b.length))
+        else:
+            return None
+    return '>' + ''.join(f)
+
+
+def pack_argument(b):
+    if b.type == 'Array':
+        return 'u8(g({0!r}), {1}, {0!r})'.format(b.fieldname, b.length)
+    return 'g({!r}) or 0'.format(b.fieldname)
+
+
+def walk_compiled(s):
+    r = []
+    names = []
+    for d in s:
+        f = struct_format(d)
+        if f is None:
+            continue
+        r.append(message_template.format(
+            name=d.name,
+            fields=[b.fieldname for b in d.block],
+            format=f,
+            args=',\n        '.join(pack_argument(b) for b in d.block),
+            size=struct.calcsize(f)))
+        names.append(d.name)
+    r.append('\n\ncompiled = {\n')
+    for n in names:
+        r.append('    {0!r}: (t_{0}, pack_{0}, unpack_{0}),\n'.format(n))
+    r.append('}\n')
+    return ''.join(r)
+
+
+def literal(name, value):
+    return '\n{} = {}\n'.format(name, pprint.pformat(value))
+
+
+#
+# Plugin entry point
+#
+def run(filename, s, file_crc):
+    typedefs = [o for o in s['types'] if o.__class__.__name__ == 'Typedef']
+    unions = [o for o in s['types'] if o.__class__.__name__ == 'Union']
+    enums = [o for o in s['types'] if o.__class__.__name__ == 'Enum']
+
+    r = [header.format(filename=os.path.basename(filename),
+                       version=hex(file_crc))]
+    r.append(literal('types', json_plugin.walk_defs(typedefs)))
+    r.append(literal('messages', json_plugin.walk_defs(s['Define'])))
+    r.append(literal('unions', json_plugin.walk_defs(unions)))
+    r.append(literal('enums', json_plugin.walk_enums(enums)))
+    r.append(literal('services', json_plugin.walk_services(s['Service'])))
+    r.append(literal('aliases', s['Alias']))
+    r.append(literal('message_crcs',
+                     {d.name: '{}_{:08x}'.format(d.name, d.crc)
+                      for d in s['Define']}))
+    r.append(walk_compiled(s['Define']))
+    return ''.join(r)
@@ -44,6 +44,8 @@ bool timeout_in_progress;
  *  Clients are expected to collate events on a queue.
  *  vac_write() -> suspends RX thread
  *  vac_read() -> resumes RX thread
+ *  vac_read_nowait() -> as vac_read(), but returns immediately if there
+ *  is nothing to read
  */
 
 #define vl_typedefs             /* define message structures */
@@ -430,8 +432,9 @@ vac_disconnect (void)
   return (0);
 }
 
-int
-vac_read (char **p, int *l, u16 timeout)
+static int
+vac_read_internal (char **p, int *l, u16 timeout,
+                   svm_q_conditional_wait_t cond)
 {
   svm_queue_t *q;
   api_main_t *am = &api_main;
@@ -456,7 +459,7 @@ vac_read (char **p, int *l, u16 timeout)
   q = am->vl_input_queue;
 
  again:
-  rv = svm_queue_sub(q, (u8 *)&msg, SVM_Q_WAIT, 0);
+  rv = svm_queue_sub(q, (u8 *)&msg, cond, 0);
 
   if (rv == 0) {
     u16 msg_id = ntohs(*((u16 *)msg));
@@ -495,7 +498,7 @@ vac_read (char **p, int *l, u16 timeout)
     *p = (char *)msg;
 
 
-  } else {
+  } else if (cond != SVM_Q_NOWAIT) {
     fprintf(stderr, "Read failed with %d\n", rv);
   }
   /* Let timeout notification thread know we're done */
@@ -513,6 +516,22 @@ vac_read (char **p, int *l, u16 timeout)
   return -1;
 }
 
+int
+vac_read (char **p, int *l, u16 timeout)
+{
+  return vac_read_internal (p, l, timeout, SVM_Q_WAIT);
+}
+
+/*
+ * Non-blocking read. Returns non-zero if no message could be dequeued
+ * right away (-2 if the queue is empty).
+ */
+int
+vac_read_nowait (char **p, int *l)
+{
+  return vac_read_internal (p, l, 0, SVM_Q_NOWAIT);
+}
+
 /*
  * XXX: Makes the assumption that client_index is the first member
  */
@@ -23,6 +23,7 @@ int vac_connect(char * name, char * chroot_prefix, vac_callback_t cb,
     int rx_qlen);
 int vac_disconnect(void);
 int vac_read(char **data, int *l, unsigned short timeout);
+int vac_read_nowait(char **data, int *l);
 int vac_write(char *data, int len);
 void vac_free(void * msg);
 
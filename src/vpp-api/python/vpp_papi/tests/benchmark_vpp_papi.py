@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Benchmarks for the Python API binding.
+#
+# Measures serializer pack/unpack rates for representative messages,
+# round-trip latency and pipelined throughput per transport, and decode
+# rate and memory use of a large dump. The socket transport is measured
+# against the stand-in server, shared memory only if a running VPP is
+# given with --shm.
+#
+# Results are written as JSON and can be compared against a baseline:
+#
+#   python -m vpp_papi.tests.benchmark_vpp_papi --output baseline.json
+#   python -m vpp_papi.tests.benchmark_vpp_papi --baseline baseline.json
+#
+
+from __future__ import print_function
+import argparse
+import json
+import multiprocessing
+import itertools
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from vpp_papi import VPP
+from vpp_papi.vpp_papi import process_json_file
+from vpp_papi.vpp_stub_server import VppStubServer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Definitions of the benchmarked messages, as generated by vppapigen.
+# Used unless --api-dir points at an installed set of .api.json files.
+api_json = {
+    'types': [
+        ['message_table_entry',
+         ['u16', 'index'], ['u8', 'name', 64], {'crc': '0x913bf1c6'}],
+        ['fib_mpls_label',
+         ['u8', 'is_uniform'], ['u32', 'label'], ['u8', 'ttl'],
+         ['u8', 'exp'], {'crc': '0xc93bf35c'}],
+        ['acl_rule',
+         ['u8', 'is_permit'], ['u8', 'is_ipv6'], ['u8', 'src_ip_addr', 16],
+         ['u8', 'src_ip_prefix_len'], ['u8', 'dst_ip_addr', 16],
+         ['u8', 'dst_ip_prefix_len'], ['u8', 'proto'],
+         ['u16', 'srcport_or_icmptype_first'],
+         ['u16', 'srcport_or_icmptype_last'],
+         ['u16', 'dstport_or_icmpcode_first'],
+         ['u16', 'dstport_or_icmpcode_last'],
+         ['u8', 'tcp_flags_mask'], ['u8', 'tcp_flags_value'],
+         {'crc': '0x6f99bf4d'}],
+    ],
+    'messages': [
+        ['sockclnt_create',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['u8', 'name', 64],
+         {'crc': '0xdf2cf94d'}],
+        ['sockclnt_create_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['i32', 'response'], ['u32', 'index'],
+         ['u16', 'count'],
+         ['vl_api_message_table_entry_t', 'message_table', 0, 'count'],
+         {'crc': '0xa134a8a8'}],
+        ['sockclnt_delete',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['u32', 'index'], {'crc': '0x8ac76db6'}],
+        ['sockclnt_delete_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'response'],
+         {'crc': '0x8f38b1ee'}],
+        ['control_ping',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], {'crc': '0x51077d14'}],
+        ['control_ping_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'retval'],
+         ['u32', 'client_index'], ['u32', 'vpe_pid'],
+         {'crc': '0xf6b0b8ca'}],
+        ['ip_add_del_route',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['u32', 'next_hop_sw_if_index'],
+         ['u32', 'table_id'], ['u32', 'classify_table_index'],
+         ['u32', 'next_hop_table_id'], ['u32', 'next_hop_id'],
+         ['u8', 'is_add'], ['u8', 'is_drop'], ['u8', 'is_unreach'],
+         ['u8', 'is_prohibit'], ['u8', 'is_ipv6'], ['u8', 'is_local'],
+         ['u8', 'is_classify'], ['u8', 'is_multipath'],
+         ['u8', 'is_resolve_host'], ['u8', 'is_resolve_attached'],
+         ['u8', 'is_dvr'], ['u8', 'is_source_lookup'],
+         ['u8', 'is_udp_encap'], ['u8', 'next_hop_weight'],
+         ['u8', 'next_hop_preference'], ['u8', 'next_hop_proto'],
+         ['u8', 'dst_address_length'], ['u8', 'dst_address', 16],
+         ['u8', 'next_hop_address', 16], ['u8', 'next_hop_n_out_labels'],
+         ['u32', 'next_hop_via_label'],
+         ['vl_api_fib_mpls_label_t', 'next_hop_out_label_stack', 0,
+          'next_hop_n_out_labels'],
+         {'crc': '0x4219d62d'}],
+        ['ip_add_del_route_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'retval'],
+         ['u32', 'stats_index'], {'crc': '0x1992deab'}],
+        ['acl_add_replace',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['u32', 'acl_index'], ['u8', 'tag', 64],
+         ['u32', 'count'], ['vl_api_acl_rule_t', 'r', 0, 'count'],
+         {'crc': '0xe839997e'}],
+        ['acl_add_replace_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['u32', 'acl_index'],
+         ['i32', 'retval'], {'crc': '0xac407b0c'}],
+        ['sw_interface_dump',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['u8', 'name_filter_valid'],
+         ['u8', 'name_filter', 49], {'crc': '0x63f5e3b7'}],
+        ['sw_interface_details',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['u32', 'sw_if_index'],
+         ['u32', 'sup_sw_if_index'], ['u32', 'l2_address_length'],
+         ['u8', 'l2_address', 8], ['u8', 'interface_name', 64],
+         ['u8', 'admin_up_down'], ['u8', 'link_up_down'],
+         ['u8', 'link_duplex'], ['u32', 'link_speed'], ['u16', 'link_mtu'],
+         ['u32', 'mtu', 4], ['u32', 'sub_id'], ['u8', 'sub_dot1ad'],
+         ['u8', 'sub_dot1ah'], ['u8', 'sub_number_of_tags'],
+         ['u16', 'sub_outer_vlan_id'], ['u16', 'sub_inner_vlan_id'],
+         ['u8', 'sub_exact_match'], ['u8', 'sub_default'],
+         ['u8', 'sub_outer_vlan_id_any'], ['u8', 'sub_inner_vlan_id_any'],
+         ['u32', 'vtr_op'], ['u32', 'vtr_push_dot1q'], ['u32', 'vtr_tag1'],
+         ['u32', 'vtr_tag2'], ['u8', 'tag', 64], ['u16', 'outer_tag'],
+         ['u8', 'b_dmac', 6], ['u8', 'b_smac', 6], ['u16', 'b_vlanid'],
+         ['u32', 'i_sid'], {'crc': '0xe4ee7eb6'}],
+    ],
+    'unions': [],
+    'enums': [],
+    'aliases': {},
+    'services': {
+        'sockclnt_create': {'reply': 'sockclnt_create_reply'},
+        'sockclnt_delete': {'reply': 'sockclnt_delete_reply'},
+        'control_ping': {'reply': 'control_ping_reply'},
+        'ip_add_del_route': {'reply': 'ip_add_del_route_reply'},
+        'acl_add_replace': {'reply': 'acl_add_replace_reply'},
+        'sw_interface_dump': {'reply': 'sw_interface_details',
+                              'stream': True},
+    },
+}
+
+
+def ip_add_del_route_args():
+    return {'_vl_msg_id': 1, 'context': 1, 'is_add': 1,
+            'dst_address_length': 24,
+            'dst_address': b'\x0a\x00\x01\x00',
+            'next_hop_address': b'\x0a\x00\x00\x01',
+            'next_hop_sw_if_index': 1,
+            'next_hop_n_out_labels': 2,
+            'next_hop_out_label_stack': [{'label': 100, 'ttl': 64},
+                                         {'label': 200, 'ttl': 64}]}
+
+
+def acl_add_replace_args(rules=1000):
+    r = [{'is_permit': 1,
+          'src_ip_addr': b'\x0a\x00\x00\x00', 'src_ip_prefix_len': 8,
+          'dst_ip_addr': b'\xc0\xa8\x00\x00', 'dst_ip_prefix_len': 16,
+          'proto': 6,
+          'srcport_or_icmptype_first': 0,
+          'srcport_or_icmptype_last': 65535,
+          'dstport_or_icmpcode_first': i,
+          'dstport_or_icmpcode_last': i} for i in range(rules)]
+    return {'_vl_msg_id': 1, 'context': 1, 'acl_index': 0xffffffff,
+            'tag': b'benchmark', 'count': rules, 'r': r}
+
+
+def sw_interface_details_args():
+    return {'_vl_msg_id': 1, 'context': 1, 'sw_if_index': 1,
+            'sup_sw_if_index': 1, 'l2_address_length': 6,
+            'l2_address': b'\x02\x01\x00\x00\x00\x01',
+            'interface_name': b'GigabitEthernet0/8/0',
+            'admin_up_down': 1, 'link_up_down': 1, 'link_mtu': 1500,
+            'mtu': [1500, 0, 0, 0]}
+
+
+def measure_rate(func, duration):
+    """Call func repeatedly for duration seconds, return calls per second."""
+    n = 0
+    start = time.time()
+    while True:
+        for i in range(100):
+            func()
+        n += 100
+        elapsed = time.time() - start
+        if elapsed >= duration:
+            return n / elapsed
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+
+def bench_serializer(messages, duration):
+    results = {}
+    for name, args in [('ip_add_del_route', ip_add_del_route_args()),
+                       ('acl_add_replace', acl_add_replace_args()),
+                       ('sw_interface_details',
+                        sw_interface_details_args())]:
+        msgdef = messages[name]
+        b = msgdef.pack(args)
+        rate = measure_rate(lambda: msgdef.pack(args), duration)
+        results['serializer.pack.' + name] = {
+            'msgs_per_sec': rate,
+            'bytes_per_sec': rate * len(b)}
+        rate = measure_rate(lambda: msgdef.unpack(b), duration)
+        results['serializer.unpack.' + name] = {
+            'msgs_per_sec': rate,
+            'bytes_per_sec': rate * len(b)}
+    return results
+
+
+def bench_transport(vpp, name, duration, window, dump_count):
+    results = {}
+
+    # Round trip latency
+    samples = []
+    end = time.time() + duration
+    while time.time() < end:
+        start = time.time()
+        vpp.api.control_ping()
+        samples.append((time.time() - start) * 1000000)
+    results['transport.{}.latency'.format(name)] = {
+        'p50_us': percentile(samples, 50),
+        'p99_us': percentile(samples, 99)}
+
+    # Pipelined throughput, window requests outstanding
+    msgdef = vpp.messages['control_ping']
+    i = vpp.control_ping_index
+    client_index = getattr(vpp.transport, 'socket_index', 0)
+    b = msgdef.pack({'_vl_msg_id': i, 'client_index': client_index,
+                     'context': 1})
+    n = 0
+    start = time.time()
+    while True:
+        for j in range(window):
+            vpp.transport.write(b)
+        for j in range(window):
+            if not vpp.transport.read():
+                raise VPP.VPPIOError(2, 'read failed')
+        n += window
+        elapsed = time.time() - start
+        if elapsed >= duration:
+            break
+    results['transport.{}.pipelined'.format(name)] = {
+        'msgs_per_sec': n / elapsed,
+        'bytes_per_sec': n * len(b) / elapsed}
+
+    # Large dump decode, memory is traced in a separate run as tracing
+    # slows down allocation heavily.
+    start = time.time()
+    r = vpp.api.sw_interface_dump()
+    elapsed = time.time() - start
+    if len(r) != dump_count:
+        raise VPP.VPPValueError('Dump returned {} of {} details'
+                                .format(len(r), dump_count))
+    del r
+    d = {'msgs_per_sec': dump_count / elapsed}
+    if tracemalloc:
+        tracemalloc.start()
+        vpp.api.sw_interface_dump()
+        d['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    results['transport.{}.dump'.format(name)] = d
+    return results
+
+
+def run_server(apifile, address, dump_count, ready):
+    server = VppStubServer([apifile], server_address=address)
+    details = sw_interface_details_args()
+    server.set_reply_handler(
+        'sw_interface_dump',
+        lambda request: itertools.repeat(details, dump_count))
+    server.start()
+    ready.set()
+    while True:
+        time.sleep(1)
+
+
+def bench_socket(apifile, directory, duration, window, dump_count):
+    address = os.path.join(directory, 'api.sock')
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server,
+                                     args=(apifile, address, dump_count,
+                                           ready))
+    server.daemon = True
+    server.start()
+    try:
+        ready.wait(10)
+        vpp = VPP([apifile], use_socket=True, server_address=address,
+                  async_thread=False)
+        vpp.connect('benchmark')
+        try:
+            return bench_transport(vpp, 'socket', duration, window,
+                                   dump_count)
+        finally:
+            vpp.disconnect()
+    finally:
+        server.terminate()
+        server.join()
+
+
+def bench_shmem(apifiles, prefix, duration, window):
+    vpp = VPP(apifiles, async_thread=False)
+    vpp.connect('benchmark', chroot_prefix=prefix)
+    try:
+        dump_count = len(vpp.api.sw_interface_dump())
+        return bench_transport(vpp, 'shmem', duration, window, dump_count)
+    finally:
+        vpp.disconnect()
+
+
+def higher_is_better(metric):
+    return metric.endswith('_per_sec')
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions beyond tolerance (a fraction)."""
+    regressions = []
+    for name, metrics in sorted(baseline['results'].items()):
+        if name not in results['results']:
+            continue
+        for metric, base in sorted(metrics.items()):
+            value = results['results'][name].get(metric)
+            if value is None or not base:
+                continue
+            change = (value - base) / float(base)
+            if not higher_is_better(metric):
+                change = -change
+            if change < -tolerance:
+                regressions.append((name, metric, base, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VPP Python API benchmarks')
+    parser.add_argument('--api-dir',
+                        help='use .api.json files from this directory')
+    parser.add_argument('--output', help='write results to file')
+    parser.add_argument('--baseline', help='compare against results file')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed regression, fraction of baseline')
+    parser.add_argument('--duration', type=float, default=1.0,
+                        help='seconds per measurement')
+    parser.add_argument('--window', type=int, default=64,
+                        help='outstanding requests when pipelining')
+    parser.add_argument('--dump-count', type=int, default=100000,
+                        help='details in the large dump')
+    parser.add_argument('--shm', nargs='?', const='', default=None,
+                        metavar='PREFIX',
+                        help='also benchmark shared memory against a '
+                        'running VPP')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        if args.api_dir:
+            apifiles = VPP.find_api_files(api_dir=args.api_dir)
+        else:
+            apifile = os.path.join(directory, 'benchmark.api.json')
+            with open(apifile, 'w') as f:
+                json.dump(api_json, f)
+            apifiles = [apifile]
+
+        messages = {}
+        services = {}
+        for apifile in apifiles:
+            with open(apifile) as f:
+                process_json_file(f, messages, services)
+
+        results = {'python': platform.python_version(),
+                   'duration': args.duration,
+                   'results': {}}
+        results['results'].update(bench_serializer(messages, args.duration))
+        if not args.api_dir:
+            results['results'].update(
+                bench_socket(apifiles[0], directory, args.duration,
+                             args.window, args.dump_count))
+        if args.shm is not None:
+            results['results'].update(
+                bench_shmem(apifiles, args.shm or None, args.duration,
+                            args.window))
+    finally:
+        shutil.rmtree(directory)
+
+    for name, metrics in sorted(results['results'].items()):
+        print('{:<45}'.format(name) +
+              ' '.join('{}={:.1f}'.format(k, v)
+                       for k, v in sorted(metrics.items())))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, base, value, change in regressions:
+            print('REGRESSION {} {}: {:.1f} -> {:.1f} ({:+.1%})'
+                  .format(name, metric, base, value, change))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
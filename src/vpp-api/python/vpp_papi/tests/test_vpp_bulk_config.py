@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+import unittest
+import copy
+import io
+import json
+import os
+import shutil
+import tempfile
+from vpp_papi import VPP
+from vpp_papi.vpp_bulk_config import VppBulkConfig, read_csv, read_jsonl
+from vpp_papi.vpp_stub_server import VppStubServer
+from vpp_papi.tests import benchmark_vpp_papi
+
+api_json = copy.deepcopy(benchmark_vpp_papi.api_json)
+api_json['messages'] += [
+    ['nat44_add_del_static_mapping',
+     ['u16', '_vl_msg_id'], ['u32', 'client_index'], ['u32', 'context'],
+     ['u8', 'is_add'], ['u8', 'addr_only'], ['u8', 'local_ip_address', 4],
+     ['u8', 'external_ip_address', 4], ['u8', 'protocol'],
+     ['u16', 'local_port'], ['u16', 'external_port'],
+     ['u32', 'external_sw_if_index'], ['u32', 'vrf_id'],
+     ['u8', 'twice_nat'], ['u8', 'self_twice_nat'], ['u8', 'out2in_only'],
+     ['u8', 'tag', 64], {'crc': '0xe165e83b'}],
+    ['nat44_add_del_static_mapping_reply',
+     ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'retval'],
+     {'crc': '0xe8d4e804'}],
+    ['sw_interface_set_flags',
+     ['u16', '_vl_msg_id'], ['u32', 'client_index'], ['u32', 'context'],
+     ['u32', 'sw_if_index'], ['u8', 'admin_up_down'],
+     {'crc': '0x555485f5'}],
+    ['sw_interface_set_flags_reply',
+     ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'retval'],
+     {'crc': '0xe8d4e804'}],
+    ['sw_interface_add_del_address',
+     ['u16', '_vl_msg_id'], ['u32', 'client_index'], ['u32', 'context'],
+     ['u32', 'sw_if_index'], ['u8', 'is_add'], ['u8', 'is_ipv6'],
+     ['u8', 'del_all'], ['u8', 'address_length'], ['u8', 'address', 16],
+     {'crc': '0x7b583179'}],
+    ['sw_interface_add_del_address_reply',
+     ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'retval'],
+     {'crc': '0xe8d4e804'}],
+]
+api_json['services'].update({
+    'nat44_add_del_static_mapping':
+    {'reply': 'nat44_add_del_static_mapping_reply'},
+    'sw_interface_set_flags': {'reply': 'sw_interface_set_flags_reply'},
+    'sw_interface_add_del_address':
+    {'reply': 'sw_interface_add_del_address_reply'},
+})
+
+
+class TestBulkConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.apifile = os.path.join(self.directory, 'test.api.json')
+        with open(self.apifile, 'w') as f:
+            json.dump(api_json, f)
+        self.address = os.path.join(self.directory, 'api.sock')
+        self.server = VppStubServer([self.apifile],
+                                    server_address=self.address)
+        self.server.set_reply_handler(
+            'sw_interface_dump',
+            lambda r: [{'sw_if_index': i, 'interface_name': name,
+                        'mtu': [0] * 4}
+                       for i, name in ((1, b'pg0'), (2, b'pg1'))])
+        self.requests = []
+
+        def nat(r):
+            self.requests.append(r)
+            if r.local_ip_address == b'\x0a\x00\x00\x05':
+                return {'retval': -1}
+            return {}
+        self.server.set_reply_handler('nat44_add_del_static_mapping', nat)
+        for name in ('ip_add_del_route', 'sw_interface_add_del_address'):
+            self.server.set_reply_handler(
+                name, lambda r: self.requests.append(r) or {})
+        self.server.start()
+        self.vpp = VPP([self.apifile], use_socket=True,
+                       server_address=self.address, async_thread=False)
+        self.vpp.connect('test')
+
+    def tearDown(self):
+        self.vpp.disconnect()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_jsonl(self):
+        f = io.StringIO(
+            u'{"kind": "interface", "interface": "pg1", "state": "up",'
+            u' "address": "173.16.1.1/24"}\n'
+            u'# scale\n'
+            u'{"kind": "route", "prefix": "2.2.0.0/16", "via": "173.16.1.2",'
+            u' "interface": "pg1", "count": 3}\n'
+            u'{"kind": "bogus"}\n')
+        progress = []
+        stats = VppBulkConfig(self.vpp, window=2,
+                              progress=progress.append).load(read_jsonl(f))
+        # Each repetition counts as an entry
+        self.assertEqual(stats['entries'], 5)
+        self.assertEqual(stats['messages'], 5)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['failures'][0][0], 'line 4')
+        self.assertTrue(progress)
+
+        address, r1, r2, r3 = self.requests
+        self.assertEqual(address.address[:4], b'\xad\x10\x01\x01')
+        self.assertEqual(address.sw_if_index, 2)
+        self.assertEqual([r.dst_address[:4] for r in (r1, r2, r3)],
+                         [b'\x02\x02\x00\x00', b'\x02\x03\x00\x00',
+                          b'\x02\x04\x00\x00'])
+        self.assertEqual(r3.dst_address_length, 16)
+        self.assertEqual(r3.next_hop_sw_if_index, 2)
+        self.assertEqual(self.server.counters['sw_interface_set_flags'], 1)
+
+    def test_csv(self):
+        f = io.StringIO(u'local,external,count,tag\n'
+                        u'10.0.0.3,173.16.1.3,1000,scale\n')
+        stats = VppBulkConfig(self.vpp).load(
+            read_csv(f, kind='nat44_static'))
+        self.assertEqual(stats['messages'], 1000)
+        # The entry with 10.0.0.5 is rejected
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['failures'][0][0], 'line 2 #2')
+        self.assertEqual(len(self.requests), 1000)
+        self.assertEqual(self.requests[-1].external_ip_address,
+                         b'\xad\x10\x04\xea')
+        self.assertEqual(self.requests[0].addr_only, 1)
+
+    def test_acl(self):
+        f = io.StringIO(u'kind,acl,action,dst,proto,dport\n'
+                        u'acl_rule,web,permit,10.0.0.0/8,tcp,80\n'
+                        u'acl_rule,web,deny,,,\n'
+                        u'acl_rule,dns,permit,,udp,53\n')
+        rules = []
+
+        def acl(r):
+            rules.append(r)
+            return {'acl_index': len(rules)}
+        self.server.set_reply_handler('acl_add_replace', acl)
+        stats = VppBulkConfig(self.vpp).load(read_csv(f))
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual([r.count for r in rules], [2, 1])
+        self.assertEqual(rules[0].r[0].dstport_or_icmpcode_first, 80)
+        self.assertEqual(rules[0].r[1].is_permit, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import unittest
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from vpp_papi.vpp_fanout import VppFanout, VppFanoutError, to_plain, \
+    from_plain
+from vpp_papi.vpp_stub_server import VppStubServer
+from vpp_papi.tests.test_vpp_stub_server import api_json
+
+
+class TestFanout(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.apifile = os.path.join(self.directory, 'test.api.json')
+        with open(self.apifile, 'w') as f:
+            json.dump(api_json, f)
+        self.servers = {}
+        instances = {}
+        for n in range(3):
+            name = 'vpp{}'.format(n)
+            address = os.path.join(self.directory, name + '.sock')
+            server = VppStubServer([self.apifile], server_address=address)
+            server.set_reply_handler(
+                'test_dump',
+                lambda r, n=n: itertools.repeat({'value': n}, r.count))
+            server.start()
+            self.servers[name] = server
+            instances[name] = {'server_address': address}
+        self.fanout = VppFanout(instances, apifiles=[self.apifile])
+        self.fanout.connect('test')
+
+    def tearDown(self):
+        self.fanout.disconnect()
+        for server in self.servers.values():
+            server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_call(self):
+        r = self.fanout.call('control_ping')
+        self.assertEqual(sorted(r), ['vpp0', 'vpp1', 'vpp2'])
+        self.assertEqual(r['vpp1'].retval, 0)
+        for server in self.servers.values():
+            self.assertEqual(server.counters['control_ping'], 1)
+
+        r = self.fanout.call('control_ping', instances=['vpp2'])
+        self.assertEqual(list(r), ['vpp2'])
+
+    def test_dump(self):
+        r = self.fanout.call_each('test_dump', {'vpp0': {'count': 1},
+                                                'vpp2': {'count': 2}})
+        self.assertEqual(len(r['vpp0']), 1)
+        self.assertEqual(len(r['vpp2']), 2)
+
+        r = self.fanout.dump('test_dump', count=2)
+        self.assertEqual([(i, d.value) for i, d in r],
+                         [('vpp0', 0), ('vpp0', 0), ('vpp1', 1), ('vpp1', 1),
+                          ('vpp2', 2), ('vpp2', 2)])
+
+    def test_error(self):
+        with self.assertRaises(VppFanoutError) as e:
+            self.fanout.call('test_dump', bogus=1)
+        self.assertEqual(sorted(e.exception.errors), ['vpp0', 'vpp1', 'vpp2'])
+
+    def test_plain(self):
+        d = self.fanout.call('test_dump', instances=['vpp1'], count=1)
+        plain = to_plain(d['vpp1'])
+        self.assertEqual(plain[0][1], 'test_details')
+        self.assertEqual(from_plain(plain, self.fanout.types), d['vpp1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+from vpp_papi import VPP
+from vpp_papi.vpp_papi import process_json_file, VPPValueError, load_source
+from vpp_papi.vpp_papi import api_bundle_name
+from vpp_papi.vpp_serializer import vpp_type_registry, vpp_get_type
+
+
+def api_file(types=(), aliases=None, messages=()):
+    api = {'types': list(types), 'messages': list(messages), 'unions': [],
+           'enums': [['color', ['RED', 0], ['BLUE', 1],
+                      {'enumtype': 'u32'}]],
+           'aliases': aliases or {}, 'services': {}}
+    return io.StringIO(u'{}'.format(json.dumps(api)))
+
+
+class TestTypeResolution(unittest.TestCase):
+
+    def load(self, f, registry=None):
+        if registry is None:
+            registry = vpp_type_registry()
+        messages = {}
+        process_json_file(f, messages, {}, registry=registry)
+        return registry, messages
+
+    def test_order(self):
+        # Every type refers to the one defined after it
+        chain = [['t{}'.format(i), ['vl_api_t{}_t'.format(i + 1), 'next']]
+                 for i in range(2000)]
+        chain.append(['t2000', ['vl_api_color_t', 'color'],
+                      ['vl_api_mac_t', 'mac']])
+        registry, messages = self.load(api_file(
+            chain, {'mac': {'type': 'u8', 'length': 6}},
+            [['msg', ['u16', '_vl_msg_id'], ['vl_api_t0_t', 'first'],
+              {'crc': '0x12345678'}]]))
+        self.assertEqual(registry['vl_api_t0_t'].size, 10)
+        self.assertIn('msg', messages)
+        self.assertEqual(messages['msg'].size, 12)
+
+    def test_imported_types(self):
+        registry, _ = self.load(api_file([['a', ['u32', 'x']]]))
+        self.load(api_file([['b', ['vl_api_a_t', 'a']]]), registry)
+        self.assertEqual(registry['vl_api_b_t'].size, 4)
+
+    def test_missing(self):
+        with self.assertRaises(VPPValueError) as e:
+            self.load(api_file([['a', ['vl_api_nope_t', 'x']]]))
+        self.assertEqual(str(e.exception),
+                         'Unknown type vl_api_nope_t used by vl_api_a_t')
+
+    def test_cycle(self):
+        with self.assertRaises(VPPValueError) as e:
+            self.load(api_file([['a', ['vl_api_b_t', 'b']],
+                                ['b', ['vl_api_a_t', 'a']]]))
+        self.assertEqual(str(e.exception), 'Circular type definition '
+                         'vl_api_a_t -> vl_api_b_t -> vl_api_a_t')
+
+    def test_registries(self):
+        r1, _ = self.load(api_file([['a', ['u32', 'x']]]))
+        r2, _ = self.load(api_file([['a', ['u8', 'x']]]))
+        self.assertEqual(r1['vl_api_a_t'].size, 4)
+        self.assertEqual(r2['vl_api_a_t'].size, 1)
+        self.assertIsNone(vpp_get_type('vl_api_t1999_t'))
+
+
+vppapigen_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', '..', '..', 'tools', 'vppapigen')
+
+
+@unittest.skipUnless(os.path.isfile(os.path.join(vppapigen_dir,
+                                                 'vppapigen_python.py')),
+                     'vppapigen not available')
+class TestGeneratedModule(unittest.TestCase):
+    api = '''
+    define thing { u32 client_index; u32 context; u32 sw_if_index;
+                   u8 tag[8]; };
+    define thing_reply { u32 context; i32 retval; u64 counter; };
+    define ids { u32 client_index; u32 context; u32 count;
+                 u32 ids[count]; };
+    define ids_reply { u32 context; i32 retval; };
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.apifile = os.path.join(self.directory, 'test.api.json')
+        self.vppapigen = vppapigen = load_source(
+            'vppapigen', os.path.join(vppapigen_dir, 'vppapigen.py'))
+        parser = vppapigen.VPPAPI()
+        result = []
+        parser.process_imports(parser.parse_string(self.api), False, result)
+        s = parser.process(result)
+        s['Define'] = vppapigen.add_msg_id(s['Define'])
+        for module, filename in (('json', self.apifile),
+                                 ('python', self.apifile[:-5] + '.py')):
+            plugin = load_source(
+                'vppapigen_' + module,
+                os.path.join(vppapigen_dir, 'vppapigen_{}.py'.format(module)))
+            with open(filename, 'w') as f:
+                f.write(plugin.run('test.api', s, 0x12345678))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_generated(self):
+        vpp = VPP([self.apifile], testmode=True, use_socket=True)
+        thing = vpp.messages['thing']
+        self.assertNotEqual(type(thing.pack).__name__, 'method')
+        self.assertEqual(type(vpp.messages['ids'].pack).__name__, 'method')
+        self.assertEqual(vpp.services['thing'], {'reply': 'thing_reply'})
+
+        # The precompiled functions agree with the runtime serializer
+        os.utime(self.apifile[:-5] + '.py', (0, 0))
+        runtime = VPP([self.apifile], testmode=True, use_socket=True)
+        self.assertEqual(type(runtime.messages['thing'].pack).__name__,
+                         'method')
+        kwargs = {'_vl_msg_id': 1, 'context': 2, 'sw_if_index': 3,
+                  'tag': b'abc'}
+        b = thing.pack(kwargs)
+        self.assertEqual(b, runtime.messages['thing'].pack(kwargs))
+        self.assertEqual(thing.pack({}),
+                         runtime.messages['thing'].pack({}))
+        r, size = thing.unpack(b)
+        self.assertEqual(size, len(b))
+        self.assertEqual(type(r).__name__, 'thing')
+        self.assertEqual(r, runtime.messages['thing'].unpack(b)[0])
+        self.assertEqual(r.tag, b'abc' + b'\x00' * 5)
+
+        with self.assertRaises(ValueError):
+            thing.pack({'tag': b'x' * 9})
+        with self.assertRaises(ValueError):
+            thing.unpack(b[:-1])
+
+    def test_bundle(self):
+        with open(self.apifile) as f:
+            bundle = self.vppapigen.bundle_create(
+                [('test.api.json', json.load(f))])
+        path = os.path.join(self.directory, api_bundle_name)
+        with open(path, 'w') as f:
+            json.dump(bundle, f)
+        self.assertEqual(VPP.find_api_bundle(self.directory), path)
+        self.assertEqual(VPP.find_api_bundle(self.directory + '/missing'),
+                         None)
+
+        vpp = VPP([path], testmode=True, use_socket=True)
+        self.assertEqual(sorted(vpp.messages),
+                         ['ids', 'ids_reply', 'thing', 'thing_reply'])
+        self.assertEqual(vpp.services['thing'], {'reply': 'thing_reply'})
+        self.assertEqual(vpp.messages['thing'].crc, bundle['crcs']['thing'])
+
+        # Files the bundle doesn't hold are loaded, the others skipped
+        os.mkdir(os.path.join(self.directory, 'core'))
+        bundled = os.path.join(self.directory, 'core', 'test.api.json')
+        with open(bundled, 'w') as f:
+            f.write('garbage')
+        other = os.path.join(self.directory, 'other.api.json')
+        with open(other, 'w') as f:
+            json.dump({'types': [], 'unions': [], 'enums': [],
+                       'aliases': {}, 'services': {},
+                       'messages': [['other', ['u16', '_vl_msg_id'],
+                                     ['u32', 'context'],
+                                     {'crc': '0x12345678'}]]}, f)
+        vpp = VPP([path, bundled, other], testmode=True, use_socket=True)
+        self.assertEqual(sorted(vpp.messages),
+                         ['ids', 'ids_reply', 'other', 'thing',
+                          'thing_reply'])
+
+        bundle['version'] = 2
+        with open(path, 'w') as f:
+            json.dump(bundle, f)
+        with self.assertRaises(VPPValueError):
+            VPP([path], testmode=True, use_socket=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
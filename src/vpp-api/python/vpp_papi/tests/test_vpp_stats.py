@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import unittest
+from vpp_papi.vpp_stats import VPPStats, sum_over_threads
+
+
+class FakeStats(VPPStats):
+    """VPPStats serving canned counters instead of a stats segment."""
+    def __init__(self, counters):
+        self.counters = counters
+        self._init_state()
+
+    def get_counter(self, name):
+        return self.counters[name]
+
+    def ls(self, patterns):
+        return patterns
+
+    def dump(self, counters):
+        return {c: self.counters[c] for c in counters}
+
+
+class TestStatsViews(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = FakeStats({
+            '/if/drops': [[1, 2, 3], [10, 20, 30]],
+            '/if/rx': [[{'packets': 1, 'bytes': 64},
+                        {'packets': 0, 'bytes': 0}],
+                       [{'packets': 3, 'bytes': 192},
+                        {'packets': 4, 'bytes': 256}]]})
+
+    def test_sum_over_threads(self):
+        self.assertEqual(sum_over_threads([[1, 2], [3, 4, 5]]), [4, 6, 5])
+        self.assertEqual(self.stats.get_counter_sum('/if/rx'),
+                         [{'packets': 4, 'bytes': 256},
+                          {'packets': 4, 'bytes': 256}])
+
+    def test_interface_names(self):
+        calls = []
+
+        def names():
+            calls.append(1)
+            return {0: 'local0', 1: 'pg0', 2: 'pg1'}
+
+        self.stats.set_interface_names(names)
+        self.assertEqual(self.stats.get_interface_counters('/if/drops'),
+                         {'local0': 11, 'pg0': 22, 'pg1': 33})
+        self.assertEqual(self.stats.get_interface_counters('/if/drops',
+                                                           'pg*'),
+                         {'pg0': 22, 'pg1': 33})
+        # Names are cached
+        self.assertEqual(len(calls), 1)
+
+        # Deleted interfaces leave gaps, whose counters VPP doesn't clear;
+        # they are not looked up again
+        self.stats.counters['/if/drops'] = [[11, 5, 33]]
+        self.stats.set_interface_names(
+            lambda: calls.append(1) or {0: 'local0', 2: 'pg1'})
+        for i in range(3):
+            self.assertEqual(self.stats.get_interface_counters('/if/drops'),
+                             {'local0': 11, 'pg1': 33})
+        self.assertEqual(len(calls), 2)
+        self.stats.counters['/if/drops'] = [[11, 6, 33]]
+        self.stats.get_interface_counters('/if/drops')
+        self.assertEqual(len(calls), 2)
+        # New interfaces grow the vector
+        self.stats.counters['/if/drops'] = [[11, 6, 33, 0]]
+        self.stats.get_interface_counters('/if/drops')
+        self.stats.get_interface_counters('/if/drops')
+        self.assertEqual(len(calls), 3)
+        # Reused indexes need an explicit refresh
+        self.stats.invalidate_names()
+        self.stats.get_interface_counters('/if/drops')
+        self.stats.get_interface_counters('/if/drops')
+        self.assertEqual(len(calls), 4)
+
+    def test_thread_imbalance(self):
+        self.stats.set_interface_names({0: 'local0', 1: 'pg0'})
+        r = self.stats.get_thread_imbalance('/if/rx')
+        self.assertEqual(r['local0'], ([1, 3], 1.5))
+        self.assertEqual(r['pg0'], ([0, 4], 2.0))
+
+
+class TestStatsWatchers(unittest.TestCase):
+
+    def test_watchers(self):
+        counters = {'/err/ip4-input/ip4 ttl expired': 0,
+                    '/if/drops': [[0, 0], [0, 0]]}
+        stats = FakeStats(counters)
+        stats.set_interface_names({0: 'local0', 1: 'pg0'})
+        fired = []
+
+        def callback(w, index, value):
+            fired.append((w.counter, index, value))
+
+        stats.add_watcher('/err/ip4-input/ip4 ttl expired', callback,
+                          threshold=100, mode='rate')
+        stats.add_watcher('/if/drops', callback, interface='pg0')
+
+        stats.poll_watchers(now=1.0)
+        self.assertEqual(fired, [])
+
+        counters['/err/ip4-input/ip4 ttl expired'] = 150
+        counters['/if/drops'] = [[5, 0], [0, 0]]
+        stats.poll_watchers(now=2.0)
+        self.assertEqual(fired, [('/err/ip4-input/ip4 ttl expired', 0,
+                                  150.0)])
+
+        del fired[:]
+        counters['/err/ip4-input/ip4 ttl expired'] = 250
+        counters['/if/drops'] = [[5, 1], [0, 2]]
+        stats.poll_watchers(now=3.0)
+        self.assertEqual(fired, [('/if/drops', 1, 3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import unittest
+import shutil
+import tempfile
+from vpp_papi.vpp_stats_recorder import VPPStatsRecorder, VPPStatsReader
+from vpp_papi.vpp_stats_recorder import VPPStatsRecorderError
+from vpp_papi.vpp_stats_recorder import varint_encode, varint_decode
+from vpp_papi.vpp_stats_recorder import zigzag_encode, zigzag_decode
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def snapshot(i):
+    return {'/sys/vector_rate': 1.5 * i,
+            '/err/ip4-input/ip4 ttl expired': 10 * i,
+            '/if/drops': [[i, 2 * i], [3 * i, 4 * i]],
+            '/if/rx': [[{'packets': i, 'bytes': 64 * i}]]}
+
+
+class TestEncoding(unittest.TestCase):
+
+    def test_varint(self):
+        for n in [0, 1, 127, 128, 300, 2**32, 2**64 - 1]:
+            b = bytearray()
+            varint_encode(b, n)
+            self.assertEqual(varint_decode(b, 0), (n, len(b)))
+
+    def test_zigzag(self):
+        for n in [0, -1, 1, -2**63, 2**64 - 1]:
+            self.assertEqual(zigzag_decode(zigzag_encode(n)), n)
+
+
+@unittest.skipIf(numpy is None, 'NumPy not available')
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        r = VPPStatsRecorder(self.directory, roll_interval=50, block_size=8)
+        for i in range(100):
+            r.record(snapshot(i), timestamp=1000.0 + i)
+        r.close()
+
+        reader = VPPStatsReader(self.directory)
+        self.assertEqual(len(reader.files()), 2)
+        self.assertEqual(reader.ls(), set(snapshot(0).keys()))
+
+        t, v = reader.get_counter('/if/drops')
+        self.assertEqual(len(t), 100)
+        self.assertEqual(v.shape, (100, 2, 2))
+        self.assertEqual(v[42][1][1], 4 * 42)
+
+        t, v = reader.get_counter('/if/rx', field='bytes')
+        self.assertEqual(v[7][0][0], 64 * 7)
+
+        t, v = reader.get_counter('/sys/vector_rate', 1010, 1019.5)
+        self.assertEqual(list(t), [1000.0 + i for i in range(10, 20)])
+        self.assertEqual(list(v), [1.5 * i for i in range(10, 20)])
+
+        t, v = reader.get_counter('/err/ip4-input/ip4 ttl expired', 1060)
+        self.assertEqual(len(t), 40)
+        self.assertEqual(v[0], 600)
+
+    def test_new_series(self):
+        r = VPPStatsRecorder(self.directory, block_size=4)
+        r.record({'/if/drops': [[1]]}, timestamp=1.0)
+        r.record({'/if/drops': [[2, 5]]}, timestamp=2.0)
+        r.close()
+
+        t, v = VPPStatsReader(self.directory).get_counter('/if/drops')
+        self.assertEqual(v.tolist(), [[[1, 0]], [[2, 5]]])
+
+    def test_unknown_counter(self):
+        r = VPPStatsRecorder(self.directory, block_size=4)
+        r.record({'/if/drops': [[1]]}, timestamp=1.0)
+        r.close()
+
+        reader = VPPStatsReader(self.directory)
+        self.assertRaises(VPPStatsRecorderError, reader.get_counter,
+                          '/if/nope')
+        t, v = reader.get_counter('/if/drops', start=2.0)
+        self.assertEqual(len(t), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
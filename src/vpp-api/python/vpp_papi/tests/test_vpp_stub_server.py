@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+import unittest
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from vpp_papi import VPP
+from vpp_papi.vpp_stub_server import VppStubServer
+
+api_json = {
+    'types': [['message_table_entry',
+               ['u16', 'index'], ['u8', 'name', 64],
+               {'crc': '0x913bf1c6'}]],
+    'messages': [
+        ['sockclnt_create',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['u8', 'name', 64],
+         {'crc': '0xdf2cf94d'}],
+        ['sockclnt_create_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['i32', 'response'], ['u32', 'index'],
+         ['u16', 'count'],
+         ['vl_api_message_table_entry_t', 'message_table', 0, 'count'],
+         {'crc': '0xa134a8a8'}],
+        ['sockclnt_delete',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['u32', 'index'], {'crc': '0x8ac76db6'}],
+        ['sockclnt_delete_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'response'],
+         {'crc': '0x8f38b1ee'}],
+        ['control_ping',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], {'crc': '0x51077d14'}],
+        ['control_ping_reply',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['i32', 'retval'],
+         ['u32', 'client_index'], ['u32', 'vpe_pid'],
+         {'crc': '0xf6b0b8ca'}],
+        ['test_dump',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'],
+         ['u32', 'context'], ['u32', 'count'], {'crc': '0x11111111'}],
+        ['test_details',
+         ['u16', '_vl_msg_id'], ['u32', 'context'], ['u32', 'value'],
+         ['u8', 'data', 5000], {'crc': '0x22222222'}],
+        ['test_event',
+         ['u16', '_vl_msg_id'], ['u32', 'client_index'], ['u32', 'pid'],
+         {'crc': '0x33333333'}],
+    ],
+    'unions': [],
+    'enums': [],
+    'aliases': {},
+    'services': {
+        'sockclnt_create': {'reply': 'sockclnt_create_reply'},
+        'sockclnt_delete': {'reply': 'sockclnt_delete_reply'},
+        'control_ping': {'reply': 'control_ping_reply'},
+        'test_dump': {'reply': 'test_details', 'stream': True},
+    },
+}
+
+
+class TestStubServer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.apifile = os.path.join(self.directory, 'test.api.json')
+        with open(self.apifile, 'w') as f:
+            json.dump(api_json, f)
+        self.address = os.path.join(self.directory, 'api.sock')
+        self.server = VppStubServer([self.apifile],
+                                    server_address=self.address,
+                                    record=True)
+        self.server.start()
+        self.vpp = VPP([self.apifile], use_socket=True,
+                       server_address=self.address, async_thread=False)
+        self.vpp.connect('test')
+
+    def tearDown(self):
+        self.vpp.disconnect()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_control_ping(self):
+        r = self.vpp.api.control_ping()
+        self.assertEqual(r.retval, 0)
+        self.assertEqual(r.vpe_pid, os.getpid())
+        self.assertEqual(self.server.counters['control_ping'], 1)
+        self.assertEqual(self.server.received[-1][2], 'control_ping')
+
+    def test_stream(self):
+        def details(request):
+            return itertools.repeat({'value': 42}, request.count)
+        self.server.set_reply_handler('test_dump', details)
+        r = self.vpp.api.test_dump(count=100)
+        self.assertEqual(len(r), 100)
+        self.assertEqual(r[99].value, 42)
+
+        self.assertEqual(self.vpp.api.test_dump(count=0), [])
+
+    def test_unwanted_messages(self):
+        self.vpp.set_event_filter(['other_event'])
+        for i in range(5):
+            self.server.send_event('test_event', pid=i)
+        self.vpp.api.control_ping()
+        # Filtered events are dropped without decoding
+        self.assertEqual(self.vpp.message_stats()['dropped'],
+                         {'test_event': 5})
+
+        events = []
+        self.vpp.register_event_callback(
+            lambda name, r: events.append(r.pid))
+        self.vpp.set_event_filter(['test_event'])
+        self.server.send_event('test_event', pid=42)
+        self.vpp.api.control_ping()
+        self.assertEqual(events, [42])
+
+        # A stale reply is queued while wanted
+        self.vpp.set_event_filter(None)
+        self.vpp.transport.write(self.vpp.control_ping_msgdef.pack(
+            {'_vl_msg_id': self.vpp.control_ping_index, 'context': 1}))
+        self.vpp.api.control_ping()
+        self.assertEqual(self.vpp.message_stats()['queued'],
+                         {'control_ping_reply': 1})
+        self.vpp.message_queue.get_nowait()
+        self.assertEqual(self.vpp.message_stats()['queued'], {})
+
+        self.vpp.set_event_filter([])
+        self.vpp.transport.write(self.vpp.control_ping_msgdef.pack(
+            {'_vl_msg_id': self.vpp.control_ping_index, 'context': 1}))
+        self.vpp.api.control_ping()
+        self.assertEqual(self.vpp.message_stats(),
+                         {'dropped': {'test_event': 5,
+                                      'control_ping_reply': 1},
+                          'queued': {}, 'draining': 0})
+
+    def slow_details(self, request):
+        for i in range(request.count):
+            time.sleep(0.02)
+            yield {'value': i}
+
+    def test_timeout(self):
+        self.server.set_reply_handler('test_dump', self.slow_details)
+        with self.assertRaises(VPP.VPPTimeoutError):
+            self.vpp.api.test_dump(count=20, _timeout=0.1)
+        self.assertEqual(self.vpp.message_stats()['draining'], 1)
+
+        # The stream is still in sync, the rest of the dump is dropped
+        r = self.vpp.api.test_dump(count=3)
+        self.assertEqual([d.value for d in r], [0, 1, 2])
+        self.assertEqual(self.vpp.message_stats()['draining'], 0)
+        self.assertEqual(self.vpp.message_queue.qsize(), 0)
+
+    def test_timeout_late_reply_callback(self):
+        self.server.set_reply_handler('test_dump', self.slow_details)
+        with self.assertRaises(VPP.VPPTimeoutError):
+            self.vpp.api.test_dump(count=5, _timeout=0.03)
+        # The shared memory transport hands the rest of the dump to the
+        # message handler of its receive thread once the call gave up
+        deadline = time.time() + 5
+        while self.vpp.message_stats()['draining'] and \
+                time.time() < deadline:
+            msg = self.vpp.transport.read(timeout=1)
+            if msg is not None:
+                self.vpp.msg_handler_sync(msg)
+        self.assertEqual(self.vpp.message_stats()['draining'], 0)
+        self.assertEqual(self.vpp.message_queue.qsize(), 0)
+        r = self.vpp.api.test_dump(count=2)
+        self.assertEqual(len(r), 2)
+
+    def test_cancel(self):
+        self.server.set_reply_handler('test_dump', self.slow_details)
+        t = threading.Timer(0.1, self.vpp.cancel, args=(1234,))
+        t.start()
+        with self.assertRaises(VPP.VPPCancelledError):
+            self.vpp.api.test_dump(count=20, context=1234)
+        t.join()
+        r = self.vpp.api.test_dump(count=2)
+        self.assertEqual(len(r), 2)
+
+    def test_poll(self):
+        self.server.set_reply_handler(
+            'test_dump', lambda r: itertools.repeat({'value': 1}, r.count))
+        self.assertEqual(self.vpp.poll(), [])
+        dump = self.vpp.send('test_dump', count=3)
+        ping = self.vpp.send('control_ping')
+        self.server.send_event('test_event', pid=1)
+        received = []
+        deadline = time.time() + 5
+        while len(received) < 6 and time.time() < deadline:
+            received += self.vpp.poll()
+            time.sleep(0.01)
+        # Events and replies arrive through different queues
+        events = [r for r in received if type(r).__name__ == 'test_event']
+        replies = [(type(r).__name__, r.context) for r in received
+                   if r not in events]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(replies, [('test_details', dump)] * 3 +
+                         [('control_ping_reply', dump),
+                          ('control_ping_reply', ping)])
+        self.assertEqual(self.vpp.pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
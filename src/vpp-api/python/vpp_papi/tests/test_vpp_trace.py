@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import unittest
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from vpp_papi import VPP
+from vpp_papi.vpp_stub_server import VppStubServer
+from vpp_papi.vpp_trace import VppTraceTransport, VppTraceReplay
+from vpp_papi.vpp_trace import trace_read
+from vpp_papi.tests.test_vpp_stub_server import api_json
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.apifile = os.path.join(self.directory, 'test.api.json')
+        with open(self.apifile, 'w') as f:
+            json.dump(api_json, f)
+        self.address = os.path.join(self.directory, 'api.sock')
+        self.server = VppStubServer([self.apifile],
+                                    server_address=self.address)
+        self.server.set_reply_handler(
+            'test_dump',
+            lambda request: itertools.repeat({'value': 1}, request.count))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def connect(self):
+        vpp = VPP([self.apifile], use_socket=True,
+                  server_address=self.address, async_thread=False)
+        vpp.connect('test')
+        return vpp
+
+    def test_record_replay(self):
+        trace = os.path.join(self.directory, 'api.trace')
+        vpp = self.connect()
+        vpp.transport = VppTraceTransport(vpp.transport, trace)
+        for i in range(10):
+            vpp.api.test_dump(count=i)
+        vpp.api.control_ping()
+        vpp.transport.close()
+        vpp.transport = vpp.transport.transport
+        vpp.disconnect()
+
+        records = list(trace_read(trace))
+        names = [r[2] for r in records if r[0] == 'N']
+        self.assertEqual(sorted(names), ['control_ping_51077d14',
+                                         'test_dump_11111111'])
+        # Each dump is followed by a control ping
+        self.assertEqual(len([r for r in records if r[0] == 'M']), 21)
+
+        vpp = self.connect()
+        try:
+            r = VppTraceReplay(vpp, trace, window=4).run()
+        finally:
+            vpp.disconnect()
+        # Control pings terminating dumps are not replayed separately
+        self.assertEqual(r['messages'], 11)
+        self.assertEqual(self.server.counters['control_ping'], 22)
+        self.assertEqual(self.server.counters['test_dump'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,543 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Bulk configuration loader.
+#
+# Streams declarative configuration into VPP over the binary API instead
+# of through the CLI. Entries are dictionaries with a 'kind' and are read
+# from JSON Lines, CSV (one column per field) or YAML/JSON documents
+# (a mapping of kind to list of entries):
+#
+#   {"kind": "interface", "interface": "pg0", "state": "up",
+#    "address": "172.16.2.1/24", "table": 0}
+#   {"kind": "route", "prefix": "2.2.0.0/16", "via": "173.16.1.2",
+#    "interface": "pg1"}
+#   {"kind": "nat44_interface", "interface": "pg0", "inside": 1}
+#   {"kind": "nat44_static", "local": "10.0.0.3", "external": "173.16.1.3"}
+#   {"kind": "acl", "tag": "web", "rules": [{"action": "permit",
+#    "dst": "10.0.0.0/8", "proto": "tcp", "dport": "80"}]}
+#   {"kind": "acl_rule", "acl": "web", "action": "deny"}
+#
+# Consecutive acl_rule entries with the same 'acl' form one ACL, which
+# makes ACLs expressible in CSV. A 'count' field repeats route and NAT
+# entries with incrementing addresses: one line describes the 1M route or
+# 10M static mapping scale configurations.
+#
+# Requests are pipelined with a window of outstanding requests, and the
+# outcome of every entry is checked. YAML/JSON documents are loaded whole,
+# use JSON Lines or CSV for large configurations.
+#
+
+from __future__ import print_function
+import argparse
+import csv
+import ipaddress
+import json
+import logging
+import sys
+import time
+from . vpp_papi import VPP, VPPIOError, VPPValueError
+from . vpp_stats import interface_names_from_api
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+MPLS_LABEL_INVALID = 0x100000
+INVALID_INDEX = 0xffffffff
+
+ip_protocols = {'icmp': 1, 'tcp': 6, 'udp': 17, 'icmp6': 58}
+acl_actions = {'deny': 0, 'permit': 1, 'permit+reflect': 2}
+
+
+def text(s):
+    return u'{}'.format(s)
+
+
+def read_jsonl(f):
+    """Yield (position, entry) for each line of a JSON Lines file."""
+    for n, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        yield 'line {}'.format(n), json.loads(line)
+
+
+def read_csv(f, kind=None):
+    """Yield (position, entry) for each row of a CSV file.
+
+    The first row names the fields. Rows without a kind column get kind.
+    Empty cells are left out.
+    """
+    for n, row in enumerate(csv.DictReader(f), 2):
+        entry = {k: v for k, v in row.items() if v not in (None, '')}
+        if kind and 'kind' not in entry:
+            entry['kind'] = kind
+        yield 'line {}'.format(n), entry
+
+
+def read_document(document):
+    """Yield (position, entry) from a mapping of kind to entries."""
+    if isinstance(document, list):
+        for n, entry in enumerate(document):
+            yield 'entry {}'.format(n), entry
+        return
+    for kind in document:
+        for n, entry in enumerate(document[kind]):
+            entry = dict(entry)
+            entry.setdefault('kind', kind)
+            yield '{}[{}]'.format(kind, n), entry
+
+
+def read_config(filename, kind=None):
+    """Yield (position, entry) for each entry in a configuration file.
+
+    The format is chosen from the file name extension.
+    """
+    if filename.endswith('.csv'):
+        with open(filename) as f:
+            for e in read_csv(f, kind):
+                yield e
+    elif filename.endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise VPPValueError('YAML configuration requires PyYAML')
+        with open(filename) as f:
+            document = yaml.safe_load(f)
+        for e in read_document(document):
+            yield e
+    elif filename.endswith('.json'):
+        with open(filename) as f:
+            document = json.load(f)
+        for e in read_document(document):
+            yield e
+    else:
+        with open(filename) as f:
+            for e in read_jsonl(f):
+                yield e
+
+
+def group_acl_rules(entries):
+    """Merge consecutive acl_rule entries of the same ACL into acl entries.
+    """
+    group = None
+    for where, entry in entries:
+        if entry.get('kind') == 'acl_rule':
+            if group and group[1]['tag'] == entry.get('acl'):
+                group[1]['rules'].append(entry)
+                continue
+            if group:
+                yield group
+            group = (where, {'kind': 'acl', 'tag': entry.get('acl', ''),
+                             'rules': [entry]})
+            continue
+        if group:
+            yield group
+            group = None
+        yield where, entry
+    if group:
+        yield group
+
+
+def port_range(value, default_last=65535):
+    if value is None or value == '':
+        return 0, default_last
+    value = str(value)
+    if '-' in value:
+        first, last = value.split('-', 1)
+        return int(first), int(last)
+    return int(value), int(value)
+
+
+def protocol(value):
+    if value is None or value == '':
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        return ip_protocols[value.lower()]
+
+
+def flag(value):
+    if isinstance(value, str):
+        return 1 if value.lower() in ('1', 'yes', 'true', 'on') else 0
+    return 1 if value else 0
+
+
+class VppBulkConfigError(RuntimeError):
+    pass
+
+
+class VppBulkConfig(object):
+    """Load configuration entries into VPP with pipelined requests.
+
+    vpp - connected VPP object. Use connect_sync() or async_thread=False so
+    that replies are not consumed elsewhere.
+    window - maximum number of requests outstanding.
+    delete - remove the configuration instead of adding it.
+    progress - called as progress(stats) every progress_interval seconds.
+    max_failures - number of failed entries kept in stats['failures'].
+
+    Usage:
+        loader = VppBulkConfig(vpp)
+        stats = loader.load(read_config('routes.jsonl'))
+    """
+    VppBulkConfigError = VppBulkConfigError
+
+    def __init__(self, vpp, window=256, delete=False, progress=None,
+                 progress_interval=1.0, max_failures=1000):
+        self.vpp = vpp
+        self.window = window
+        self.is_add = 0 if delete else 1
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.max_failures = max_failures
+        self.transport = vpp.transport
+        self.client_index = getattr(self.transport, 'socket_index', 0) or 0
+        self.msg_ids = {}
+        self.interfaces = None
+        self.kinds = {'interface': self.interface,
+                      'route': self.route,
+                      'nat44_static': self.nat44_static,
+                      'nat44_interface': self.nat44_interface,
+                      'acl': self.acl}
+
+    def sw_if_index(self, value):
+        """Return the sw_if_index for an interface name or index."""
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return self.interfaces[value]
+        except (KeyError, TypeError):
+            raise VppBulkConfigError('Unknown interface {}'.format(value))
+
+    def refresh_interfaces(self):
+        """Read the interface names from VPP."""
+        names = interface_names_from_api(self.vpp)()
+        self.interfaces = {v: k for k, v in names.items()}
+
+    def interface(self, entry, n):
+        sw_if_index = self.sw_if_index(entry['interface'])
+        r = []
+        if 'table' in entry:
+            r.append(('sw_interface_set_table',
+                      {'sw_if_index': sw_if_index,
+                       'is_ipv6': flag(entry.get('ipv6', 0)),
+                       'vrf_id': int(entry['table'])}))
+        addresses = entry.get('address', [])
+        if not isinstance(addresses, list):
+            addresses = [addresses]
+        for a in addresses:
+            a = ipaddress.ip_interface(text(a))
+            r.append(('sw_interface_add_del_address',
+                      {'sw_if_index': sw_if_index,
+                       'is_add': self.is_add,
+                       'is_ipv6': 1 if a.version == 6 else 0,
+                       'address_length': a.network.prefixlen,
+                       'address': a.ip.packed}))
+        if 'state' in entry:
+            r.append(('sw_interface_set_flags',
+                      {'sw_if_index': sw_if_index,
+                       'admin_up_down': 1 if entry['state'] == 'up' else 0}))
+        return r
+
+    def route(self, entry, n):
+        prefix = ipaddress.ip_network(text(entry['prefix']), strict=False)
+        if n:
+            prefix = ipaddress.ip_network(
+                (prefix.network_address + n * prefix.num_addresses,
+                 prefix.prefixlen))
+        is_ipv6 = 1 if prefix.version == 6 else 0
+        msg = {'is_add': self.is_add,
+               'is_ipv6': is_ipv6,
+               'table_id': int(entry.get('table', 0)),
+               'dst_address_length': prefix.prefixlen,
+               'dst_address': prefix.network_address.packed,
+               'next_hop_sw_if_index': INVALID_INDEX,
+               'next_hop_proto': is_ipv6,
+               'next_hop_weight': 1,
+               'next_hop_id': INVALID_INDEX,
+               'classify_table_index': INVALID_INDEX,
+               'next_hop_via_label': MPLS_LABEL_INVALID,
+               'is_drop': flag(entry.get('drop', 0)),
+               'is_multipath': flag(entry.get('multipath', 0))}
+        if 'via' in entry:
+            msg['next_hop_address'] = \
+                ipaddress.ip_address(text(entry['via'])).packed
+        if 'interface' in entry:
+            msg['next_hop_sw_if_index'] = self.sw_if_index(entry['interface'])
+        return [('ip_add_del_route', msg)]
+
+    def nat44_static(self, entry, n):
+        msg = {'is_add': self.is_add,
+               'local_ip_address':
+               (ipaddress.IPv4Address(text(entry['local'])) + n).packed,
+               'external_ip_address':
+               (ipaddress.IPv4Address(text(entry['external'])) + n).packed,
+               'external_sw_if_index': INVALID_INDEX,
+               'vrf_id': int(entry.get('vrf', 0)),
+               'tag': entry.get('tag', '').encode()}
+        if 'protocol' in entry:
+            msg['protocol'] = protocol(entry['protocol'])
+            msg['local_port'] = int(entry['local_port'])
+            msg['external_port'] = int(entry['external_port'])
+        else:
+            msg['addr_only'] = 1
+        return [('nat44_add_del_static_mapping', msg)]
+
+    def nat44_interface(self, entry, n):
+        return [('nat44_interface_add_del_feature',
+                 {'is_add': self.is_add,
+                  'is_inside': flag(entry.get('inside', 1)),
+                  'sw_if_index': self.sw_if_index(entry['interface'])})]
+
+    def acl_rule(self, rule):
+        src = ipaddress.ip_network(text(rule.get('src', '0.0.0.0/0')),
+                                   strict=False)
+        dst = ipaddress.ip_network(text(rule.get('dst', '0.0.0.0/0')),
+                                   strict=False)
+        if src.version != dst.version:
+            raise VppBulkConfigError('Mixed address families in ACL rule')
+        proto = protocol(rule.get('proto'))
+        icmp = proto in (1, 58)
+        sport = port_range(rule.get('sport'), 255 if icmp else 65535)
+        dport = port_range(rule.get('dport'), 255 if icmp else 65535)
+        return {'is_permit': acl_actions[rule.get('action', 'permit')],
+                'is_ipv6': 1 if src.version == 6 else 0,
+                'src_ip_addr': src.network_address.packed,
+                'src_ip_prefix_len': src.prefixlen,
+                'dst_ip_addr': dst.network_address.packed,
+                'dst_ip_prefix_len': dst.prefixlen,
+                'proto': proto,
+                'srcport_or_icmptype_first': sport[0],
+                'srcport_or_icmptype_last': sport[1],
+                'dstport_or_icmpcode_first': dport[0],
+                'dstport_or_icmpcode_last': dport[1]}
+
+    def acl(self, entry, n):
+        if not self.is_add:
+            raise VppBulkConfigError('Deleting ACLs is not supported')
+        rules = [self.acl_rule(r) for r in entry.get('rules', [])]
+        return [('acl_add_replace',
+                 {'acl_index': int(entry.get('acl_index', INVALID_INDEX)),
+                  'tag': entry.get('tag', '').encode(),
+                  'count': len(rules),
+                  'r': rules})]
+
+    def expand(self, entries):
+        """Yield (position, entry, function, repetition) for each entry.
+
+        Entries with a count are repeated, each repetition is checked on
+        its own.
+        """
+        for where, entry in group_acl_rules(entries):
+            kind = entry.get('kind')
+            f = self.kinds.get(kind)
+            count = int(entry.get('count', 1))
+            if count > 1 and kind not in ('route', 'nat44_static'):
+                f = None
+            if count == 1 or f is None:
+                yield where, entry, f, 0
+                continue
+            for n in range(count):
+                yield '{} #{}'.format(where, n), entry, f, n
+
+    def msg_id(self, name):
+        if name not in self.msg_ids:
+            msgdef = self.vpp.messages.get(name)
+            i = 0
+            if msgdef:
+                i = self.transport.get_msg_index(
+                    (name + '_' + msgdef.crc[2:]).encode())
+            if i <= 0:
+                raise VppBulkConfigError(
+                    'Message {} not supported by VPP'.format(name))
+            self.msg_ids[name] = (i, msgdef)
+        return self.msg_ids[name]
+
+    def load(self, entries):
+        """Send configuration entries to VPP.
+
+        entries - iterable of (position, entry), e.g. from read_config().
+
+        Returns a dictionary with the number of entries, messages and
+        failed entries, the elapsed time and rates. stats['failures']
+        lists (position, entry, error) for the first max_failures failed
+        entries.
+        """
+        stats = {'entries': 0, 'messages': 0, 'failed': 0, 'failures': [],
+                 'seconds': 0, 'entries_per_sec': 0, 'msgs_per_sec': 0}
+        # context -> [position, entry, replies outstanding, error]
+        outstanding = {}
+        if self.interfaces is None and \
+           hasattr(self.vpp.api, 'sw_interface_dump'):
+            # Must be done before requests are in flight
+            self.refresh_interfaces()
+        start = time.time()
+        next_progress = start + self.progress_interval
+
+        def failed(state, error):
+            if state[3] is not None:
+                return
+            state[3] = error
+            stats['failed'] += 1
+            if len(stats['failures']) < self.max_failures:
+                stats['failures'].append((state[0], state[1], error))
+            logger.debug('%s failed: %s', state[0], error)
+
+        def decode(msg):
+            if self.vpp.peek(msg)[1] in outstanding:
+                return self.vpp.decode_incoming_msg(msg)
+            return self.vpp.decode_unsolicited(msg)
+
+        def receive():
+            msgs = self.transport.read_decoded(decode)
+            if not msgs:
+                raise VPPIOError(2, 'Bulk config: read failed')
+            for r in msgs:
+                if r is None:
+                    continue
+                context = getattr(r, 'context', 0)
+                if context not in outstanding:
+                    self.vpp.message_queue.put_nowait(r)
+                    continue
+                state = outstanding.pop(context)
+                retval = getattr(r, 'retval', 0)
+                if retval != 0:
+                    failed(state, '{} returned {}'
+                           .format(type(r).__name__, retval))
+                state[2] -= 1
+
+        def report(now):
+            elapsed = now - start
+            stats['seconds'] = elapsed
+            if elapsed:
+                stats['entries_per_sec'] = stats['entries'] / elapsed
+                stats['msgs_per_sec'] = stats['messages'] / elapsed
+
+        self.transport.suspend()
+        try:
+            for where, entry, f, n in self.expand(entries):
+                stats['entries'] += 1
+                state = [where, entry, 0, None]
+                try:
+                    if f is None:
+                        raise VppBulkConfigError(
+                            'Unsupported kind {} or count'
+                            .format(entry.get('kind')))
+                    requests = [(self.msg_id(name), kwargs)
+                                for name, kwargs in f(entry, n)]
+                except (KeyError, ValueError, TypeError,
+                        VppBulkConfigError) as e:
+                    failed(state, '{}: {}'.format(type(e).__name__, e))
+                    continue
+                for (i, msgdef), kwargs in requests:
+                    while len(outstanding) >= self.window:
+                        receive()
+                    context = self.vpp.get_context()
+                    kwargs['_vl_msg_id'] = i
+                    kwargs['client_index'] = self.client_index
+                    kwargs['context'] = context
+                    try:
+                        self.vpp.validate_args(msgdef, kwargs)
+                        b = msgdef.pack(kwargs)
+                    except (ValueError, TypeError) as e:
+                        failed(state, '{}: {}'.format(type(e).__name__, e))
+                        break
+                    outstanding[context] = state
+                    state[2] += 1
+                    self.transport.write(b)
+                    stats['messages'] += 1
+                if self.progress and time.time() >= next_progress:
+                    report(time.time())
+                    self.progress(stats)
+                    next_progress = time.time() + self.progress_interval
+            while outstanding:
+                receive()
+        finally:
+            self.transport.resume()
+        report(time.time())
+        if self.progress:
+            self.progress(stats)
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load configuration into VPP over the binary API')
+    parser.add_argument('config', nargs='+',
+                        help='configuration files (.jsonl, .csv, .yaml, '
+                        '.json)')
+    parser.add_argument('--kind', help='kind of CSV rows without a kind '
+                        'column')
+    parser.add_argument('--delete', action='store_true',
+                        help='remove the configuration instead')
+    parser.add_argument('--window', type=int, default=256,
+                        help='maximum requests outstanding')
+    parser.add_argument('--api-dir', help='directory with .api.json files')
+    parser.add_argument('--socket', help='use the socket transport with '
+                        'this server address')
+    parser.add_argument('--prefix', help='shared memory prefix of VPP')
+    parser.add_argument('--failures', help='write failed entries to this '
+                        'file as JSON Lines')
+    parser.add_argument('--quiet', action='store_true',
+                        help='do not report progress')
+    args = parser.parse_args()
+
+    def progress(stats):
+        print('{entries} entries {messages} messages {failed} failed '
+              '{entries_per_sec:.0f} entries/s'.format(**stats),
+              file=sys.stderr)
+
+    apifiles = VPP.find_api_files(api_dir=args.api_dir)
+    if args.socket:
+        vpp = VPP(apifiles, use_socket=True, server_address=args.socket,
+                  async_thread=False)
+        vpp.connect('bulk-config')
+    else:
+        vpp = VPP(apifiles, async_thread=False)
+        vpp.connect_sync('bulk-config', chroot_prefix=args.prefix)
+
+    loader = VppBulkConfig(vpp, window=args.window, delete=args.delete,
+                           progress=None if args.quiet else progress)
+    failed = 0
+    try:
+        for filename in args.config:
+            stats = loader.load(read_config(filename, args.kind))
+            print('{}: {entries} entries, {failed} failed, {seconds:.1f}s, '
+                  '{entries_per_sec:.0f} entries/s'.format(filename, **stats))
+            failed += stats['failed']
+            if args.failures:
+                with open(args.failures, 'a') as f:
+                    for where, entry, error in stats['failures']:
+                        f.write(json.dumps({'file': filename,
+                                            'position': where,
+                                            'entry': entry,
+                                            'error': error}) + '\n')
+            for where, entry, error in stats['failures'][:10]:
+                print('  {}: {}'.format(where, error), file=sys.stderr)
+    finally:
+        vpp.disconnect()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
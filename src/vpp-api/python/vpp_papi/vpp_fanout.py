@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Fan-out client driving many VPP instances concurrently.
+#
+# API definitions are loaded once and shared by every connection. Socket
+# instances are driven from threads in this process. The shared memory
+# client library supports a single connection per process, so each shared
+# memory instance is owned by a forked worker process and calls are passed
+# to it over a pipe.
+#
+
+import collections
+import logging
+import multiprocessing
+import threading
+from . vpp_papi import VPP, process_api_file
+from . vpp_serializer import vpp_get_type, vpp_type_registry
+
+logger = logging.getLogger(__name__)
+
+ApiDefinitions = collections.namedtuple(
+    'ApiDefinitions', ['messages', 'services', 'types', 'apifiles'])
+
+
+class VppFanoutError(RuntimeError):
+    """One or more instances failed.
+
+    errors - dictionary of instance name to exception.
+    results - dictionary of instance name to result for the instances
+    that succeeded.
+    """
+    def __init__(self, errors, results):
+        self.errors = errors
+        self.results = results
+        super(VppFanoutError, self).__init__(
+            'Failed on {}: {}'.format(
+                ', '.join(sorted(errors)),
+                '; '.join('{}: {}'.format(k, errors[k])
+                          for k in sorted(errors))))
+
+
+def to_plain(obj):
+    """Convert a decoded message to picklable plain data."""
+    if isinstance(obj, tuple) and hasattr(obj, '_fields'):
+        return ('__vpp_type', type(obj).__name__,
+                [to_plain(v) for v in obj])
+    if isinstance(obj, list):
+        return [to_plain(v) for v in obj]
+    return obj
+
+
+def from_plain(obj, registry=None):
+    """Rebuild a decoded message from to_plain() output.
+
+    registry - the type registry the message was decoded with.
+    """
+    if isinstance(obj, tuple) and len(obj) == 3 and \
+       obj[0] == '__vpp_type':
+        t = vpp_get_type(obj[1], registry)
+        values = [from_plain(v, registry) for v in obj[2]]
+        if t is None:
+            return tuple(values)
+        return t.tuple._make(values)
+    if isinstance(obj, list):
+        return [from_plain(v, registry) for v in obj]
+    return obj
+
+
+class VppFanoutInstance(object):
+    """A socket connection owned by this process."""
+    def __init__(self, name, apidefs, read_timeout, server_address):
+        self.name = name
+        self.vpp = VPP(apidefs=apidefs, use_socket=True,
+                       server_address=server_address,
+                       read_timeout=read_timeout, async_thread=False)
+
+    def connect(self, client_name):
+        rv = self.vpp.connect(client_name)
+        if rv != 0:
+            raise IOError(2, 'Connect failed with {}'.format(rv))
+
+    def disconnect(self):
+        self.vpp.disconnect()
+
+    def call(self, method, kwargs):
+        return getattr(self.vpp.api, method)(**kwargs)
+
+
+def shm_worker(conn, apidefs, read_timeout, chroot_prefix):
+    vpp = VPP(apidefs=apidefs, read_timeout=read_timeout,
+              async_thread=False)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        op, args = request
+        try:
+            if op == 'connect':
+                rv = vpp.connect(args, chroot_prefix=chroot_prefix)
+                if rv != 0:
+                    raise IOError(2, 'Connect failed with {}'.format(rv))
+                result = None
+            elif op == 'call':
+                method, kwargs = args
+                result = to_plain(getattr(vpp.api, method)(**kwargs))
+            elif op == 'disconnect':
+                vpp.disconnect()
+                conn.send((True, None))
+                break
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, e))
+    conn.close()
+
+
+class VppFanoutShmInstance(object):
+    """A shared memory connection owned by a worker process."""
+    def __init__(self, name, apidefs, read_timeout, chroot_prefix):
+        self.name = name
+        self.types = apidefs.types
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=shm_worker,
+            args=(child, apidefs, read_timeout, chroot_prefix))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def request(self, op, args):
+        self.conn.send((op, args))
+        ok, result = self.conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def connect(self, client_name):
+        self.request('connect', client_name)
+
+    def disconnect(self):
+        try:
+            self.request('disconnect', None)
+        finally:
+            self.conn.close()
+            self.process.join()
+
+    def call(self, method, kwargs):
+        return from_plain(self.request('call', (method, kwargs)),
+                          self.types)
+
+
+class VppFanout(object):
+    """Issue API calls to many VPP instances concurrently.
+
+    instances - dictionary of instance name to connection parameters,
+    either {'server_address': path} for the socket transport or
+    {'chroot_prefix': prefix} for shared memory.
+    apifiles - list of API files, loaded once for all instances.
+
+    Usage:
+        fanout = VppFanout({'vpp0': {'server_address': '/run/vpp0.sock'},
+                            'vpp1': {'chroot_prefix': 'vpp1'}})
+        fanout.connect('manager')
+        fanout.call('acl_add_replace', acl_index=0xffffffff, ...)
+        fanout.dump('sw_interface_dump')
+        fanout.disconnect()
+
+    Calls return a dictionary of instance name to result. If any instance
+    fails, VppFanoutError is raised carrying both the errors and the
+    results of the instances that succeeded.
+    """
+    VppFanoutError = VppFanoutError
+
+    def __init__(self, instances, apifiles=None, read_timeout=5):
+        if not apifiles:
+            apifiles = VPP.find_api_files()
+        self.messages = {}
+        self.services = {}
+        self.types = vpp_type_registry()
+        for file in apifiles:
+            process_api_file(file, self.messages, self.services, logger,
+                             self.types)
+        self.apidefs = ApiDefinitions(self.messages, self.services,
+                                      self.types, apifiles)
+        self.instances = collections.OrderedDict()
+        for name in sorted(instances):
+            params = instances[name]
+            if 'server_address' in params:
+                i = VppFanoutInstance(name, self.apidefs, read_timeout,
+                                      params['server_address'])
+            else:
+                i = VppFanoutShmInstance(name, self.apidefs, read_timeout,
+                                         params.get('chroot_prefix'))
+            self.instances[name] = i
+
+    def run(self, work, names=None):
+        """Run work(instance) for each instance in parallel.
+
+        Returns a dictionary of instance name to result.
+        """
+        if names is None:
+            names = list(self.instances)
+        results = {}
+        errors = {}
+
+        def runner(name):
+            try:
+                results[name] = work(self.instances[name])
+            except Exception as e:
+                logger.debug('Instance %s failed: %s', name, e)
+                errors[name] = e
+
+        threads = [threading.Thread(target=runner, args=(name,))
+                   for name in names]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise VppFanoutError(errors, results)
+        return results
+
+    def connect(self, name):
+        """Connect to every instance with client name name."""
+        return self.run(lambda i: i.connect(name))
+
+    def disconnect(self):
+        """Disconnect from every instance."""
+        return self.run(lambda i: i.disconnect())
+
+    def call(self, method, instances=None, **kwargs):
+        """Call API method with the same arguments on every instance.
+
+        instances - optional list of instance names to limit the call to.
+        """
+        return self.run(lambda i: i.call(method, kwargs), instances)
+
+    def call_each(self, method, kwargs_per_instance):
+        """Call API method with per-instance arguments.
+
+        kwargs_per_instance - dictionary of instance name to arguments.
+        """
+        return self.run(
+            lambda i: i.call(method, kwargs_per_instance[i.name]),
+            list(kwargs_per_instance))
+
+    def dump(self, method, instances=None, **kwargs):
+        """Call a dump on every instance.
+
+        Returns a list of (instance name, details) tuples.
+        """
+        results = self.call(method, instances, **kwargs)
+        return [(name, d) for name in sorted(results)
+                for d in results[name]]
@@ -24,23 +24,44 @@ import struct
 import json
 import threading
 import fnmatch
+import time
 import weakref
 import atexit
 from . vpp_serializer import VPPType, VPPEnumType, VPPUnionType, BaseTypes
 from . vpp_serializer import VPPMessage, vpp_get_type, VPPTypeAlias
+from . vpp_serializer import vpp_type_registry, get_registry, field_offset
 from . macaddress import MACAddress, mac_pton, mac_ntop
 
 logger = logging.getLogger(__name__)
 
 if sys.version[0] == '2':
     import Queue as queue
+    import imp
+
+    def load_source(name, path):
+        return imp.load_source(name, path)
 else:
     import queue as queue
+    import importlib.util
+
+    def load_source(name, path):
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered like imp.load_source() does
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        return module
 
 
 class VppEnumType(type):
     def __getattr__(cls, name):
         t = vpp_get_type(name)
+        if t is None:
+            # Look in the registries of the VPP objects
+            for vpp in list(VPP.instances):
+                t = vpp.get_type(name)
+                if t is not None:
+                    break
         return t.enum
 
 
@@ -51,6 +72,30 @@ class VppEnum(object):
     __metaclass__ = VppEnumType
 
 
+class VppMessageQueue(queue.Queue):
+    """Queue of decoded messages keeping a count per message type."""
+    def _init(self, maxsize):
+        queue.Queue._init(self, maxsize)
+        self.depths = {}
+
+    def _put(self, item):
+        name = type(item).__name__
+        self.depths[name] = self.depths.get(name, 0) + 1
+        queue.Queue._put(self, item)
+
+    def _get(self):
+        item = queue.Queue._get(self)
+        name = type(item).__name__
+        self.depths[name] -= 1
+        if not self.depths[name]:
+            del self.depths[name]
+        return item
+
+    def depth_by_type(self):
+        with self.mutex:
+            return dict(self.depths)
+
+
 def vpp_atexit(vpp_weakref):
     """Clean up VPP connection on shutdown."""
     vpp_instance = vpp_weakref()
@@ -113,6 +158,197 @@ class VPPValueError(ValueError):
     pass
 
 
+class VPPTimeoutError(VPPIOError):
+    pass
+
+
+class VPPCancelledError(VPPRuntimeError):
+    pass
+
+
+def type_dependencies(kind, data):
+    """Return the names of the types a type definition refers to."""
+    if kind == 'enum':
+        return []
+    if kind == 'alias':
+        return [data['type']]
+    return [f[0] for f in data[1:] if type(f) is not dict]
+
+
+def sort_type_definitions(definitions, registry):
+    """Order type definitions so that every type follows its dependencies.
+
+    definitions - dictionary of type name to (kind, data).
+    registry - type registry holding types already defined.
+
+    Raises VPPValueError naming the missing type or the cycle if the
+    definitions can't be resolved.
+    """
+    for name in sorted(definitions):
+        for d in type_dependencies(*definitions[name]):
+            if d not in definitions and d not in registry:
+                raise VPPValueError('Unknown type {} used by {}'
+                                    .format(d, name))
+
+    order = []
+    state = {}  # 1: visiting, 2: done
+    for root in sorted(definitions):
+        if root in state:
+            continue
+        # Iterative depth first search, deep chains must not recurse
+        state[root] = 1
+        stack = [(root, iter(type_dependencies(*definitions[root])))]
+        while stack:
+            name, deps = stack[-1]
+            for d in deps:
+                if d not in definitions:
+                    continue
+                if state.get(d) == 1:
+                    path = [n for n, _ in stack]
+                    cycle = path[path.index(d):] + [d]
+                    raise VPPValueError('Circular type definition {}'
+                                        .format(' -> '.join(cycle)))
+                if d not in state:
+                    state[d] = 1
+                    stack.append((d, iter(type_dependencies(
+                        *definitions[d]))))
+                    break
+            else:
+                stack.pop()
+                state[name] = 2
+                order.append(name)
+    return order
+
+
+def process_json_file(apidef_file, messages, services, logger=logger,
+                      registry=None):
+    """Load type and message definitions from an .api.json file.
+
+    Types are added to registry (default is the serializer's shared
+    registry), messages and services to the given dictionaries.
+    """
+    process_api_definitions(json.load(apidef_file), messages, services,
+                            logger, registry)
+
+
+def process_api_definitions(api, messages, services, logger=logger,
+                            registry=None):
+    """Load the decoded contents of an .api.json file.
+
+    The type definition lists in api are modified.
+    """
+    registry = get_registry(registry)
+    definitions = {}
+    for t in api['enums']:
+        t[0] = 'vl_api_' + t[0] + '_t'
+        definitions[t[0]] = ('enum', t)
+    for t in api['unions']:
+        t[0] = 'vl_api_' + t[0] + '_t'
+        definitions[t[0]] = ('union', t)
+    for t in api['types']:
+        t[0] = 'vl_api_' + t[0] + '_t'
+        definitions[t[0]] = ('type', t)
+    for t, v in api['aliases'].items():
+        definitions['vl_api_' + t + '_t'] = ('alias', v)
+    services.update(api['services'])
+
+    # Types imported from other files are already known
+    definitions = {k: v for k, v in definitions.items() if k not in registry}
+    for k in sort_type_definitions(definitions, registry):
+        kind, t = definitions[k]
+        if kind == 'enum':
+            VPPEnumType(t[0], t[1:], registry)
+        elif kind == 'union':
+            VPPUnionType(t[0], t[1:], registry)
+        elif kind == 'type':
+            VPPType(t[0], t[1:], registry)
+        elif kind == 'alias':
+            VPPTypeAlias(k, t, registry)
+
+    for m in api['messages']:
+        try:
+            messages[m[0]] = VPPMessage(m[0], m[1:], registry)
+        except VPPNotImplementedError:
+            logger.error('Not implemented error for {}'.format(m[0]))
+
+
+def load_api_module(apifile):
+    """Return the Python module generated by vppapigen next to an
+    .api.json file (foo.api.py for foo.api.json), or None if there is
+    none or it is older than the JSON file."""
+    if not apifile.endswith('.json'):
+        return None
+    path = apifile[:-len('.json')] + '.py'
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(apifile):
+            return None
+    except OSError:
+        return None
+    name = os.path.basename(path)[:-len('.py')].replace('.', '_')
+    return load_source('vpp_papi_generated_' + name, path)
+
+
+def process_api_module(module, messages, services, logger=logger,
+                       registry=None):
+    """Load the definitions of a module generated by vppapigen.
+
+    Messages with a fixed layout use the module's precompiled pack and
+    unpack functions and message classes.
+    """
+    api = {'services': module.services, 'aliases': module.aliases}
+    # The type lists are modified, leave the module's copy alone
+    for k in ('types', 'messages', 'unions', 'enums'):
+        api[k] = [list(t) for t in getattr(module, k)]
+    process_api_definitions(api, messages, services, logger, registry)
+
+    for name, (t, pack, unpack) in module.compiled.items():
+        msg = messages.get(name)
+        if msg is None or msg.tuple._fields != t._fields:
+            continue
+        msg.tuple = t
+        msg.pack = pack
+        msg.unpack = unpack
+
+
+# Name of the schema bundle vppapigen writes for the whole API tree
+api_bundle_name = 'vpp-api.bundle.json'
+
+
+def process_api_bundle(bundle, messages, services, logger=logger,
+                       registry=None):
+    """Load the decoded contents of a schema bundle.
+
+    A bundle, written by vppapigen --bundle, holds the definitions of
+    many .api.json files in one file, with the keys of an .api.json file.
+    Returns the names of the .api.json files the bundle holds.
+    """
+    if bundle.get('version') != 1:
+        raise VPPValueError('Unsupported API bundle version {}'
+                            .format(bundle.get('version')))
+    process_api_definitions(bundle, messages, services, logger, registry)
+    return list(bundle.get('files', {}))
+
+
+def process_api_file(apifile, messages, services, logger=logger,
+                     registry=None):
+    """Load an .api.json file, preferring the generated Python module, or
+    a schema bundle (a file named *.bundle.json).
+
+    Returns the names of the .api.json files held by a bundle, None for an
+    .api.json file."""
+    if apifile.endswith('.bundle.json'):
+        with open(apifile) as f:
+            return process_api_bundle(json.load(f), messages, services,
+                                      logger, registry)
+    module = load_api_module(apifile)
+    if module is not None:
+        logger.debug('Loading generated module for {}'.format(apifile))
+        process_api_module(module, messages, services, logger, registry)
+        return
+    with open(apifile) as apidef_file:
+        process_json_file(apidef_file, messages, services, logger, registry)
+
+
 class VPP(object):
     """VPP interface.
 
@@ -130,74 +366,38 @@ class VPP(object):
     VPPValueError = VPPValueError
     VPPNotImplementedError = VPPNotImplementedError
     VPPIOError = VPPIOError
+    VPPTimeoutError = VPPTimeoutError
+    VPPCancelledError = VPPCancelledError
 
-    def process_json_file(self, apidef_file):
-        api = json.load(apidef_file)
-        types = {}
-        for t in api['enums']:
-            t[0] = 'vl_api_' + t[0] + '_t'
-            types[t[0]] = {'type': 'enum', 'data': t}
-        for t in api['unions']:
-            t[0] = 'vl_api_' + t[0] + '_t'
-            types[t[0]] = {'type': 'union', 'data': t}
-        for t in api['types']:
-            t[0] = 'vl_api_' + t[0] + '_t'
-            types[t[0]] = {'type': 'type', 'data': t}
-        for t, v in api['aliases'].items():
-            types['vl_api_' + t + '_t'] = {'type': 'alias', 'data': v}
-        self.services.update(api['services'])
-
-        i = 0
-        while True:
-            unresolved = {}
-            for k, v in types.items():
-                t = v['data']
-                if not vpp_get_type(k):
-                    if v['type'] == 'enum':
-                        try:
-                            VPPEnumType(t[0], t[1:])
-                        except ValueError:
-                            unresolved[k] = v
-                    elif v['type'] == 'union':
-                        try:
-                            VPPUnionType(t[0], t[1:])
-                        except ValueError:
-                            unresolved[k] = v
-                    elif v['type'] == 'type':
-                        try:
-                            VPPType(t[0], t[1:])
-                        except ValueError:
-                            unresolved[k] = v
-                    elif v['type'] == 'alias':
-                        try:
-                            VPPTypeAlias(k, t)
-                        except ValueError:
-                            unresolved[k] = v
-            if len(unresolved) == 0:
-                break
-            if i > 3:
-                raise VPPValueError('Unresolved type definitions {}'
-                                    .format(unresolved))
-            types = unresolved
-            i += 1
+    # Live VPP objects, for VppEnum lookups
+    instances = weakref.WeakSet()
 
-        for m in api['messages']:
-            try:
-                self.messages[m[0]] = VPPMessage(m[0], m[1:])
-            except VPPNotImplementedError:
-                self.logger.error('Not implemented error for {}'.format(m[0]))
+    def process_json_file(self, apidef_file):
+        process_json_file(apidef_file, self.messages, self.services,
+                          self.logger, self.types)
 
     def __init__(self, apifiles=None, testmode=False, async_thread=True,
                  logger=None, loglevel=None,
                  read_timeout=5, use_socket=False,
-                 server_address='/run/vpp-api.sock'):
+                 server_address='/run/vpp-api.sock', apidefs=None):
         """Create a VPP API object.
 
         apifiles is a list of files containing API
         descriptions that will be loaded - methods will be
         dynamically created reflecting these APIs.  If not
         provided this will load the API files from VPP's
-        default install location.
+        default install location, from the schema bundle if there is
+        one, and the API files the bundle doesn't hold. A bundle is
+        loaded instead of the .api.json files it holds listed after
+        it. If vppapigen generated a Python module next to an API file
+        (foo.api.py for foo.api.json), the module is loaded instead.
+
+        apidefs, if supplied, is another VPP object (or any object with
+        messages, services, types and apifiles attributes) whose API
+        definitions are shared instead of loading apifiles.
+
+        Each VPP object has its own registry of types, unless it shares
+        the definitions of another.
 
         logger, if supplied, is the logging logger object to log to.
         loglevel, if supplied, is the log level this logger is set
@@ -211,13 +411,26 @@ class VPP(object):
 
         self.messages = {}
         self.services = {}
+        self.types = vpp_type_registry()
         self.id_names = []
         self.id_msgdef = []
         self.header = VPPType('header', [['u16', 'msgid'],
-                                         ['u32', 'client_index']])
+                                         ['u32', 'client_index']],
+                              self.types)
         self.apifiles = []
         self.event_callback = None
-        self.message_queue = queue.Queue()
+        self.message_queue = VppMessageQueue()
+        self.msgid = struct.Struct('>H')
+        self.u32 = struct.Struct('>I')
+        self.id_context = []
+        self.event_filter = None
+        self.dropped = {}
+        # Requests sent with send(), context -> multipart
+        self.pending = {}
+        # Abandoned requests whose replies are drained, context -> multipart
+        self.cancelled = {}
+        self.cancel_requests = set()
+        self.name_ids = {}
         self.read_timeout = read_timeout
         self.async_thread = async_thread
 
@@ -226,10 +439,19 @@ class VPP(object):
         else:
             from . vpp_transport_shmem import VppTransport
 
-        if not apifiles:
-            # Pick up API definitions from default directory
+        if apidefs:
+            self.messages = apidefs.messages
+            self.services = apidefs.services
+            self.types = apidefs.types
+            apifiles = apidefs.apifiles
+        elif not apifiles:
+            # Pick up API definitions from default directory, the bundle
+            # holds those built with VPP
             try:
+                bundle = self.find_api_bundle()
                 apifiles = self.find_api_files()
+                if bundle:
+                    apifiles = [bundle] + apifiles
             except RuntimeError:
                 # In test mode we don't care that we can't find the API files
                 if testmode:
@@ -237,9 +459,19 @@ class VPP(object):
                 else:
                     raise VPPRuntimeError
 
-        for file in apifiles:
-            with open(file) as apidef_file:
-                self.process_json_file(apidef_file)
+        if not apidefs:
+            # .api.json files held by a bundle are not loaded again. The
+            # bundle names them by their path in the build tree, the
+            # installed files only keep their name.
+            bundled = set()
+            for file in apifiles:
+                if os.path.basename(file) in bundled:
+                    continue
+                members = process_api_file(file, self.messages,
+                                           self.services, self.logger,
+                                           self.types)
+                if members:
+                    bundled.update(os.path.basename(m) for m in members)
 
         self.apifiles = apifiles
 
@@ -251,6 +483,7 @@ class VPP(object):
                                       server_address=server_address)
         # Make sure we allow VPP to clean up the message rings.
         atexit.register(vpp_atexit, weakref.ref(self))
+        VPP.instances.add(self)
 
     class ContextId(object):
         """Thread-safe provider of unique context IDs."""
@@ -266,7 +499,7 @@ class VPP(object):
     get_context = ContextId()
 
     def get_type(self, name):
-        return vpp_get_type(name)
+        return vpp_get_type(name, self.types)
 
     @classmethod
     def find_api_dir(cls):
@@ -352,6 +585,17 @@ class VPP(object):
 
         return None
 
+    @classmethod
+    def find_api_bundle(cls, api_dir=None):
+        """Return the path of the schema bundle in api_dir (default is
+        find_api_dir()), or None if there is none."""
+        if api_dir is None:
+            api_dir = cls.find_api_dir()
+            if api_dir is None:
+                return None
+        path = os.path.join(api_dir, api_bundle_name)
+        return path if os.path.isfile(path) else None
+
     @classmethod
     def find_api_files(cls, api_dir=None, patterns='*'):
         """Find API definition files from the given directory tree with the
@@ -415,6 +659,7 @@ class VPP(object):
     def _register_functions(self, do_async=False):
         self.id_names = [None] * (self.vpp_dictionary_maxid + 1)
         self.id_msgdef = [None] * (self.vpp_dictionary_maxid + 1)
+        self.id_context = [None] * (self.vpp_dictionary_maxid + 1)
         self._api = VppApiDynamicMethodHolder()
         for name, msg in vpp_iterator(self.messages):
             n = name + '_' + msg.crc[2:]
@@ -422,6 +667,8 @@ class VPP(object):
             if i > 0:
                 self.id_msgdef[i] = msg
                 self.id_names[i] = name
+                self.id_context[i] = field_offset(msg, 'context')
+                self.name_ids[name] = i
 
                 # Create function for client side messages.
                 if name in self.services:
@@ -493,42 +740,158 @@ class VPP(object):
         """Process an incoming message from VPP in sync mode.
 
         The message may be a reply or it may be an async notification.
+        No call waits for a reply while the receive thread runs, so a
+        reply is either to a request made with send(), or the late
+        remainder of a cancelled or timed out call, drained here.
         """
-        r = self.decode_incoming_msg(msg)
+        r = self.decode_received(msg)
         if r is None:
             return
-
-        # If we have a context, then use the context to find any
-        # request waiting for a reply
-        context = 0
-        if hasattr(r, 'context') and r.context > 0:
-            context = r.context
-
-        if context == 0:
-            # No context -> async notification that we feed to the callback
-            self.message_queue.put_nowait(r)
-        else:
-            raise VPPIOError(2, 'RPC reply message received in event handler')
+        self.message_queue.put_nowait(r)
 
     def has_context(self, msg):
         if len(msg) < 10:
             return False
 
-        header = VPPType('header_with_context', [['u16', 'msgid'],
-                                                 ['u32', 'client_index'],
-                                                 ['u32', 'context']])
-
-        (i, ci, context), size = header.unpack(msg, 0)
+        (i,) = self.msgid.unpack_from(msg)
         if self.id_names[i] == 'rx_thread_exit':
             return
+        return self.id_context[i] is not None
 
-        #
-        # Decode message and returns a tuple.
-        #
-        msgobj = self.id_msgdef[i]
-        if 'context' in msgobj.field_by_name and context >= 0:
-            return True
-        return False
+    def peek(self, msg):
+        """Return the message id and context of a message.
+
+        Only the header is looked at. Context is 0 for messages without.
+        """
+        (i,) = self.msgid.unpack_from(msg)
+        offset = self.id_context[i] if i < len(self.id_context) else None
+        if offset is None or len(msg) < offset + 4:
+            return i, 0
+        return i, self.u32.unpack_from(msg, offset)[0]
+
+    def set_event_filter(self, names):
+        """Limit the unsolicited messages that are decoded.
+
+        names - message names to deliver to the event callback or message
+        queue, None for all. Other messages arriving outside of a call
+        (events and stale replies) are counted and dropped undecoded.
+        """
+        self.event_filter = set(names) if names is not None else None
+
+    def wants_message(self, i):
+        """Return True if an unsolicited message has a consumer."""
+        if self.event_filter is not None:
+            return i < len(self.id_names) and \
+                self.id_names[i] in self.event_filter
+        # The event thread only feeds the callback
+        if self.async_thread and not self.event_callback:
+            return False
+        return True
+
+    def drop_message(self, i):
+        name = self.id_names[i] if i < len(self.id_names) else None
+        name = name or str(i)
+        self.dropped[name] = self.dropped.get(name, 0) + 1
+
+    def message_stats(self):
+        """Return counters for unsolicited messages.
+
+        dropped - messages dropped without decoding, by message name.
+        queued - messages waiting in message_queue, by message name.
+        """
+        return {'dropped': dict(self.dropped),
+                'queued': self.message_queue.depth_by_type(),
+                'draining': len(self.cancelled)}
+
+    def cancel(self, context):
+        """Cancel the request with the given context.
+
+        A call blocked waiting for the reply raises VPPCancelledError (on
+        the shared memory transport only once a message arrives or the
+        call times out). The rest of the reply is drained and dropped
+        when it arrives.
+        """
+        if context in self.pending:
+            self.cancelled[context] = self.pending.pop(context)
+            return
+        self.cancel_requests.add(context)
+        self.transport.wakeup()
+
+    def send(self, name, **kwargs):
+        """Send a request without waiting for the reply.
+
+        Returns the context. Replies are returned by poll(), the end of a
+        multipart reply is marked by a control_ping_reply with the same
+        context.
+        """
+        msgdef = self.messages[name]
+        i = self.name_ids.get(name)
+        if not i:
+            raise VPPValueError('Message {} not supported by VPP'
+                                .format(name))
+        if 'context' not in kwargs:
+            kwargs['context'] = self.get_context()
+        context = kwargs['context']
+        self.validate_args(msgdef, kwargs)
+        service = self.services.get(name, {})
+        multipart = service.get('stream', False)
+        self.pending[context] = multipart
+        self._call_vpp_async(i, msgdef, **kwargs)
+        if multipart:
+            self._control_ping(context)
+        return context
+
+    def poll(self, max_msgs=64):
+        """Return the replies and events that are ready, without blocking.
+
+        Replies to requests made with send() are always returned, other
+        messages as if they were events.
+        """
+        result = []
+        while len(result) < max_msgs:
+            try:
+                r = self.message_queue.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(r, str):
+                result.append(r)
+        while len(result) < max_msgs:
+            msg = self.transport.read_nowait()
+            if msg is None:
+                break
+            r = self.decode_received(msg)
+            if r is not None:
+                result.append(r)
+        return result
+
+    def decode_received(self, msg):
+        """Decode a message no call is blocked waiting for.
+
+        Replies to requests made with send() are always decoded, other
+        messages as if they were events.
+        """
+        i, context = self.peek(msg)
+        if context in self.pending:
+            if not self.pending[context] or \
+               self.id_names[i] == 'control_ping_reply':
+                del self.pending[context]
+            return self.decode_incoming_msg(msg)
+        return self.decode_unsolicited(msg)
+
+    def decode_unsolicited(self, msg, no_type_conversion=False):
+        """Decode a message nobody waits for, or drop it unwanted."""
+        i, context = self.peek(msg)
+        if context in self.cancelled:
+            # Remainder of an abandoned request
+            if not self.cancelled[context] or \
+               self.id_names[i] == 'control_ping_reply':
+                del self.cancelled[context]
+            self.drop_message(i)
+            return None
+        if not self.wants_message(i):
+            self.drop_message(i)
+            return None
+        return self.decode_incoming_msg(msg, no_type_conversion)
 
     def decode_incoming_msg(self, msg, no_type_conversion=False):
         if not msg:
@@ -554,7 +917,10 @@ class VPP(object):
 
         In async mode, all messages are returned to the callback.
         """
-        r = self.decode_incoming_msg(msg)
+        if not self.event_callback:
+            self.drop_message(self.msgid.unpack_from(msg)[0])
+            return
+        r = self.decode_unsolicited(msg)
         if r is None:
             return
 
@@ -584,11 +950,14 @@ class VPP(object):
         messages in return.
         context - context number - chosen at random if not
         supplied.
+        _timeout - optional deadline for the whole call in seconds.
         The remainder of the kwargs are the arguments to the API call.
 
         The return value is the message or message array containing
         the response.  It will raise an IOError exception if there was
-        no response within the timeout window.
+        no response within the timeout window, VPPTimeoutError if the
+        deadline passed and VPPCancelledError if cancel() was called.
+        The rest of an abandoned reply is drained in the background.
         """
 
         if 'context' not in kwargs:
@@ -599,6 +968,8 @@ class VPP(object):
         kwargs['_vl_msg_id'] = i
 
         no_type_conversion = kwargs.pop('_no_type_conversion', False)
+        timeout = kwargs.pop('_timeout', None)
+        deadline = time.time() + timeout if timeout is not None else None
 
         try:
             if self.transport.socket_index:
@@ -619,28 +990,67 @@ class VPP(object):
             # to detect that we have seen all results.
             self._control_ping(context)
 
-        # Block until we get a reply.
-        rl = []
-        while (True):
-            msg = self.transport.read()
-            if not msg:
-                raise VPPIOError(2, 'VPP API client: read failed')
-            r = self.decode_incoming_msg(msg, no_type_conversion)
-            msgname = type(r).__name__
-            if context not in r or r.context == 0 or context != r.context:
-                # Message being queued
-                self.message_queue.put_nowait(r)
-                continue
+        def decode(msg):
+            if self.peek(msg)[1] == context:
+                return self.decode_incoming_msg(msg, no_type_conversion)
+            return self.decode_unsolicited(msg, no_type_conversion)
 
-            if not multipart:
-                rl = r
-                break
-            if msgname == 'control_ping_reply':
-                break
+        def abandon(error):
+            # Drop the rest of the reply when it arrives
+            self.cancel_requests.discard(context)
+            self.cancelled[context] = multipart
+            raise error
 
-            rl.append(r)
+        # Block until we get a reply.
+        rl = []
+        done = False
+        while not done:
+            if context in self.cancel_requests:
+                self.transport.resume()
+                abandon(VPPCancelledError('Call cancelled'))
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+            try:
+                msgs = [] if remaining is not None and remaining <= 0 \
+                    else self.transport.read_decoded(decode,
+                                                     timeout=remaining)
+            except IOError:
+                if deadline is None or time.time() < deadline:
+                    self.transport.resume()
+                    abandon(VPPIOError(2, 'VPP API client: read failed'))
+                msgs = []
+            if not msgs:
+                self.transport.resume()
+                if context in self.cancel_requests:
+                    abandon(VPPCancelledError('Call cancelled'))
+                if deadline is not None and time.time() >= deadline:
+                    abandon(VPPTimeoutError(2, 'Call timed out'))
+                abandon(VPPIOError(2, 'VPP API client: read failed'))
+            for r in msgs:
+                if r is None:
+                    continue
+                if done:
+                    # Read past the reply in the same batch
+                    self.message_queue.put_nowait(r)
+                    continue
+                msgname = type(r).__name__
+                if context not in r or r.context == 0 or \
+                   context != r.context:
+                    # Message being queued
+                    self.message_queue.put_nowait(r)
+                    continue
+
+                if not multipart:
+                    rl = r
+                    done = True
+                elif msgname == 'control_ping_reply':
+                    done = True
+                else:
+                    rl.append(r)
 
         self.transport.resume()
+        self.cancel_requests.discard(context)
 
         logger.debug(return_logger(rl))
         return rl
@@ -45,10 +45,11 @@ def conversion_required(data, field_type):
         return False
 
 
-def conversion_packer(data, field_type):
+def conversion_packer(data, field_type, packer=None):
     t = type(data).__name__
-    return types[field_type].pack(vpp_format.
-                                  conversion_table[field_type][t](data))
+    if packer is None:
+        packer = types[field_type]
+    return packer.pack(vpp_format.conversion_table[field_type][t](data))
 
 
 def conversion_unpacker(data, field_type):
@@ -112,9 +113,24 @@ types = {'u8': BaseTypes('u8'), 'u16': BaseTypes('u16'),
          'bool': BaseTypes('bool'), 'string': String()}
 
 
-def vpp_get_type(name):
+def vpp_type_registry():
+    """Return a new type registry holding only the base types.
+
+    Every type constructor takes an optional registry to look up field
+    types in and to register itself with. Without one, the module level
+    registry shared by all users is used.
+    """
+    return {k: v for k, v in types.items() if
+            isinstance(v, (BaseTypes, String))}
+
+
+def get_registry(registry):
+    return types if registry is None else registry
+
+
+def vpp_get_type(name, registry=None):
     try:
-        return types[name]
+        return get_registry(registry)[name]
     except KeyError:
         return None
 
@@ -146,11 +162,11 @@ class FixedList_u8(object):
         return self.packer.pack(data)
 
     def unpack(self, data, offset=0, result=None, ntc=False):
-        if len(data[offset:]) < self.num:
+        if len(data) - offset < self.num:
             raise VPPSerializerValueError(
                 'Invalid array length for "{}" got {}'
                 ' expected {}'
-                .format(self.name, len(data[offset:]), self.num))
+                .format(self.name, len(data) - offset, self.num))
         if self.field_type == 'string':
             s = self.packer.unpack(data, offset)
             s2 = s[0].split(b'\0', 1)[0]
@@ -159,9 +175,9 @@ class FixedList_u8(object):
 
 
 class FixedList(object):
-    def __init__(self, name, field_type, num):
+    def __init__(self, name, field_type, num, registry=None):
         self.num = num
-        self.packer = types[field_type]
+        self.packer = get_registry(registry)[field_type]
         self.size = self.packer.size * num
         self.name = name
         self.field_type = field_type
@@ -189,11 +205,12 @@ class FixedList(object):
 
 
 class VLAList(object):
-    def __init__(self, name, field_type, len_field_name, index):
+    def __init__(self, name, field_type, len_field_name, index,
+                 registry=None):
         self.name = name
         self.field_type = field_type
         self.index = index
-        self.packer = types[field_type]
+        self.packer = get_registry(registry)[field_type]
         self.size = self.packer.size
         self.length_field = len_field_name
 
@@ -236,8 +253,8 @@ class VLAList(object):
 
 
 class VLAList_legacy():
-    def __init__(self, name, field_type):
-        self.packer = types[field_type]
+    def __init__(self, name, field_type, registry=None):
+        self.packer = get_registry(registry)[field_type]
         self.size = self.packer.size
 
     def pack(self, list, kwargs=None):
@@ -266,7 +283,7 @@ class VLAList_legacy():
 
 
 class VPPEnumType(object):
-    def __init__(self, name, msgdef):
+    def __init__(self, name, msgdef, registry=None):
         self.size = types['u32'].size
         e_hash = {}
         for f in msgdef:
@@ -277,7 +294,7 @@ class VPPEnumType(object):
             ename, evalue = f
             e_hash[ename] = evalue
         self.enum = IntEnum(name, e_hash)
-        types[name] = self
+        get_registry(registry)[name] = self
 
     def __getattr__(self, name):
         return self.enum[name]
@@ -294,7 +311,8 @@ class VPPEnumType(object):
 
 
 class VPPUnionType(object):
-    def __init__(self, name, msgdef):
+    def __init__(self, name, msgdef, registry=None):
+        types = get_registry(registry)
         self.name = name
         self.size = 0
         self.maxindex = 0
@@ -344,9 +362,10 @@ class VPPUnionType(object):
 
 
 class VPPTypeAlias(object):
-    def __init__(self, name, msgdef):
+    def __init__(self, name, msgdef, registry=None):
+        types = get_registry(registry)
         self.name = name
-        t = vpp_get_type(msgdef['type'])
+        t = types.get(msgdef['type'])
         if not t:
             raise ValueError()
         if 'length' in msgdef:
@@ -357,7 +376,8 @@ class VPPTypeAlias(object):
                                            msgdef['length'])
                 self.size = self.packer.size
             else:
-                self.packer = FixedList(name, msgdef['type'], msgdef['length'])
+                self.packer = FixedList(name, msgdef['type'], msgdef['length'],
+                                        types)
         else:
             self.packer = t
             self.size = t.size
@@ -367,7 +387,7 @@ class VPPTypeAlias(object):
     def pack(self, data, kwargs=None):
         if data and conversion_required(data, self.name):
             try:
-                return conversion_packer(data, self.name)
+                return conversion_packer(data, self.name, self)
             # Python 2 and 3 raises different exceptions from inet_pton
             except(OSError, socket.error, TypeError):
                 pass
@@ -383,7 +403,8 @@ class VPPTypeAlias(object):
 
 class VPPType(object):
     # Set everything up to be able to pack / unpack
-    def __init__(self, name, msgdef):
+    def __init__(self, name, msgdef, registry=None):
+        types = get_registry(registry)
         self.name = name
         self.msgdef = msgdef
         self.packers = []
@@ -406,28 +427,41 @@ class VPPType(object):
             if len(f) == 3:  # list
                 list_elements = f[2]
                 if list_elements == 0:
-                    p = VLAList_legacy(f_name, f_type)
+                    p = VLAList_legacy(f_name, f_type, types)
                     self.packers.append(p)
                 elif f_type == 'u8' or f_type == 'string':
                     p = FixedList_u8(f_name, f_type, list_elements)
                     self.packers.append(p)
                     size += p.size
                 else:
-                    p = FixedList(f_name, f_type, list_elements)
+                    p = FixedList(f_name, f_type, list_elements, types)
                     self.packers.append(p)
                     size += p.size
             elif len(f) == 4:  # Variable length list
                 length_index = self.fields.index(f[3])
-                p = VLAList(f_name, f_type, f[3], length_index)
+                p = VLAList(f_name, f_type, f[3], length_index, types)
                 self.packers.append(p)
             else:
                 self.packers.append(types[f_type])
                 size += types[f_type].size
 
         self.size = size
-        self.tuple = collections.namedtuple(name, self.fields, rename=True)
+        self._tuple = None
         types[name] = self
 
+    @property
+    def tuple(self):
+        # Created on first use, creating the classes of all the messages
+        # is most of the time taken to load the API definitions
+        if self._tuple is None:
+            self._tuple = collections.namedtuple(self.name, self.fields,
+                                                 rename=True)
+        return self._tuple
+
+    @tuple.setter
+    def tuple(self, value):
+        self._tuple = value
+
     def pack(self, data, kwargs=None):
         if not kwargs:
             kwargs = data
@@ -435,7 +469,7 @@ class VPPType(object):
 
         # Try one of the format functions
         if data and conversion_required(data, self.name):
-            return conversion_packer(data, self.name)
+            return conversion_packer(data, self.name, self)
 
         for i, a in enumerate(self.fields):
             if data and type(data) is not dict and a not in data:
@@ -476,3 +510,18 @@ class VPPType(object):
 
 class VPPMessage(VPPType):
     pass
+
+
+def field_offset(msgdef, name):
+    """Return the offset of a field in a message, or None.
+
+    Only fields preceded by fixed size fields can be located.
+    """
+    offset = 0
+    for f, p in zip(msgdef.fields, msgdef.packers):
+        if f == name:
+            return offset
+        if isinstance(p, (VLAList, VLAList_legacy, String)):
+            return None
+        offset += p.size
+    return None
@@ -3,6 +3,13 @@
 from __future__ import print_function
 from cffi import FFI
 import time
+import fnmatch
+import threading
+import logging
+try:
+    from itertools import zip_longest
+except ImportError:
+    from itertools import izip_longest as zip_longest
 
 ffi = FFI()
 ffi.cdef("""
@@ -138,6 +145,82 @@ def stat_entry_to_python(api, e):
     return None
 
 
+def sum_over_threads(v):
+    """Aggregate a [thread][index] counter vector over threads."""
+    if not v:
+        return []
+    if v[0] and isinstance(v[0][0], dict):
+        empty = {'packets': 0, 'bytes': 0}
+        return [{'packets': sum(c['packets'] for c in per_index),
+                 'bytes': sum(c['bytes'] for c in per_index)}
+                for per_index in zip_longest(*v, fillvalue=empty)]
+    return [sum(per_index) for per_index in zip_longest(*v, fillvalue=0)]
+
+
+def counter_total(c):
+    """Packets of a combined counter, or the simple counter value."""
+    return c['packets'] if isinstance(c, dict) else c
+
+
+def interface_names_from_api(vpp):
+    """Return a function mapping sw_if_index to name using the binary API.
+
+    vpp is a connected vpp_papi.VPP object. Suitable as name source for
+    VPPStats.set_interface_names().
+    """
+    def names():
+        r = {}
+        for i in vpp.api.sw_interface_dump():
+            name = i.interface_name
+            if isinstance(name, bytes):
+                name = name.rstrip(b'\x00').decode()
+            r[i.sw_if_index] = name
+        return r
+    return names
+
+
+class VPPStatsWatcher(object):
+    """A condition on a counter, evaluated by VPPStats.poll_watchers().
+
+    mode is one of:
+      'value' - fire when the value is above threshold
+      'delta' - fire when the value increased by more than threshold
+                since the previous sample
+      'rate'  - fire when the value increased by more than threshold
+                per second
+
+    Vector counters are summed over threads. index selects a single
+    entry (e.g. sw_if_index), interface selects one by name (see
+    VPPStats.set_interface_names()); with neither every entry is checked.
+    callback is called as callback(watcher, index, value) for every
+    sample where the condition holds, with the value, delta or rate.
+    """
+    modes = ('value', 'delta', 'rate')
+
+    def __init__(self, counter, callback, threshold=0, mode='value',
+                 index=None, interface=None):
+        if mode not in self.modes:
+            raise ValueError('Unknown watcher mode: {}'.format(mode))
+        self.counter = counter
+        self.callback = callback
+        self.threshold = threshold
+        self.mode = mode
+        self.index = index
+        self.interface = interface
+
+    def __repr__(self):
+        return 'VPPStatsWatcher({}, {} > {})'.format(self.counter,
+                                                     self.mode,
+                                                     self.threshold)
+
+
+def watched_values(v):
+    """Flatten a counter value into a list, summing over threads."""
+    if isinstance(v, list):
+        return [counter_total(c) for c in sum_over_threads(v)]
+    return [v]
+
+
 class VPPStatsIOError(IOError):
     pass
 
@@ -170,6 +253,22 @@ class VPPStats(object):
         if rv != 0:
             raise VPPStatsIOError()
 
+        self._init_state()
+
+    def _init_state(self):
+        self.interface_name_source = None
+        self.interface_names = {}
+        self.interface_names_length = 0
+        self.node_name_source = None
+        self.node_names = {}
+        self.node_names_length = 0
+        self.watchers = []
+        self.watch_dir = None
+        self.watch_prev = None
+        self.watch_thread = None
+        self.watch_stop = threading.Event()
+        self.watch_lock = threading.Lock()
+
     def heartbeat(self):
         return self.api.stat_segment_heartbeat_r(self.client)
 
@@ -209,6 +308,7 @@ class VPPStats(object):
                 retries += 1
 
     def disconnect(self):
+        self.stop_watchers()
         self.api.stat_segment_disconnect_r(self.client)
         self.api.stat_client_free(self.client)
 
@@ -235,3 +335,214 @@ class VPPStats(object):
         for k in sorted(error_counters):
             s += '{:<60}{:>10}\n'.format(k, error_counters[k])
         return s
+
+    def set_interface_names(self, source):
+        """Set how interface indexes are mapped to names.
+
+        source is either a dictionary {sw_if_index: name} or a function
+        returning one, e.g. interface_names_from_api(vpp). A function is
+        only called again when a counter vector grew past the length it
+        was last called for, or after invalidate_names(). Indexes left
+        without a name by deleted interfaces keep their counters, they
+        don't cause a refresh.
+        """
+        self._set_names('interface', source)
+
+    def set_node_names(self, source):
+        """Set how node indexes (/sys/node/ counters) are mapped to names.
+
+        Same semantics as set_interface_names().
+        """
+        self._set_names('node', source)
+
+    def _set_names(self, kind, source):
+        if callable(source):
+            setattr(self, kind + '_name_source', source)
+            setattr(self, kind + '_names', {})
+        else:
+            setattr(self, kind + '_name_source', None)
+            setattr(self, kind + '_names', dict(source))
+        setattr(self, kind + '_names_length', 0)
+
+    def invalidate_names(self):
+        """Call the interface and node name sources again on the next
+        read, e.g. after objects were deleted and their indexes reused."""
+        self.interface_names_length = -1
+        self.node_names_length = -1
+
+    def _names(self, kind, values):
+        """Return the names of kind for a counter vector, values per index
+        summed over threads. Every index below the length the names were
+        fetched for is known: those without a name belong to deleted
+        objects, whose counters VPP doesn't clear."""
+        names = getattr(self, kind + '_names')
+        source = getattr(self, kind + '_name_source')
+        if not source:
+            return names
+        length = getattr(self, kind + '_names_length')
+        if length < 0 or len(values) > length:
+            names = source()
+            setattr(self, kind + '_names', names)
+            setattr(self, kind + '_names_length', len(values))
+        return names
+
+    def _named(self, kind, counter, pattern):
+        v = sum_over_threads(self.get_counter(counter))
+        names = self._names(kind, v)
+        r = {}
+        for i, c in enumerate(v):
+            name = names.get(i)
+            if name is None or not fnmatch.fnmatchcase(name, pattern):
+                continue
+            r[name] = c
+        return r
+
+    def get_counter_sum(self, name):
+        """Return a vector counter aggregated over all threads."""
+        return sum_over_threads(self.get_counter(name))
+
+    def get_interface_counters(self, counter, pattern='*'):
+        """Return {interface name: value} for an /if/ counter.
+
+        Values are summed over threads, and only interfaces whose name
+        matches the shell-style pattern are included.
+        """
+        return self._named('interface', counter, pattern)
+
+    def get_node_counters(self, counter, pattern='*'):
+        """Return {node name: value} for a /sys/node/ counter."""
+        return self._named('node', counter, pattern)
+
+    def get_thread_imbalance(self, counter, pattern='*'):
+        """Report how an /if/ counter is spread over the worker threads.
+
+        Returns {interface name: (per-thread values, imbalance)} where
+        imbalance is the busiest thread's share relative to an even
+        spread: 1.0 is perfectly balanced, n_threads means a single thread
+        does all the work. Combined counters are compared by packets.
+        """
+        v = self.get_counter(counter)
+        length = max(len(t) for t in v) if v else 0
+        names = self._names('interface', sum_over_threads(v))
+        r = {}
+        for i in range(length):
+            name = names.get(i)
+            if name is None or not fnmatch.fnmatchcase(name, pattern):
+                continue
+            per_thread = [counter_total(t[i]) if i < len(t) else 0
+                          for t in v]
+            total = sum(per_thread)
+            imbalance = (max(per_thread) * len(per_thread) / float(total)
+                         if total else 1.0)
+            r[name] = (per_thread, imbalance)
+        return r
+
+    def add_watcher(self, counter, callback, threshold=0, mode='value',
+                    index=None, interface=None):
+        """Register a VPPStatsWatcher, see its documentation.
+
+        All watchers are evaluated together by poll_watchers(), which
+        reads every watched counter with a single dump.
+        """
+        w = VPPStatsWatcher(counter, callback, threshold, mode, index,
+                            interface)
+        with self.watch_lock:
+            self.watchers.append(w)
+            self.watch_dir = None
+        return w
+
+    def remove_watcher(self, w):
+        with self.watch_lock:
+            self.watchers.remove(w)
+            self.watch_dir = None
+
+    def _watch_sample(self, counters):
+        retries = 0
+        while True:
+            try:
+                if self.watch_dir is None:
+                    self.watch_dir = self.ls(counters)
+                return self.dump(self.watch_dir)
+            except VPPStatsIOError:
+                # Directory changed, list the counters again
+                self.watch_dir = None
+                if retries > 10:
+                    raise
+                retries += 1
+
+    def poll_watchers(self, now=None):
+        """Sample all watched counters once and run the callbacks."""
+        with self.watch_lock:
+            watchers = list(self.watchers)
+            if not watchers:
+                return
+            counters = sorted(set(w.counter for w in watchers))
+            sample = self._watch_sample(counters)
+        now = time.time() if now is None else now
+
+        # Flatten every counter once, shared by all its watchers
+        values = {c: watched_values(sample[c])
+                  for c in counters if c in sample}
+        prev, prev_time = self.watch_prev or ({}, None)
+        self.watch_prev = (values, now)
+        deltas = {}
+
+        for w in watchers:
+            cur = values.get(w.counter)
+            if cur is None:
+                continue
+            if w.mode == 'value':
+                v = cur
+            else:
+                if w.counter not in prev:
+                    continue
+                if w.counter not in deltas:
+                    p = prev[w.counter]
+                    deltas[w.counter] = [c - (p[i] if i < len(p) else 0)
+                                         for i, c in enumerate(cur)]
+                v = deltas[w.counter]
+                if w.mode == 'rate':
+                    dt = now - prev_time
+                    if dt <= 0:
+                        continue
+                    v = [d / dt for d in v]
+
+            if w.interface is not None:
+                names = self._names('interface', v)
+                indexes = [i for i, n in names.items() if n == w.interface]
+            elif w.index is not None:
+                indexes = [w.index]
+            else:
+                indexes = range(len(v))
+            for i in indexes:
+                if i < len(v) and v[i] > w.threshold:
+                    try:
+                        w.callback(w, i, v[i])
+                    except Exception:
+                        logging.exception('Watcher {} failed'.format(w))
+
+    def _watch_loop(self, interval):
+        while not self.watch_stop.is_set():
+            start = time.time()
+            try:
+                self.poll_watchers(start)
+            except VPPStatsIOError:
+                logging.warning('Sampling watched counters failed')
+            self.watch_stop.wait(max(0, interval - (time.time() - start)))
+
+    def start_watchers(self, interval=1.0):
+        """Evaluate the watchers every interval seconds in a thread."""
+        if self.watch_thread:
+            return
+        self.watch_stop.clear()
+        self.watch_thread = threading.Thread(target=self._watch_loop,
+                                             args=(interval,))
+        self.watch_thread.daemon = True
+        self.watch_thread.start()
+
+    def stop_watchers(self):
+        if not self.watch_thread:
+            return
+        self.watch_stop.set()
+        self.watch_thread.join()
+        self.watch_thread = None
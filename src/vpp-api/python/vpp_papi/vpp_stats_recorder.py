@@ -0,0 +1,484 @@
+#
+# Copyright (c) 2019 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# On-disk time-series recorder for stats segment snapshots.
+#
+# A recording is a directory of files, one per roll interval. Each file
+# starts with a small header followed by a sequence of blocks:
+#
+#   header: magic (8 bytes), version (u8), file start time (f64)
+#   block:  first timestamp (f64), last timestamp (f64),
+#           new names flag (u8), payload length (u32),
+#           zlib compressed payload
+#
+# The block payload is columnar. Counter paths and series (path, thread,
+# index, field) are assigned ids the first time they are seen in a file and
+# the names are only written once. Every series in a block is stored as a
+# single column of zigzag/varint encoded deltas, prefixed with its byte
+# length so readers can skip the columns they are not interested in.
+#
+
+import os
+import struct
+import time
+import zlib
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VPPSTATS'
+VERSION = 1
+
+# Series kinds, same values as stat_directory_type_t
+STAT_SCALAR = 1
+STAT_SIMPLE = 2
+STAT_COMBINED = 3
+STAT_ERROR = 4
+
+COMBINED_FIELDS = ('packets', 'bytes')
+
+file_header = struct.Struct('>8sBd')
+block_header = struct.Struct('>ddBI')
+
+
+class VPPStatsRecorderError(IOError):
+    pass
+
+
+def varint_encode(buf, n):
+    while n > 0x7f:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def varint_decode(data, offset):
+    n = 0
+    shift = 0
+    while True:
+        b = data[offset]
+        offset += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, offset
+        shift += 7
+
+
+def zigzag_encode(n):
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def zigzag_decode(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def flatten_snapshot(snapshot):
+    """Turn a VPPStats.dump() dictionary into a list of series.
+
+    Each series is returned as ((path, kind, thread, index, field), value).
+    """
+    series = []
+    for path, v in snapshot.items():
+        if isinstance(v, float):
+            series.append(((path, STAT_SCALAR, 0, 0, 0), v))
+        elif isinstance(v, list):
+            for thread, per_thread in enumerate(v):
+                for index, c in enumerate(per_thread):
+                    if isinstance(c, dict):
+                        series.append(((path, STAT_COMBINED, thread, index,
+                                        0), c['packets']))
+                        series.append(((path, STAT_COMBINED, thread, index,
+                                        1), c['bytes']))
+                    else:
+                        series.append(((path, STAT_SIMPLE, thread, index,
+                                        0), c))
+        elif v is not None:
+            series.append(((path, STAT_ERROR, 0, 0, 0), int(v)))
+    return series
+
+
+class VPPStatsRecorder(object):
+    """Append stats segment snapshots to a rolling set of columnar files.
+
+    directory - where the recording files are written.
+    stats - a connected VPPStats object, used when record() is called
+    without an explicit snapshot.
+    patterns - counter patterns passed to VPPStats.ls().
+    roll_interval - seconds of data stored in each file.
+    block_size - number of snapshots buffered before a block is written.
+    """
+    VPPStatsRecorderError = VPPStatsRecorderError
+
+    def __init__(self, directory, stats=None, patterns=None,
+                 roll_interval=3600, block_size=64, prefix='stats'):
+        self.directory = directory
+        self.stats = stats
+        self.patterns = patterns if patterns else ['/']
+        self.roll_interval = roll_interval
+        self.block_size = block_size
+        self.prefix = prefix
+        self.fd = None
+        self.file_start = None
+        self.filename = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._reset_block()
+
+    def _reset_block(self):
+        self.times = []
+        self.columns = {}
+        self.new_paths = []
+        self.new_series = []
+
+    def _open(self, timestamp):
+        name = '{}-{}.vst'.format(self.prefix,
+                                  time.strftime('%Y%m%dT%H%M%S',
+                                                time.gmtime(timestamp)))
+        self.filename = os.path.join(self.directory, name)
+        self.fd = open(self.filename, 'ab')
+        if self.fd.tell() == 0:
+            self.fd.write(file_header.pack(MAGIC, VERSION, timestamp))
+        self.file_start = timestamp
+        self.path_ids = {}
+        self.series_ids = {}
+
+    def _series_id(self, key):
+        sid = self.series_ids.get(key)
+        if sid is not None:
+            return sid
+        path, kind, thread, index, field = key
+        pid = self.path_ids.get(path)
+        if pid is None:
+            pid = len(self.path_ids)
+            self.path_ids[path] = pid
+            self.new_paths.append((pid, kind, path))
+        sid = len(self.series_ids)
+        self.series_ids[key] = sid
+        self.new_series.append((sid, pid, thread, index, field))
+        return sid
+
+    def snapshot(self):
+        """Dump all counters matching the configured patterns."""
+        if self.stats is None:
+            raise VPPStatsRecorderError(1, 'No stats segment connection')
+        return self.stats.dump(self.stats.ls(self.patterns))
+
+    def record(self, snapshot=None, timestamp=None):
+        """Append one snapshot to the recording.
+
+        snapshot is a dictionary as returned by VPPStats.dump(). If None,
+        the stats segment is sampled.
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        if timestamp is None:
+            timestamp = time.time()
+
+        if self.fd is None:
+            self._open(timestamp)
+        elif timestamp - self.file_start >= self.roll_interval:
+            self.close()
+            self._open(timestamp)
+
+        sample = len(self.times)
+        self.times.append(timestamp)
+        for key, value in flatten_snapshot(snapshot):
+            sid = self._series_id(key)
+            column = self.columns.get(sid)
+            if column is None:
+                self.columns[sid] = (sample, [value])
+                continue
+            values = column[1]
+            missing = sample - column[0] - len(values)
+            if missing > 0:
+                # Series not present in every sample, repeat last value
+                values.extend([values[-1]] * missing)
+            values.append(value)
+
+        if len(self.times) >= self.block_size:
+            self.flush()
+
+    def _encode_block(self):
+        buf = bytearray()
+        nsamples = len(self.times)
+        varint_encode(buf, nsamples)
+
+        # Timestamps in microseconds, delta encoded
+        last = 0
+        for t in self.times:
+            us = int(round(t * 1000000))
+            varint_encode(buf, zigzag_encode(us - last))
+            last = us
+
+        varint_encode(buf, len(self.new_paths))
+        for pid, kind, path in self.new_paths:
+            p = path.encode('utf8')
+            varint_encode(buf, pid)
+            varint_encode(buf, kind)
+            varint_encode(buf, len(p))
+            buf += p
+
+        varint_encode(buf, len(self.new_series))
+        for sid, pid, thread, index, field in self.new_series:
+            varint_encode(buf, sid)
+            varint_encode(buf, pid)
+            varint_encode(buf, thread)
+            varint_encode(buf, index)
+            varint_encode(buf, field)
+
+        varint_encode(buf, len(self.columns))
+        for sid, (first, values) in self.columns.items():
+            missing = nsamples - first - len(values)
+            if missing > 0:
+                values.extend([values[-1]] * missing)
+            col = bytearray()
+            if isinstance(values[0], float):
+                col += struct.pack('>%sd' % len(values), *values)
+            else:
+                last = 0
+                for v in values:
+                    varint_encode(col, zigzag_encode(v - last))
+                    last = v
+            varint_encode(buf, sid)
+            varint_encode(buf, first)
+            varint_encode(buf, len(col))
+            buf += col
+        return bytes(buf)
+
+    def flush(self):
+        """Write buffered snapshots to disk as one block."""
+        if not self.times:
+            return
+        has_names = 1 if self.new_series else 0
+        payload = zlib.compress(self._encode_block())
+        self.fd.write(block_header.pack(self.times[0], self.times[-1],
+                                        has_names, len(payload)))
+        self.fd.write(payload)
+        self.fd.flush()
+        self._reset_block()
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.flush()
+        self.fd.close()
+        self.fd = None
+
+    def run(self, interval=1.0, duration=None):
+        """Sample the stats segment every interval seconds.
+
+        Runs forever, or for duration seconds if given.
+        """
+        end = time.time() + duration if duration is not None else None
+        next_sample = time.time()
+        try:
+            while end is None or next_sample < end:
+                self.record(timestamp=next_sample)
+                next_sample += interval
+                delay = next_sample - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            self.close()
+
+
+class VPPStatsReader(object):
+    """Read counters back from a directory written by VPPStatsRecorder."""
+    def __init__(self, directory, prefix='stats'):
+        self.directory = directory
+        self.prefix = prefix
+
+    def files(self):
+        """Return a sorted list of (start time, filename)."""
+        result = []
+        for f in os.listdir(self.directory):
+            if not f.startswith(self.prefix + '-') or \
+               not f.endswith('.vst'):
+                continue
+            filename = os.path.join(self.directory, f)
+            with open(filename, 'rb') as fd:
+                magic, version, start = file_header.unpack(
+                    fd.read(file_header.size))
+            if magic != MAGIC or version != VERSION:
+                raise VPPStatsRecorderError(
+                    2, 'Not a stats recording: {}'.format(filename))
+            result.append((start, filename))
+        return sorted(result)
+
+    def _blocks(self, filename, start, end):
+        with open(filename, 'rb') as fd:
+            fd.seek(file_header.size)
+            while True:
+                hdr = fd.read(block_header.size)
+                if len(hdr) < block_header.size:
+                    return
+                first, last, has_names, length = block_header.unpack(hdr)
+                # Blocks introducing names must be read for the dictionary
+                if not has_names and \
+                   ((end is not None and first > end) or
+                        (start is not None and last < start)):
+                    fd.seek(length, os.SEEK_CUR)
+                    continue
+                yield bytearray(zlib.decompress(fd.read(length)))
+
+    def _read_file(self, filename, start, end, path, field):
+        """Yield (timestamps, {(thread, index): values}, kind) per block."""
+        paths = {}
+        series = {}
+        for data in self._blocks(filename, start, end):
+            offset = 0
+            nsamples, offset = varint_decode(data, offset)
+            times = []
+            last = 0
+            for i in range(nsamples):
+                d, offset = varint_decode(data, offset)
+                last += zigzag_decode(d)
+                times.append(last / 1000000.0)
+
+            n, offset = varint_decode(data, offset)
+            for i in range(n):
+                pid, offset = varint_decode(data, offset)
+                kind, offset = varint_decode(data, offset)
+                length, offset = varint_decode(data, offset)
+                paths[pid] = (data[offset:offset + length].decode('utf8'),
+                              kind)
+                offset += length
+
+            n, offset = varint_decode(data, offset)
+            for i in range(n):
+                sid, offset = varint_decode(data, offset)
+                pid, offset = varint_decode(data, offset)
+                thread, offset = varint_decode(data, offset)
+                index, offset = varint_decode(data, offset)
+                f, offset = varint_decode(data, offset)
+                series[sid] = (pid, thread, index, f)
+
+            columns = {}
+            kind = None
+            n, offset = varint_decode(data, offset)
+            for i in range(n):
+                sid, offset = varint_decode(data, offset)
+                first, offset = varint_decode(data, offset)
+                length, offset = varint_decode(data, offset)
+                pid, thread, index, f = series[sid]
+                p, k = paths[pid]
+                if p != path or f != (field if k == STAT_COMBINED else 0):
+                    offset += length
+                    continue
+                kind = k
+                col = data[offset:offset + length]
+                offset += length
+                count = nsamples - first
+                if kind == STAT_SCALAR:
+                    values = list(struct.unpack('>%sd' % count,
+                                                bytes(col)))
+                else:
+                    values = []
+                    last = 0
+                    o = 0
+                    for j in range(count):
+                        d, o = varint_decode(col, o)
+                        last += zigzag_decode(d)
+                        values.append(last)
+                columns[(thread, index)] = [0] * first + values
+            yield times, columns, kind
+
+    def ls(self):
+        """Return the set of counter paths present in the recording."""
+        result = set()
+        for s, filename in self.files():
+            for data in self._blocks(filename, None, None):
+                offset = 0
+                nsamples, offset = varint_decode(data, offset)
+                for i in range(nsamples):
+                    d, offset = varint_decode(data, offset)
+                n, offset = varint_decode(data, offset)
+                for i in range(n):
+                    pid, offset = varint_decode(data, offset)
+                    kind, offset = varint_decode(data, offset)
+                    length, offset = varint_decode(data, offset)
+                    result.add(data[offset:offset + length].decode('utf8'))
+                    offset += length
+        return result
+
+    def get_counter(self, path, start=None, end=None, field='packets'):
+        """Return the samples of counter path between start and end.
+
+        Returns a tuple (timestamps, values) of NumPy arrays. Scalar and
+        error counters give a 1-dimensional values array, vector counters
+        one shaped [sample][thread][index]. For combined counters field
+        selects 'packets' or 'bytes'.
+        Raises VPPStatsRecorderError if the counter isn't recorded.
+        """
+        if np is None:
+            raise VPPStatsRecorderError(4, 'NumPy is required for reading')
+        f = COMBINED_FIELDS.index(field)
+        files = self.files()
+        blocks = []
+        kind = None
+        for i, (s, filename) in enumerate(files):
+            if end is not None and s > end:
+                break
+            if start is not None and i + 1 < len(files) and \
+               files[i + 1][0] <= start:
+                continue
+            for times, columns, k in self._read_file(filename, start, end,
+                                                     path, f):
+                if k is not None:
+                    kind = k
+                blocks.append((times, columns))
+        # the blocks read may only miss the path in the requested period
+        if kind is None and path not in self.ls():
+            raise VPPStatsRecorderError(
+                3, 'No such counter in the recording: {}'.format(path))
+
+        timestamps = []
+        threads = indexes = 0
+        for times, columns in blocks:
+            timestamps.extend(times)
+            for thread, index in columns:
+                threads = max(threads, thread + 1)
+                indexes = max(indexes, index + 1)
+        timestamps = np.array(timestamps, dtype=np.float64)
+
+        dtype = np.float64 if kind == STAT_SCALAR else np.uint64
+        if kind in (STAT_SIMPLE, STAT_COMBINED):
+            values = np.zeros((len(timestamps), threads, indexes),
+                              dtype=dtype)
+        else:
+            values = np.zeros(len(timestamps), dtype=dtype)
+
+        row = 0
+        for times, columns in blocks:
+            n = len(times)
+            for (thread, index), v in columns.items():
+                if values.ndim == 1:
+                    values[row:row + n] = v
+                else:
+                    values[row:row + n, thread, index] = v
+            row += n
+
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps <= end
+        return timestamps[mask], values[mask]
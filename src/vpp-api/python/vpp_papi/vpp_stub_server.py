@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Stand-in VPP API server.
+#
+# Speaks the same Unix domain socket protocol as vpp_transport_socket, and
+# answers requests according to the services in the loaded .api.json
+# files. Replies are produced by programmable generators, and everything
+# clients send can be recorded. Intended as a reproducible load target for
+# benchmarking and testing the Python client without a running VPP.
+#
+
+from __future__ import print_function
+import os
+import socket
+import struct
+import threading
+import logging
+import time
+import argparse
+from . vpp_papi import process_json_file, VPP
+from . vpp_serializer import vpp_type_registry
+
+logger = logging.getLogger(__name__)
+
+# Message ids hardcoded in the socket transport
+SOCKCLNT_CREATE_ID = 15
+SOCKCLNT_CREATE_REPLY_ID = 16
+
+# Size of the client's first receive
+CHUNK_SIZE = 4096
+
+
+class VppStubServerError(RuntimeError):
+    pass
+
+
+class VppStubConnection(object):
+    """A client connected to the stub server."""
+    def __init__(self, server, sock, index):
+        self.server = server
+        self.socket = sock
+        self.index = index
+        self.buf = b''
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def recv_msg(self):
+        """Return the next message from the client, or None on EOF."""
+        header = self.server.header
+        while True:
+            if len(self.buf) >= header.size:
+                (_, length, _) = header.unpack_from(self.buf)
+                if len(self.buf) >= header.size + length:
+                    msg = self.buf[header.size:header.size + length]
+                    self.buf = self.buf[header.size + length:]
+                    return msg
+            data = self.socket.recv(65536)
+            if not data:
+                return None
+            self.buf += data
+
+    def send(self, b):
+        """Frame and send a packed message.
+
+        The client reads the first CHUNK_SIZE bytes of a message in one go
+        and the remainder in chunks, so that's how it is sent.
+        """
+        data = self.server.header.pack(0, len(b), 0) + b
+        with self.lock:
+            for i in range(0, len(data), CHUNK_SIZE):
+                self.socket.send(data[i:i + CHUNK_SIZE])
+
+    def run(self):
+        try:
+            while True:
+                msg = self.recv_msg()
+                if msg is None:
+                    break
+                if not self.server.handle(self, msg):
+                    break
+        except socket.error as e:
+            logger.debug('Client {} socket error: {}'.format(self.index, e))
+        finally:
+            self.socket.close()
+            self.server.remove_connection(self)
+
+
+class VppStubServer(object):
+    """Stand-in VPP API server driven by .api.json definitions.
+
+    apifiles - list of .api.json files to load, defaults to VPP's install
+    location.
+    server_address - path of the Unix domain socket to listen on.
+    record - if true, every message received is stored in self.received as
+    (timestamp, client index, message name, raw message).
+
+    By default every request with a reply in its service definition is
+    answered with a zeroed reply (retval 0) and stream requests return no
+    details. Use set_reply_handler() to change that.
+    """
+    VppStubServerError = VppStubServerError
+
+    def __init__(self, apifiles=None, server_address='/run/vpp-api.sock',
+                 record=False):
+        self.server_address = server_address
+        self.record = record
+        self.header = struct.Struct('>QII')
+        self.msgid = struct.Struct('>H')
+        self.messages = {}
+        self.services = {}
+        self.types = vpp_type_registry()
+        self.handlers = {}
+        self.received = []
+        self.counters = {}
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.next_index = 1
+        self.socket = None
+        self.thread = None
+
+        if not apifiles:
+            apifiles = VPP.find_api_files()
+        for file in apifiles:
+            with open(file) as apidef_file:
+                process_json_file(apidef_file, self.messages, self.services,
+                                  logger, self.types)
+
+        for name in ('sockclnt_create', 'sockclnt_create_reply'):
+            if name not in self.messages:
+                raise VppStubServerError(
+                    'Missing {} message definition'.format(name))
+
+        # Build message table. Reserve the ids the socket transport
+        # expects for the handshake.
+        self.id_names = {SOCKCLNT_CREATE_ID: 'sockclnt_create',
+                         SOCKCLNT_CREATE_REPLY_ID: 'sockclnt_create_reply'}
+        i = 1
+        for name in sorted(self.messages):
+            if name in ('sockclnt_create', 'sockclnt_create_reply'):
+                continue
+            while i in self.id_names:
+                i += 1
+            self.id_names[i] = name
+            i += 1
+        self.name_ids = {v: k for k, v in self.id_names.items()}
+        self.message_table = [
+            {'index': k,
+             'name': (v + '_' + self.messages[v].crc[2:]).encode()}
+            for k, v in sorted(self.id_names.items())]
+
+        if 'control_ping' in self.messages:
+            self.set_reply_handler('control_ping', self.control_ping_handler)
+
+    def set_reply_handler(self, name, handler):
+        """Install a reply generator for request message name.
+
+        handler is called as handler(request) with the decoded request and
+        returns a dictionary of reply fields, an iterable of them for
+        stream requests, or None to send nothing. The message id and
+        context are filled in. Yielding the same dictionary object
+        repeatedly (e.g. with itertools.repeat) packs it only once, which
+        makes generating millions of details cheap.
+        """
+        if name not in self.messages:
+            raise VppStubServerError('Unknown message {}'.format(name))
+        self.handlers[name] = handler
+
+    def control_ping_handler(self, request):
+        return {'vpe_pid': os.getpid()}
+
+    def reply_name(self, name):
+        service = self.services.get(name)
+        if not service:
+            return None, False
+        reply = service['reply']
+        if reply == 'null':
+            return None, False
+        return reply, service.get('stream', False)
+
+    def pack(self, name, fields, context):
+        msgdef = self.messages[name]
+        fields = dict(fields)
+        fields['_vl_msg_id'] = self.name_ids[name]
+        if 'context' in msgdef.field_by_name:
+            fields['context'] = context
+        return msgdef.pack(fields)
+
+    def send_replies(self, conn, name, request, context):
+        handler = self.handlers.get(name)
+        reply, stream = self.reply_name(name)
+        if handler:
+            result = handler(request)
+        elif reply:
+            result = [] if stream else {}
+        else:
+            return
+        if result is None:
+            return
+        if reply is None:
+            raise VppStubServerError('No reply defined for {}'.format(name))
+
+        if isinstance(result, dict):
+            conn.send(self.pack(reply, result, context))
+            return
+
+        last = None
+        b = None
+        for r in result:
+            if r is not last:
+                b = self.pack(reply, r, context)
+                last = r
+            conn.send(b)
+
+    def sockclnt_create(self, conn, msg):
+        r, size = self.messages['sockclnt_create'].unpack(msg)
+        reply = {'_vl_msg_id': SOCKCLNT_CREATE_REPLY_ID,
+                 'context': r.context,
+                 'response': 0,
+                 'index': conn.index,
+                 'count': len(self.message_table),
+                 'message_table': self.message_table}
+        conn.send(self.messages['sockclnt_create_reply'].pack(reply))
+
+    def handle(self, conn, msg):
+        """Process one request. Returns False to close the connection."""
+        (i,) = self.msgid.unpack_from(msg)
+        name = self.id_names.get(i)
+        self.counters[name] = self.counters.get(name, 0) + 1
+        if self.record:
+            self.received.append((time.time(), conn.index, name, msg))
+
+        if name is None:
+            logger.warning('Unknown message id {}'.format(i))
+            return True
+        if i == SOCKCLNT_CREATE_ID:
+            self.sockclnt_create(conn, msg)
+            return True
+
+        r, size = self.messages[name].unpack(msg)
+        context = getattr(r, 'context', 0)
+        try:
+            self.send_replies(conn, name, r, context)
+        except (ValueError, TypeError) as e:
+            logger.error('Reply for {} failed: {}'.format(name, e))
+        if name == 'sockclnt_delete':
+            return False
+        return True
+
+    def send_event(self, name, **kwargs):
+        """Send an event message to every connected client."""
+        kwargs['_vl_msg_id'] = self.name_ids[name]
+        b = self.messages[name].pack(kwargs)
+        with self.connections_lock:
+            connections = list(self.connections)
+        for conn in connections:
+            conn.send(b)
+
+    def remove_connection(self, conn):
+        with self.connections_lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+
+    def accept_loop(self):
+        while True:
+            try:
+                sock, _ = self.socket.accept()
+            except socket.error:
+                # Listening socket closed
+                return
+            with self.connections_lock:
+                conn = VppStubConnection(self, sock, self.next_index)
+                self.next_index += 1
+                self.connections.append(conn)
+            conn.thread.start()
+
+    def start(self):
+        """Start listening in a background thread."""
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.socket.bind(self.server_address)
+        self.socket.listen(16)
+        self.thread = threading.Thread(target=self.accept_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Close the listening socket and all client connections."""
+        if self.socket:
+            self.socket.shutdown(socket.SHUT_RDWR)
+            self.socket.close()
+            self.socket = None
+        with self.connections_lock:
+            connections = list(self.connections)
+        for conn in connections:
+            try:
+                conn.socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in VPP API server')
+    parser.add_argument('--socket', default='/run/vpp-api.sock',
+                        help='Unix domain socket to listen on')
+    parser.add_argument('--api-dir', help='directory with .api.json files')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug
+                        else logging.WARNING)
+    apifiles = VPP.find_api_files(api_dir=args.api_dir)
+    server = VppStubServer(apifiles, server_address=args.socket)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2019 Cisco and/or its affiliates.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# API trace recorder and replay.
+#
+# VppTraceTransport wraps a connected client's transport and records every
+# message the client sends. The trace file holds a header followed by
+# records:
+#
+#   'N' (u8), message id (u16), name length (u16), name_crc
+#   'M' (u8), time since first message (f64), context (u32),
+#       length (u32), message
+#
+# Message ids are connection specific, so each id is written with its
+# name and CRC the first time it is used. Replay maps them to the ids of
+# the target, rewrites client index and context, and pushes the messages
+# with a window of outstanding requests.
+#
+
+from __future__ import print_function
+import argparse
+import gzip
+import struct
+import time
+import threading
+import logging
+from . vpp_papi import VPP, VPPIOError, VPPValueError
+from . vpp_serializer import field_offset
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VPPTRACE\x01'
+
+name_record = struct.Struct('>cHH')
+msg_record = struct.Struct('>cdII')
+msgid = struct.Struct('>H')
+u32 = struct.Struct('>I')
+
+
+def trace_open(filename, mode):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+
+class VppTraceTransport(object):
+    """Transport wrapper recording every message written to VPP.
+
+    Usage:
+        vpp.connect('client')
+        vpp.transport = VppTraceTransport(vpp.transport, 'api.trace')
+        ...
+        vpp.transport.close()
+    """
+    def __init__(self, transport, filename):
+        self.transport = transport
+        self.fd = trace_open(filename, 'wb')
+        self.fd.write(MAGIC)
+        self.lock = threading.Lock()
+        self.known = {}
+        self.start = None
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+    def _name_record(self, i):
+        parent = self.transport.parent
+        msgdef = parent.id_msgdef[i] if i < len(parent.id_msgdef) else None
+        if msgdef is None:
+            self.known[i] = None
+            return
+        n = (msgdef.name + '_' + msgdef.crc[2:]).encode()
+        self.fd.write(name_record.pack(b'N', i, len(n)) + n)
+        self.known[i] = field_offset(msgdef, 'context')
+
+    def write(self, buf):
+        now = time.time()
+        with self.lock:
+            (i,) = msgid.unpack_from(buf)
+            if i not in self.known:
+                self._name_record(i)
+            offset = self.known[i]
+            context = u32.unpack_from(buf, offset)[0] \
+                if offset is not None else 0
+            if self.start is None:
+                self.start = now
+            self.fd.write(msg_record.pack(b'M', now - self.start, context,
+                                          len(buf)))
+            self.fd.write(bytes(buf))
+        return self.transport.write(buf)
+
+    def close(self):
+        with self.lock:
+            self.fd.close()
+
+
+def trace_read(filename):
+    """Yield the records of a trace file.
+
+    Returns tuples ('N', msgid, name) and ('M', time, context, message).
+    """
+    with trace_open(filename, 'rb') as fd:
+        if fd.read(len(MAGIC)) != MAGIC:
+            raise VPPValueError('Not an API trace: {}'.format(filename))
+        while True:
+            t = fd.read(1)
+            if not t:
+                return
+            if t == b'N':
+                i, length = struct.unpack('>HH', fd.read(4))
+                yield ('N', i, fd.read(length).decode())
+            elif t == b'M':
+                ts, context, length = struct.unpack('>dII', fd.read(16))
+                yield ('M', ts, context, fd.read(length))
+            else:
+                raise VPPValueError('Corrupt API trace: {}'.format(filename))
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+
+class VppTraceReplay(object):
+    """Replay an API trace against a connected VPP object.
+
+    window - maximum number of requests outstanding.
+    pacing - None to send as fast as the window allows, or a speed
+    factor applied to the recorded timing (1.0 is real time).
+    """
+    def __init__(self, vpp, filename, window=64, pacing=None):
+        self.vpp = vpp
+        self.filename = filename
+        self.window = window
+        self.pacing = pacing
+        self.transport = vpp.transport
+        self.client_index = getattr(self.transport, 'socket_index', 0) or 0
+        self.reply_offsets = {}
+
+    def load(self):
+        """Read the trace and rewrite it for the target.
+
+        Returns a list of (time, message id, multipart, context offset,
+        message).
+        """
+        ids = {}
+        msgs = []
+        multipart_contexts = set()
+        for r in trace_read(self.filename):
+            if r[0] == 'N':
+                _, i, name = r
+                new = self.transport.get_msg_index(name.encode())
+                if new <= 0:
+                    logger.warning('Message not known by target: %s', name)
+                ids[i] = new
+                continue
+
+            _, ts, context, b = r
+            (i,) = msgid.unpack_from(b)
+            new = ids.get(i, 0)
+            if new <= 0:
+                continue
+            msgdef = self.vpp.id_msgdef[new]
+            name = self.vpp.id_names[new]
+            service = self.vpp.services.get(name, {})
+            if service.get('reply', 'null') == 'null':
+                logger.debug('Skipping message without reply: %s', name)
+                continue
+            multipart = service.get('stream', False)
+            if multipart:
+                multipart_contexts.add(context)
+            elif name == 'control_ping' and context in multipart_contexts:
+                # Terminates a dump, replay adds its own
+                multipart_contexts.discard(context)
+                continue
+            b = bytearray(b)
+            msgid.pack_into(b, 0, new)
+            offset = field_offset(msgdef, 'client_index')
+            if offset is not None:
+                u32.pack_into(b, offset, self.client_index)
+            msgs.append((ts, new, multipart,
+                         field_offset(msgdef, 'context'), b))
+        return msgs
+
+    def reply_context(self, msg):
+        (i,) = msgid.unpack_from(msg)
+        if i not in self.reply_offsets:
+            msgdef = self.vpp.id_msgdef[i] \
+                if i < len(self.vpp.id_msgdef) else None
+            self.reply_offsets[i] = field_offset(msgdef, 'context') \
+                if msgdef else None
+        offset = self.reply_offsets[i]
+        if offset is None:
+            return 0, i
+        return u32.unpack_from(msg, offset)[0], i
+
+    def run(self):
+        """Replay the trace, return a dictionary with the results."""
+        msgs = self.load()
+        ping = self.vpp.control_ping_msgdef
+        ping_index = self.vpp.control_ping_index
+        ping_reply = self.transport.get_msg_index(
+            ('control_ping_reply_' +
+             self.vpp.messages['control_ping_reply'].crc[2:]).encode())
+
+        outstanding = {}
+        latencies = []
+        base_context = self.vpp.get_context()
+        start = time.time()
+        sent = 0
+
+        def receive():
+            msg = self.transport.read()
+            if not msg:
+                raise VPPIOError(2, 'Replay: read failed')
+            now = time.time()
+            context, i = self.reply_context(msg)
+            if context not in outstanding:
+                return
+            send_time, multipart = outstanding[context]
+            if multipart and i != ping_reply:
+                return
+            del outstanding[context]
+            latencies.append(now - send_time)
+
+        self.transport.suspend()
+        try:
+            for n, (ts, i, multipart, offset, b) in enumerate(msgs):
+                if self.pacing:
+                    delay = start + ts / self.pacing - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                while len(outstanding) >= self.window:
+                    receive()
+                context = (base_context + n + 1) & 0xffffffff
+                if offset is not None:
+                    u32.pack_into(b, offset, context)
+                outstanding[context] = (time.time(), multipart)
+                self.transport.write(b)
+                if multipart:
+                    self.transport.write(
+                        ping.pack({'_vl_msg_id': ping_index,
+                                   'client_index': self.client_index,
+                                   'context': context}))
+                sent += 1
+            while outstanding:
+                receive()
+        finally:
+            self.transport.resume()
+        elapsed = time.time() - start
+
+        us = sorted(t * 1000000 for t in latencies)
+        return {'messages': sent,
+                'seconds': elapsed,
+                'msgs_per_sec': sent / elapsed if elapsed else 0,
+                'latency_p50_us': percentile(us, 50) if us else 0,
+                'latency_p90_us': percentile(us, 90) if us else 0,
+                'latency_p99_us': percentile(us, 99) if us else 0,
+                'latency_max_us': us[-1] if us else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a VPP API trace')
+    parser.add_argument('trace', help='trace file to replay')
+    parser.add_argument('--api-dir', help='directory with .api.json files')
+    parser.add_argument('--socket', help='use the socket transport with '
+                        'this server address (e.g. a stand-in server)')
+    parser.add_argument('--prefix', help='shared memory prefix of VPP')
+    parser.add_argument('--window', type=int, default=64,
+                        help='maximum requests outstanding')
+    parser.add_argument('--pacing', type=float, default=None,
+                        metavar='SPEED',
+                        help='follow the recorded timing, sped up by '
+                        'SPEED (default: as fast as possible)')
+    args = parser.parse_args()
+
+    apifiles = VPP.find_api_files(api_dir=args.api_dir)
+    if args.socket:
+        vpp = VPP(apifiles, use_socket=True, server_address=args.socket,
+                  async_thread=False)
+        vpp.connect('replay')
+    else:
+        vpp = VPP(apifiles, async_thread=False)
+        vpp.connect_sync('replay', chroot_prefix=args.prefix)
+    try:
+        r = VppTraceReplay(vpp, args.trace, window=args.window,
+                           pacing=args.pacing).run()
+    finally:
+        vpp.disconnect()
+    for k in sorted(r):
+        print('{:<20} {:.1f}'.format(k, r[k]))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@
 
 from cffi import FFI
 import cffi
+import math
 
 ffi = FFI()
 ffi.cdef("""
@@ -14,6 +15,7 @@ int vac_connect(char * name, char * chroot_prefix, vac_callback_t cb,
     int rx_qlen);
 int vac_disconnect(void);
 int vac_read(char **data, int *l, unsigned short timeout);
+int vac_read_nowait(char **data, int *l);
 int vac_write(char *data, int len);
 void vac_free(void * msg);
 
@@ -73,6 +75,16 @@ class VppTransport(object):
         else:
             self.write = self._write_legacy_cffi
 
+        # Out-parameters for vac_read, reused for every read
+        self.mem = ffi.new("char **")
+        self.size = ffi.new("int *")
+
+        # Older client libraries can't drain the queue without blocking
+        try:
+            self.vac_read_nowait = vpp_api.vac_read_nowait
+        except AttributeError:
+            self.vac_read_nowait = None
+
     def connect(self, name, pfx, msg_handler, rx_qlen):
         self.connected = True
         if not pfx:
@@ -110,14 +122,60 @@ class VppTransport(object):
             raise VppTransportShmemIOError(1, 'Not connected')
         return vpp_api.vac_write(bytes(buf), len(buf))
 
-    def read(self):
+    def vac_timeout(self, timeout):
+        # vac_read takes whole seconds
+        if timeout is None:
+            return self.read_timeout
+        return max(1, int(math.ceil(timeout)))
+
+    def read(self, timeout=None):
         if not self.connected:
             raise VppTransportShmemIOError(1, 'Not connected')
-        mem = ffi.new("char **")
-        size = ffi.new("int *")
-        rv = vpp_api.vac_read(mem, size, self.read_timeout)
+        rv = vpp_api.vac_read(self.mem, self.size,
+                              self.vac_timeout(timeout))
         if rv:
             raise VppTransportShmemIOError(rv, 'vac_read failed')
-        msg = bytes(ffi.buffer(mem[0], size[0]))
-        vpp_api.vac_free(mem[0])
+        msg = bytes(ffi.buffer(self.mem[0], self.size[0]))
+        vpp_api.vac_free(self.mem[0])
+        return msg
+
+    def read_nowait(self):
+        """Return the next message if one is queued, or None."""
+        if not self.connected:
+            raise VppTransportShmemIOError(1, 'Not connected')
+        if not self.vac_read_nowait:
+            raise VppTransportShmemIOError(
+                2, 'Client library has no vac_read_nowait')
+        if self.vac_read_nowait(self.mem, self.size):
+            return None
+        msg = bytes(ffi.buffer(self.mem[0], self.size[0]))
+        vpp_api.vac_free(self.mem[0])
         return msg
+
+    def wakeup(self):
+        """Blocked reads can't be interrupted, they end on timeout."""
+        pass
+
+    def read_decoded(self, decode, max_msgs=64, timeout=None):
+        """Read and decode up to max_msgs messages.
+
+        Blocks for the first message, then drains whatever else is queued
+        without waiting. Messages are decoded in place from shared memory
+        and freed afterwards, so no copy is made.
+        """
+        if not self.connected:
+            raise VppTransportShmemIOError(1, 'Not connected')
+        mem = self.mem
+        size = self.size
+        rv = vpp_api.vac_read(mem, size, self.vac_timeout(timeout))
+        if rv:
+            raise VppTransportShmemIOError(rv, 'vac_read failed')
+        result = []
+        while True:
+            try:
+                result.append(decode(ffi.buffer(mem[0], size[0])))
+            finally:
+                vpp_api.vac_free(mem[0])
+            if len(result) >= max_msgs or not self.vac_read_nowait or \
+               self.vac_read_nowait(mem, size):
+                return result
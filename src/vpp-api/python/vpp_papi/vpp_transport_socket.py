@@ -61,8 +61,10 @@ class VppTransport(object):
                     # callback queue
                     if self.parent.has_context(msg):
                         self.q.put(msg)
-                    else:
+                    elif self.parent.event_callback:
                         self.parent.msg_handler_async(msg)
+                    else:
+                        self.parent.msg_handler_sync(msg)
                 else:
                     raise VppTransportSocketIOError(
                         2, 'Unknown response from select')
@@ -137,7 +139,7 @@ class VppTransport(object):
             return 0
 
     def msg_table_max_index(self):
-        return len(self.message_table)
+        return max(self.message_table.values()) if self.message_table else 0
 
     def write(self, buf):
         """Send a binary-packed message to VPP."""
@@ -181,10 +183,58 @@ class VppTransport(object):
             buf = msg
         return buf[16:]
 
-    def read(self):
+    def read(self, timeout=None):
         if not self.connected:
             raise VppTransportSocketIOError(1, 'Not connected')
         try:
-            return self.q.get(True, self.read_timeout)
+            return self.q.get(True, self.read_timeout if timeout is None
+                              else timeout)
         except queue.Empty:
             return None
+
+    def read_nowait(self):
+        """Return the next message if one is queued, or None."""
+        if not self.connected:
+            raise VppTransportSocketIOError(1, 'Not connected')
+        while True:
+            try:
+                msg = self.q.get_nowait()
+            except queue.Empty:
+                return None
+            if msg is None:
+                # Reader thread terminated, let the next read see it
+                self.q.put(msg)
+                return None
+            if msg:
+                return msg
+
+    def wakeup(self):
+        """Make a blocked read_decoded() return early."""
+        self.q.put(b'')
+
+    def read_decoded(self, decode, max_msgs=64, timeout=None):
+        """Read and decode up to max_msgs messages.
+
+        Blocks for the first message, then drains whatever else is queued
+        without waiting. Returns an empty list on timeout, and [None] if
+        woken up by wakeup().
+        """
+        msg = self.read(timeout)
+        if msg == b'':
+            return [None]
+        if not msg:
+            return []
+        result = [decode(msg)]
+        while len(result) < max_msgs:
+            try:
+                msg = self.q.get_nowait()
+            except queue.Empty:
+                break
+            if msg == b'':
+                continue
+            if not msg:
+                # Reader thread terminated, let the next read see it
+                self.q.put(msg)
+                break
+            result.append(decode(msg))
+        return result
@@ -0,0 +1,156 @@
+#!/usr/bin/env python2
+
+import argparse
+import multiprocessing
+import os
+import sys
+import logging
+from vapi_c_gen import CUnion, gen_json_unified_header, json_to_c_header_name
+from vapi_cpp_gen import CppSimpleType, CppStructType, CppField, CppEnum, \
+    CppMessage, CppAlias, gen_json_header, json_to_cpp_header_name
+from vapi_json_parser import JsonParser, load_bundle
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+#
+# Generates the C and C++ VAPI headers of many .api.json files in one run.
+# The model of each file is built once and emits both headers, files are
+# spread over a pool of processes and headers whose content is unchanged
+# are left alone, so what includes them isn't rebuilt. With --bundle the
+# files are read from a schema bundle written by vppapigen, loaded once.
+#
+
+# Schema bundle of the current run, inherited by the pool workers
+bundle = None
+
+
+class Header(StringIO):
+    def __init__(self, name):
+        StringIO.__init__(self)
+        self.name = name
+
+
+def write_if_changed(path, data):
+    try:
+        with open(path) as f:
+            if f.read() == data:
+                return False
+    except IOError:
+        pass
+    tmp = '%s.%d' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(data)
+    os.rename(tmp, path)
+    return True
+
+
+def gen_headers(job):
+    """Generate the headers of one .api.json file.
+
+    Returns the list of headers written and the list of parser
+    exceptions.
+    """
+    j, args = job
+    logger = logging.getLogger("VAPI GEN")
+    # The C++ classes extend the C ones, so one model serves both
+    parser = JsonParser(logger, [j],
+                        simple_type_class=CppSimpleType,
+                        struct_type_class=CppStructType,
+                        field_class=CppField,
+                        enum_class=CppEnum,
+                        union_class=CUnion,
+                        message_class=CppMessage,
+                        alias_class=CppAlias,
+                        bundle=bundle)
+    if args.remove_path:
+        d, f = os.path.split(j)
+    else:
+        f = j
+    prefix = "%s/" % args.prefix if args.prefix else ""
+    gen_h_prefix = "%s/" % args.gen_h_prefix if args.gen_h_prefix else ""
+
+    written = []
+    if not args.no_c:
+        name = json_to_c_header_name(f)
+        io = Header(name)
+        gen_json_unified_header(parser, logger, j, io, name)
+        if write_if_changed(prefix + name, io.getvalue()):
+            written.append(prefix + name)
+    if not args.no_cpp:
+        name = json_to_cpp_header_name(f)
+        io = Header(prefix + name)
+        gen_json_header(parser, logger, j, io, gen_h_prefix,
+                        args.add_debug_comments)
+        if write_if_changed(prefix + name, io.getvalue()):
+            written.append(prefix + name)
+    return written, [str(e) for e in parser.exceptions]
+
+
+if __name__ == '__main__':
+    try:
+        verbose = int(os.getenv("V", 0))
+    except ValueError:
+        verbose = 0
+
+    if verbose >= 2:
+        log_level = 10
+    elif verbose == 1:
+        log_level = 20
+    else:
+        log_level = 40
+
+    logging.basicConfig(stream=sys.stdout, level=log_level)
+    logger = logging.getLogger("VAPI GEN")
+    logger.setLevel(log_level)
+
+    argparser = argparse.ArgumentParser(
+        description="VPP C and C++ API generator")
+    argparser.add_argument('files', metavar='api-file', nargs='*',
+                           type=str, help='json api files, or members of '
+                           'the bundle (default is all of them)')
+    argparser.add_argument('--bundle', action='store', default=None,
+                           help='schema bundle holding the json api files')
+    argparser.add_argument('--prefix', action='store', default=None,
+                           help='path prefix')
+    argparser.add_argument('--gen-h-prefix', action='store', default=None,
+                           help='generated C header prefix')
+    argparser.add_argument('--remove-path', action='store_true',
+                           help='remove path from filename')
+    argparser.add_argument('--no-c', action='store_true',
+                           help='do not generate C headers')
+    argparser.add_argument('--no-cpp', action='store_true',
+                           help='do not generate C++ headers')
+    argparser.add_argument('--add-debug-comments', action='store_true',
+                           help='add debug comments to C++ headers')
+    argparser.add_argument('--jobs', type=int, default=None,
+                           help='number of processes')
+    args = argparser.parse_args()
+
+    if args.bundle:
+        bundle = load_bundle(args.bundle)
+        files = args.files or sorted(bundle['files'])
+    elif args.files:
+        files = args.files
+    else:
+        argparser.error('no json api files given')
+
+    jobs = [(j, args) for j in files]
+    processes = min(args.jobs or multiprocessing.cpu_count(), len(jobs))
+    if processes <= 1:
+        results = [gen_headers(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(gen_headers, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    for written, exceptions in results:
+        for w in written:
+            logger.info("Wrote `%s'" % w)
+        for e in exceptions:
+            logger.warning(e)
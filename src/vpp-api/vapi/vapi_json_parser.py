@@ -284,11 +284,39 @@ class StructType (Type, Struct):
         return True
 
 
+def load_bundle(path):
+    """Load a schema bundle written by vppapigen --bundle, holding the
+    contents of many json api files"""
+    with open(path) as f:
+        bundle = json.load(f)
+    if bundle.get('version') != 1:
+        raise ParseError("Unsupported bundle version `%s' in `%s'" %
+                         (bundle.get('version'), path))
+    return bundle
+
+
+def bundle_member(bundle, name):
+    """Rebuild the contents of json api file `name' from a bundle"""
+    try:
+        f = bundle['files'][name]
+    except KeyError:
+        raise ParseError("No json api file `%s' in bundle" % name)
+    index = bundle['index']
+    j = {k: [bundle[k][index[n][1]] for n in f[k]]
+         for k in ('enums', 'unions', 'types', 'messages')}
+    j['aliases'] = {n: bundle['aliases'][n] for n in f['aliases']}
+    j['services'] = {n: bundle['services'][n] for n in f['services']}
+    j['vl_api_version'] = f['vl_api_version']
+    return j
+
+
 class JsonParser(object):
     def __init__(self, logger, files, simple_type_class=SimpleType,
                  enum_class=Enum, union_class=Union,
                  struct_type_class=StructType, field_class=Field,
-                 message_class=Message, alias_class=Alias):
+                 message_class=Message, alias_class=Alias, bundle=None):
+        """Parse json api files, or the members of a schema bundle named
+        by files if bundle (see load_bundle()) is given"""
         self.services = {}
         self.messages = {}
         self.enums = {}
@@ -322,10 +350,19 @@ class JsonParser(object):
         self.messages_by_json = {}
         self.logger = logger
         for f in files:
-            self.parse_json_file(f)
+            if bundle:
+                self.parse_json(f, bundle_member(bundle, f))
+            else:
+                self.parse_json_file(f)
         self.finalize_parsing()
 
     def parse_json_file(self, path):
+        with open(path) as f:
+            j = json.load(f)
+        self.parse_json(path, j)
+
+    def parse_json(self, path, j):
+        """Parse the decoded contents of json api file `path'"""
         self.logger.info("Parsing json api file: `%s'" % path)
         self.json_files.append(path)
         self.types_by_json[path] = []
@@ -333,109 +370,107 @@ class JsonParser(object):
         self.unions_by_json[path] = []
         self.aliases_by_json[path] = []
         self.messages_by_json[path] = {}
-        with open(path) as f:
-            j = json.load(f)
-            for k in j['services']:
-                if k in self.services:
-                    raise ParseError("Duplicate service `%s'" % k)
-                self.services[k] = j['services'][k]
-                self.replies.add(self.services[k]["reply"])
-                if "events" in self.services[k]:
-                    for x in self.services[k]["events"]:
-                        self.events.add(x)
-            for e in j['enums']:
-                name = e[0]
-                value_pairs = e[1:-1]
-                enumtype = self.types[e[-1]["enumtype"]]
-                enum = self.enum_class(name, value_pairs, enumtype)
-                self.enums[enum.name] = enum
-                self.logger.debug("Parsed enum: %s" % enum)
-                self.enums_by_json[path].append(enum)
+        for k in j['services']:
+            if k in self.services:
+                raise ParseError("Duplicate service `%s'" % k)
+            self.services[k] = j['services'][k]
+            self.replies.add(self.services[k]["reply"])
+            if "events" in self.services[k]:
+                for x in self.services[k]["events"]:
+                    self.events.add(x)
+        for e in j['enums']:
+            name = e[0]
+            value_pairs = e[1:-1]
+            enumtype = self.types[e[-1]["enumtype"]]
+            enum = self.enum_class(name, value_pairs, enumtype)
+            self.enums[enum.name] = enum
+            self.logger.debug("Parsed enum: %s" % enum)
+            self.enums_by_json[path].append(enum)
+        exceptions = []
+        progress = 0
+        last_progress = 0
+        while True:
+            for u in j['unions']:
+                name = u[0]
+                if name in self.unions:
+                    progress = progress + 1
+                    continue
+                try:
+                    type_pairs = [[self.lookup_type_like_id(t), n]
+                                  for t, n in u[1:-1]]
+                    crc = u[-1]["crc"]
+                    union = self.union_class(name, type_pairs, crc)
+                    progress = progress + 1
+                except ParseError as e:
+                    exceptions.append(e)
+                    continue
+                self.unions[union.name] = union
+                self.logger.debug("Parsed union: %s" % union)
+                self.unions_by_json[path].append(union)
+            for name, body in j['aliases'].items():
+                if name in self.aliases:
+                    progress = progress + 1
+                    continue
+                if 'length' in body:
+                    array_len = body['length']
+                else:
+                    array_len = None
+                t = self.types[body['type']]
+                alias = self.alias_class(name, t, array_len)
+                self.aliases[name] = alias
+                self.logger.debug("Parsed alias: %s" % alias)
+                self.aliases_by_json[path].append(alias)
+            for t in j['types']:
+                if t[0] in self.types:
+                    progress = progress + 1
+                    continue
+                try:
+                    type_ = self.struct_type_class(t, self,
+                                                   self.field_class,
+                                                   self.logger)
+                    if type_.name in self.types:
+                        raise ParseError(
+                            "Duplicate type `%s'" % type_.name)
+                    progress = progress + 1
+                except ParseError as e:
+                    exceptions.append(e)
+                    continue
+                self.types[type_.name] = type_
+                self.types_by_json[path].append(type_)
+                self.logger.debug("Parsed type: %s" % type_)
+            if not exceptions:
+                # finished parsing
+                break
+            if progress <= last_progress:
+                # cannot make forward progress
+                self.exceptions.extend(exceptions)
+                break
             exceptions = []
+            last_progress = progress
             progress = 0
-            last_progress = 0
-            while True:
-                for u in j['unions']:
-                    name = u[0]
-                    if name in self.unions:
-                        progress = progress + 1
-                        continue
-                    try:
-                        type_pairs = [[self.lookup_type_like_id(t), n]
-                                      for t, n in u[1:-1]]
-                        crc = u[-1]["crc"]
-                        union = self.union_class(name, type_pairs, crc)
-                        progress = progress + 1
-                    except ParseError as e:
-                        exceptions.append(e)
-                        continue
-                    self.unions[union.name] = union
-                    self.logger.debug("Parsed union: %s" % union)
-                    self.unions_by_json[path].append(union)
-                for name, body in j['aliases'].iteritems():
-                    if name in self.aliases:
-                        progress = progress + 1
-                        continue
-                    if 'length' in body:
-                        array_len = body['length']
-                    else:
-                        array_len = None
-                    t = self.types[body['type']]
-                    alias = self.alias_class(name, t, array_len)
-                    self.aliases[name] = alias
-                    self.logger.debug("Parsed alias: %s" % alias)
-                    self.aliases_by_json[path].append(alias)
-                for t in j['types']:
-                    if t[0] in self.types:
-                        progress = progress + 1
-                        continue
-                    try:
-                        type_ = self.struct_type_class(t, self,
-                                                       self.field_class,
-                                                       self.logger)
-                        if type_.name in self.types:
-                            raise ParseError(
-                                "Duplicate type `%s'" % type_.name)
-                        progress = progress + 1
-                    except ParseError as e:
-                        exceptions.append(e)
-                        continue
-                    self.types[type_.name] = type_
-                    self.types_by_json[path].append(type_)
-                    self.logger.debug("Parsed type: %s" % type_)
-                if not exceptions:
-                    # finished parsing
-                    break
-                if progress <= last_progress:
-                    # cannot make forward progress
-                    self.exceptions.extend(exceptions)
-                    break
-                exceptions = []
-                last_progress = progress
-                progress = 0
+        prev_length = len(self.messages)
+        processed = []
+        while True:
+            exceptions = []
+            for m in j['messages']:
+                if m in processed:
+                    continue
+                try:
+                    msg = self.message_class(self.logger, m, self)
+                    if msg.name in self.messages:
+                        raise ParseError(
+                            "Duplicate message `%s'" % msg.name)
+                except ParseError as e:
+                    exceptions.append(e)
+                    continue
+                self.messages[msg.name] = msg
+                self.messages_by_json[path][msg.name] = msg
+                processed.append(m)
+            if prev_length == len(self.messages):
+                # cannot make forward progress ...
+                self.exceptions.extend(exceptions)
+                break
             prev_length = len(self.messages)
-            processed = []
-            while True:
-                exceptions = []
-                for m in j['messages']:
-                    if m in processed:
-                        continue
-                    try:
-                        msg = self.message_class(self.logger, m, self)
-                        if msg.name in self.messages:
-                            raise ParseError(
-                                "Duplicate message `%s'" % msg.name)
-                    except ParseError as e:
-                        exceptions.append(e)
-                        continue
-                    self.messages[msg.name] = msg
-                    self.messages_by_json[path][msg.name] = msg
-                    processed.append(m)
-                if prev_length == len(self.messages):
-                    # cannot make forward progress ...
-                    self.exceptions.extend(exceptions)
-                    break
-                prev_length = len(self.messages)
 
     def lookup_type_like_id(self, name):
         mundane_name = remove_magic(name)
@@ -28,6 +28,7 @@ from vpp_papi.vpp_stats import VPPStats
 from log import RED, GREEN, YELLOW, double_line_delim, single_line_delim, \
     get_logger, colorize
 from vpp_object import VppObjectRegistry
+import vpp_pool
 from util import ppp, is_core_present
 from scapy.layers.inet import IPerror, TCPerror, UDPerror, ICMPerror
 from scapy.layers.inet6 import ICMPv6DestUnreach, ICMPv6EchoRequest
@@ -57,6 +58,35 @@ if os.getenv('TEST_DEBUG', "0") == "1":
     debug_framework = True
     import debug_internal
 
+#: state of a pooled vpp compared with its state after startup when it is
+#: reset: dump message, its arguments and the reply field counted instead of
+#: the details (None to count the details)
+POOL_STATE_DUMPS = (
+    ('ip_fib_dump', {}, None),
+    ('ip6_fib_dump', {}, None),
+    ('proxy_arp_dump', {}, None),
+    ('proxy_arp_intfc_dump', {}, None),
+    ('ipsec_spds_dump', {}, None),
+    ('ipsec_sa_dump', {'sa_id': 0xffffffff}, None),
+    ('nat44_address_dump', {}, None),
+    ('nat44_interface_dump', {}, None),
+    ('nat44_interface_output_feature_dump', {}, None),
+    ('nat44_static_mapping_dump', {}, None),
+    ('nat44_identity_mapping_dump', {}, None),
+    ('nat44_lb_static_mapping_dump', {}, None),
+    ('nat44_user_dump', {}, None),
+    ('nat_det_map_dump', {}, None),
+    ('nat64_pool_addr_dump', {}, None),
+    ('nat64_interface_dump', {}, None),
+    ('nat64_prefix_dump', {}, None),
+    ('nat64_bib_dump', {'proto': 255}, None),
+    ('nat66_interface_dump', {}, None),
+    ('nat66_static_mapping_dump', {}, None),
+    ('acl_dump', {'acl_index': 0xffffffff}, None),
+    ('macip_acl_dump', {'acl_index': 0xffffffff}, None),
+    ('acl_interface_list_dump', {'sw_if_index': 0xffffffff}, 'count'),
+)
+
 """
   Test framework module.
 
@@ -98,10 +128,16 @@ def pump_output(testclass):
     stdout_fragment = ""
     stderr_fragment = ""
     while not testclass.pump_thread_stop_flag.is_set():
-        readable = select.select([testclass.vpp.stdout.fileno(),
-                                  testclass.vpp.stderr.fileno(),
-                                  testclass.pump_thread_wakeup_pipe[0]],
-                                 [], [])[0]
+        if testclass.vpp_pool_instance is not None:
+            # pooled vpp writes to files, which are always readable
+            select.select([testclass.pump_thread_wakeup_pipe[0]], [], [], 0.1)
+            readable = [testclass.vpp.stdout.fileno(),
+                        testclass.vpp.stderr.fileno()]
+        else:
+            readable = select.select([testclass.vpp.stdout.fileno(),
+                                      testclass.vpp.stderr.fileno(),
+                                      testclass.pump_thread_wakeup_pipe[0]],
+                                     [], [])[0]
         if testclass.vpp.stdout.fileno() in readable:
             read = os.read(testclass.vpp.stdout.fileno(), 102400)
             if len(read) > 0:
@@ -207,6 +243,9 @@ class VppTestCase(unittest.TestCase):
 
     extra_vpp_punt_config = []
     extra_vpp_plugin_config = []
+    #: lease vpp from the pool of running instances if there is one, test
+    #: cases relying on a private vpp runtime directory set this to False
+    vpp_pool = True
 
     @property
     def packet_infos(self):
@@ -355,8 +394,42 @@ class VppTestCase(unittest.TestCase):
         print(single_line_delim)
         input("Press ENTER to continue running the testcase...")
 
+    @classmethod
+    def lease_vpp(cls):
+        """ Lease a vpp from the pool if pooling is enabled """
+        cls.vpp_pool_instance = None
+        if vpp_pool.pool_dir() is None or not cls.vpp_pool or cls.step or \
+                cls.debug_gdb or cls.debug_gdbserver:
+            return
+        private = (cls.tempdir, cls.shm_prefix, cls.stats_sock)
+        cls.vpp_signature = vpp_pool.signature(cls.vpp_cmdline, private)
+        cls.vpp_pool_instance = vpp_pool.lease(cls.vpp_signature)
+        if cls.vpp_pool_instance is None:
+            cls.logger.info("All pooled vpp instances are leased")
+            return
+        # per-instance values of the command line of a vpp started in the pool
+        cls.vpp_pool_private = dict(zip(private, (
+            cls.vpp_pool_instance.directory,
+            cls.vpp_pool_instance.shm_prefix,
+            cls.vpp_pool_instance.stats_sock)))
+        cls.shm_prefix = cls.vpp_pool_instance.shm_prefix
+        cls.stats_sock = cls.vpp_pool_instance.stats_sock
+        # the test runner looks for a core file in the temporary directory
+        cls.vpp_pool_instance.link_core(cls.tempdir)
+        cls.logger.info("Leased pooled vpp in %s, shm prefix is %s",
+                        cls.vpp_pool_instance.directory, cls.shm_prefix)
+
     @classmethod
     def run_vpp(cls):
+        if cls.vpp_pool_instance is not None:
+            if cls.vpp_pool_instance.running:
+                cls.vpp = cls.vpp_pool_instance.process()
+            else:
+                cls.vpp = cls.vpp_pool_instance.start(
+                    cls.vpp_cmdline, cls.vpp_signature, cls.vpp_pool_private)
+            cls.wait_for_enter()
+            return
+
         cmdline = cls.vpp_cmdline
 
         if cls.debug_gdbserver:
@@ -431,6 +504,7 @@ class VppTestCase(unittest.TestCase):
         # need to catch exceptions here because if we raise, then the cleanup
         # doesn't get called and we might end with a zombie vpp
         try:
+            cls.lease_vpp()
             cls.run_vpp()
             cls.reporter.send_keep_alive(cls, 'setUpClass')
             VppTestResult.current_test_case_info = TestCaseInfo(
@@ -475,6 +549,9 @@ class VppTestCase(unittest.TestCase):
                                    "VPP-API connection failed, did you forget "
                                    "to 'continue' VPP from within gdb?", RED))
                 raise
+            if cls.vpp_pool_instance is not None and \
+                    cls.vpp_pool_instance.baseline is None:
+                cls.vpp_pool_instance.set_baseline(cls.vpp_state())
         except Exception:
             try:
                 cls.quit()
@@ -508,17 +585,32 @@ class VppTestCase(unittest.TestCase):
             cls.logger.debug("Waiting for stdderr pump to stop")
             cls.vpp_stderr_reader_thread.join()
 
+        for i in getattr(cls, 'pg_interfaces', []):
+            i.close_capture()
+
+        pool_instance = getattr(cls, 'vpp_pool_instance', None)
         if hasattr(cls, 'vpp'):
+            reset = False
             if hasattr(cls, 'vapi'):
+                if pool_instance is not None:
+                    reset = cls.reset_vpp()
                 cls.vapi.disconnect()
                 del cls.vapi
-            cls.vpp.poll()
-            if cls.vpp.returncode is None:
-                cls.logger.debug("Sending TERM to vpp")
-                cls.vpp.kill()
-                cls.logger.debug("Waiting for vpp to die")
-                cls.vpp.communicate()
+            if reset:
+                cls.logger.debug("Releasing pooled vpp")
+                cls.vpp.close()
+                pool_instance.release()
+            else:
+                cls.vpp.poll()
+                if cls.vpp.returncode is None:
+                    cls.logger.debug("Sending TERM to vpp")
+                    cls.vpp.kill()
+                    cls.logger.debug("Waiting for vpp to die")
+                    cls.vpp.communicate()
             del cls.vpp
+        if pool_instance is not None:
+            pool_instance.discard(cls.tempdir)
+            cls.vpp_pool_instance = None
 
         if cls.vpp_startup_failed:
             stdout_log = cls.logger.info
@@ -547,6 +639,109 @@ class VppTestCase(unittest.TestCase):
             stderr_log('\n%s', vpp_output)
             stderr_log(single_line_delim)
 
+    @classmethod
+    def reset_vpp(cls):
+        """
+        Reset a pooled vpp to the state it had after startup, so that it can
+        be leased by the next test case
+
+        :returns: True if vpp was reset, False if it must be discarded
+        """
+        if cls.vpp_dead:
+            return False
+        try:
+            cls.registry.remove_vpp_config(cls.logger)
+            captures = cls._zombie_captures + cls._captures
+            if captures:
+                # same grace period as in pg_start()
+                cls.sleep(0.1, "before deleting captures")
+            for stamp, cap_name in captures:
+                cls.vapi.cli('packet-generator delete %s' % cap_name)
+            cls._zombie_captures = []
+            cls._captures = []
+
+            interfaces = cls.vapi.sw_interface_dump()
+            # sub-interfaces go before their parents
+            for i in sorted(interfaces,
+                            key=lambda i: i.sw_if_index == i.sup_sw_if_index):
+                name = i.interface_name.split(b'\0', 1)[0].decode('utf8')
+                if i.sw_if_index != i.sup_sw_if_index:
+                    cls.vapi.delete_subif(i.sw_if_index)
+                elif name.startswith("loop"):
+                    cls.vapi.delete_loopback(i.sw_if_index)
+                elif name.startswith("pg"):
+                    cls.vapi.sw_interface_set_flags(i.sw_if_index, 0)
+                    cls.vapi.ip6_sw_interface_enable_disable(i.sw_if_index,
+                                                             0)
+                    for is_ipv6 in (0, 1):
+                        for n in cls.vapi.ip_neighbor_dump(i.sw_if_index,
+                                                           is_ipv6):
+                            cls.vapi.ip_neighbor_add_del(
+                                i.sw_if_index, n.mac_address, n.ip_address,
+                                is_add=0, is_ipv6=is_ipv6)
+                        cls.vapi.sw_interface_add_del_address(
+                            i.sw_if_index, b'\0' * 16, 0, is_ipv6=is_ipv6,
+                            is_add=0, del_all=1)
+                        cls.vapi.sw_interface_set_table(
+                            i.sw_if_index, is_ipv6, 0)
+                    cls.vapi.cli("set interface l3 %s" % name)
+                elif name != "local0":
+                    cls.logger.info("Cannot reset pooled vpp, interface %s "
+                                    "remains" % name)
+                    return False
+            for bd in cls.vapi.bridge_domain_dump():
+                if bd.bd_id != 0:
+                    cls.vapi.bridge_domain_add_del(bd.bd_id, is_add=0)
+            for cli in ("clear trace", "clear errors", "clear interfaces",
+                        "clear runtime"):
+                cls.vapi.cli(cli)
+
+            # whatever wasn't cleaned up above makes the vpp unusable
+            if [t for t in cls.vapi.ip_fib_dump() if t.table_id != 0] or \
+                    [t for t in cls.vapi.ip6_fib_dump() if t.table_id != 0]:
+                cls.logger.info("Cannot reset pooled vpp, FIB tables remain")
+                return False
+            for i in cls.vapi.sw_interface_dump():
+                for is_ipv6 in (0, 1):
+                    if cls.vapi.ip_neighbor_dump(i.sw_if_index, is_ipv6):
+                        cls.logger.info("Cannot reset pooled vpp, neighbors "
+                                        "remain")
+                        return False
+            # routes in table 0 and the plugin configuration done by the
+            # test through the API, which the steps above don't undo
+            baseline = cls.vpp_pool_instance.baseline or {}
+            state = cls.vpp_state()
+            changed = sorted(name for name in set(baseline) | set(state)
+                             if baseline.get(name) != state.get(name))
+            if changed:
+                cls.logger.info("Cannot reset pooled vpp, state differs from "
+                                "startup: %s" % ", ".join(changed))
+                return False
+        except Exception:
+            cls.logger.exception("Cannot reset pooled vpp")
+            return False
+        return True
+
+    @classmethod
+    def vpp_state(cls):
+        """
+        Return the state of vpp a pooled vpp is compared with when reset
+
+        :returns: dictionary dump message -> number of entries, for the
+                  messages of POOL_STATE_DUMPS known to vpp
+        """
+        state = {}
+        for name, args, field in POOL_STATE_DUMPS:
+            if not hasattr(cls.vapi.papi, name):
+                # plugin not loaded
+                continue
+            details = cls.vapi.api(getattr(cls.vapi.papi, name), args)
+            if field is None:
+                state[name] = len(details)
+            else:
+                state[name] = sum(getattr(d, field) for d in details)
+        return state
+
     @classmethod
     def tearDownClass(cls):
         """ Perform final cleanup after running all tests in this test-case """
@@ -877,6 +1072,23 @@ class VppTestCase(unittest.TestCase):
                 "Checksum field `%s` on `%s` layer has correct value `%s`" %
                 (cf, temp[layer].name, calc_sum))
 
+    def assert_raw_capture_valid(self, capture, invalid, remark):
+        """ Fail if some packets of a raw capture are invalid
+
+        Only the invalid packets are dissected, to be logged.
+
+        :param capture: raw_capture.RawCapture
+        :param invalid: indices of the invalid packets
+        :param remark: what the packets were verified for
+        """
+        if not invalid:
+            return
+        self.logger.error(capture.report(
+            "Unexpected or invalid packets (%s):" % remark, invalid))
+        raise AssertionError(
+            "%s of %s packets are unexpected or invalid (%s)" %
+            (len(set(invalid)), len(capture), remark))
+
     def assert_checksum_valid(self, received_packet, layer,
                               field_name='chksum',
                               ignore_zero_checksum=False):
@@ -0,0 +1,319 @@
+""" fast generation of large packet streams
+
+Building thousands of packets with scapy costs a dissection-sized amount
+of work per packet. A PacketTemplate serializes a scapy packet once and
+generates the stream by patching the varying fields in copies of its bytes.
+The lengths and the IPv4, TCP, UDP, ICMP and ICMPv6 checksums are updated
+incrementally: the one's complement sums of the constant parts of the
+template are computed once and only the sums of the values patched in are
+added per packet. The packets are bytes, written straight into a pcap file
+by write_pcap() or VppPGInterface.add_stream().
+"""
+
+import binascii
+import socket
+import struct
+
+from six import integer_types
+
+from scapy.packet import Raw, NoPayload
+from scapy.layers.l2 import Ether
+from scapy.layers.inet import IP, TCP, UDP, ICMP
+from scapy.layers.inet6 import IPv6, ICMPv6EchoRequest, ICMPv6EchoReply
+from vpp_papi import mac_pton
+
+#: layer -> field -> (offset in the layer, size) of the fields which can
+#: be patched
+FIELDS = {
+    Ether: {'dst': (0, 6), 'src': (6, 6)},
+    IP: {'tos': (1, 1), 'id': (4, 2), 'ttl': (8, 1), 'src': (12, 4),
+         'dst': (16, 4)},
+    IPv6: {'hlim': (7, 1), 'src': (8, 16), 'dst': (24, 16)},
+    TCP: {'sport': (0, 2), 'dport': (2, 2), 'seq': (4, 4), 'ack': (8, 4),
+          'window': (14, 2)},
+    UDP: {'sport': (0, 2), 'dport': (2, 2)},
+    ICMP: {'type': (0, 1), 'code': (1, 1), 'id': (4, 2), 'seq': (6, 2)},
+    ICMPv6EchoRequest: {'id': (4, 2), 'seq': (6, 2)},
+    ICMPv6EchoReply: {'id': (4, 2), 'seq': (6, 2)},
+}
+
+#: struct formats of the integer fields by size
+INTEGER_FORMATS = {1: "!B", 2: "!H", 4: "!I"}
+
+#: IP protocol -> (checksum offset, length offset or None, pseudo-header)
+L4_CHECKSUMS = {
+    socket.IPPROTO_TCP: (16, None, True),
+    socket.IPPROTO_UDP: (6, 4, True),
+    socket.IPPROTO_ICMP: (2, None, False),
+    socket.IPPROTO_ICMPV6: (2, None, True),
+}
+
+pcap_header = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+
+
+def sum16(data, odd=False):
+    """ Sum of the 16-bit big-endian words of data
+
+    :param odd: data starts at an odd offset from the start of the
+                checksummed area
+    """
+    if odd:
+        data = b'\0' + bytes(data)
+    s = sum(struct.unpack_from("!%dH" % (len(data) // 2), data))
+    if len(data) % 2:
+        s += bytearray(data[-1:])[0] << 8
+    return s
+
+
+def fold16(s):
+    """ Checksum of a one's complement sum """
+    s = (s & 0xffff) + (s >> 16)
+    s = (s & 0xffff) + (s >> 16)
+    return ~s & 0xffff
+
+
+def to_bytes(value, size):
+    """ Serialize a field value: integer, MAC or IPv4/IPv6 address, as text
+    or already in network format """
+    if isinstance(value, integer_types):
+        return struct.pack(INTEGER_FORMATS[size], value)
+    try:
+        if size == 4:
+            data = socket.inet_pton(socket.AF_INET, value)
+        elif size == 16:
+            data = socket.inet_pton(socket.AF_INET6, value)
+        elif size == 6:
+            data = mac_pton(value)
+        else:
+            data = None
+    except (socket.error, ValueError, TypeError, binascii.Error):
+        data = None
+    if data is not None and len(data) == size:
+        return data
+    if len(value) == size:
+        return bytes(value)
+    raise ValueError("Cannot serialize %r in %d bytes" % (value, size))
+
+
+def serialize(values, size, odd=False):
+    """ Serialize field values
+
+    :param values: values of the field
+    :param size: size of the field
+    :param odd: the field is at an odd offset from the start of the
+                checksummed area
+    :returns: list of serialized values and list of their sum16()
+    """
+    if isinstance(values[0], integer_types):
+        pack = struct.Struct(INTEGER_FORMATS[size]).pack
+        data = [pack(v) for v in values]
+        if size == 1:
+            sums = values if odd else [v << 8 for v in values]
+            return data, list(sums)
+        if size == 2 and not odd:
+            return data, list(values)
+        if size == 4 and not odd:
+            return data, [(v >> 16) + (v & 0xffff) for v in values]
+    else:
+        data = [to_bytes(v, size) for v in values]
+    if odd or size % 2:
+        return data, [sum16(d, odd) for d in data]
+    words = struct.Struct("!%dH" % (size // 2)).unpack
+    return data, [sum(words(d)) for d in data]
+
+
+class PacketTemplate(object):
+    """
+    Template of packets generated from a serialized scapy packet
+
+    The payload of the template is its Raw layer, which must be its last
+    layer, and can be replaced in each generated packet.
+    """
+
+    def __init__(self, packet):
+        data = bytes(packet)
+        self._layers = {}
+        layer = packet
+        while not isinstance(layer, NoPayload):
+            offset = len(data) - len(bytes(layer))
+            self._layers.setdefault(type(layer), offset)
+            layer = layer.payload
+        if Raw in packet:
+            self.payload = packet[Raw].load
+            self.head = bytearray(data[:self._layers[Raw]])
+        else:
+            self.payload = b''
+            self.head = bytearray(data)
+
+        self.l3 = None
+        self.l4 = None
+        self._l4_checksum = None
+        if IP in self._layers:
+            self.l3 = self._layers[IP]
+            ihl = (self.head[self.l3] & 0xf) * 4
+            proto = self.head[self.l3 + 9]
+            self.l4 = self.l3 + ihl
+        elif IPv6 in self._layers:
+            self.l3 = self._layers[IPv6]
+            proto = self.head[self.l3 + 6]
+            self.l4 = self.l3 + 40
+        # with another protocol or an IPv6 extension header, only the IP
+        # lengths and the IPv4 header checksum are updated
+        if self.l4 is not None and proto in L4_CHECKSUMS and \
+                len(self.head) > self.l4:
+            self._l4_checksum = L4_CHECKSUMS[proto]
+            self._proto = proto
+
+    def offset(self, layer, field):
+        """ Return the offset and size of a field in the serialized packet
+
+        :param layer: scapy layer class, e.g. IP
+        :param field: name of the field, e.g. 'src'
+        """
+        if layer not in self._layers:
+            raise ValueError("Template has no %s layer" % layer.__name__)
+        try:
+            offset, size = FIELDS[layer][field]
+        except KeyError:
+            raise ValueError("Field %s.%s cannot be patched" %
+                             (layer.__name__, field))
+        return self._layers[layer] + offset, size
+
+    def _checksums(self, offset):
+        """ Return which checksums cover the bytes at offset: (IPv4 header,
+        L4) """
+        if self.l3 is None:
+            return False, False
+        ip4 = IP in self._layers and self._layers[IP] == self.l3
+        in_ip = ip4 and self.l3 <= offset < self.l4
+        if self._l4_checksum is None:
+            return in_ip, False
+        in_l4 = offset >= self.l4
+        if self._l4_checksum[2]:
+            # the addresses are in the pseudo-header
+            src, dst = (12, 16) if ip4 else (8, 24)
+            in_l4 = in_l4 or offset in (self.l3 + src, self.l3 + dst)
+        return in_ip, in_l4
+
+    def packets(self, count, fields=None, payloads=None):
+        """ Generate packets
+
+        :param count: number of packets
+        :param fields: dictionary (layer, field name) -> value, or sequence
+                       of count values, one per packet
+        :param payloads: sequence of count payloads, by default the payload
+                         of the template is used
+        :returns: list of packets as bytes
+        """
+        head = bytearray(self.head)
+        varying = []
+        constant = []
+        for (layer, name), value in (fields or {}).items():
+            offset, size = self.offset(layer, name)
+            if isinstance(value, (list, tuple)):
+                if len(value) != count:
+                    raise ValueError("%d values of %s.%s for %d packets" %
+                                     (len(value), layer.__name__, name, count))
+                varying.append((offset, size, value))
+            else:
+                constant.append((offset, size, value))
+        for offset, size, value in constant:
+            head[offset:offset + size] = to_bytes(value, size)
+        if payloads is None:
+            payloads = [self.payload] * count
+        elif len(payloads) != count:
+            raise ValueError("%d payloads for %d packets" %
+                             (len(payloads), count))
+        else:
+            payloads = [p if isinstance(p, (bytes, bytearray))
+                        else p.encode('utf8') for p in payloads]
+
+        # zero what is patched per packet, the sums of the remaining bytes
+        # are the base of the checksums
+        ip_checksum = l4_checksum = None
+        if self.l3 is not None and IP in self._layers and \
+                self._layers[IP] == self.l3:
+            ip_checksum = self.l3 + 10
+            head[ip_checksum:ip_checksum + 2] = b'\0\0'
+            head[self.l3 + 2:self.l3 + 4] = b'\0\0'
+        elif self.l3 is not None:
+            head[self.l3 + 4:self.l3 + 6] = b'\0\0'
+        if self._l4_checksum is not None:
+            l4_checksum = self.l4 + self._l4_checksum[0]
+            head[l4_checksum:l4_checksum + 2] = b'\0\0'
+            if self._l4_checksum[1] is not None:
+                length = self.l4 + self._l4_checksum[1]
+                head[length:length + 2] = b'\0\0'
+        for offset, size, value in varying:
+            head[offset:offset + size] = b'\0' * size
+        ip_base = l4_base = 0
+        if ip_checksum is not None:
+            ip_base = sum16(head[self.l3:self.l4])
+        if l4_checksum is not None:
+            l4_base = sum16(head[self.l4:])
+            if self._l4_checksum[2]:
+                ip4 = ip_checksum is not None
+                src, dst = (12, 16) if ip4 else (8, 24)
+                size = 4 if ip4 else 16
+                l4_base += sum16(head[self.l3 + src:self.l3 + src + size])
+                l4_base += sum16(head[self.l3 + dst:self.l3 + dst + size])
+                l4_base += self._proto
+
+        # serialized values and their sums, per varying field
+        patches = []
+        ip_sums = [ip_base] * count
+        l4_sums = [l4_base] * count
+        for offset, size, values in varying:
+            in_ip, in_l4 = self._checksums(offset)
+            odd = self.l3 is not None and (offset - self.l3) % 2 == 1
+            data, sums = serialize(values, size, odd)
+            patches.append((offset, offset + size, data))
+            if in_ip:
+                ip_sums = [a + b for a, b in zip(ip_sums, sums)]
+            if in_l4:
+                l4_sums = [a + b for a, b in zip(l4_sums, sums)]
+        if l4_checksum is not None:
+            payload_odd = (len(head) - self.l4) % 2 == 1
+            l4_sums = [a + sum16(p, payload_odd)
+                       for a, p in zip(l4_sums, payloads)]
+            # lengths are added per packet, once in the pseudo-header and
+            # once in the UDP header
+            l4_length = self._l4_checksum[1]
+            length_factor = int(self._l4_checksum[2]) + \
+                int(l4_length is not None)
+            udp = self._proto == socket.IPPROTO_UDP
+        head_l3 = len(head) - self.l3 if self.l3 is not None else 0
+        head_l4 = len(head) - self.l4 if self.l4 is not None else 0
+
+        pack_into = struct.pack_into
+        packets = []
+        for i in range(count):
+            payload = payloads[i]
+            p = head + payload
+            for start, end, data in patches:
+                p[start:end] = data[i]
+            if ip_checksum is not None:
+                length = head_l3 + len(payload)
+                pack_into("!H", p, self.l3 + 2, length)
+                pack_into("!H", p, ip_checksum, fold16(ip_sums[i] + length))
+            elif self.l3 is not None:
+                pack_into("!H", p, self.l3 + 4, head_l3 - 40 + len(payload))
+            if l4_checksum is not None:
+                length = head_l4 + len(payload)
+                if l4_length is not None:
+                    pack_into("!H", p, self.l4 + l4_length, length)
+                c = fold16(l4_sums[i] + length_factor * length)
+                if c == 0 and udp:
+                    c = 0xffff
+                pack_into("!H", p, l4_checksum, c)
+            packets.append(bytes(p))
+        return packets
+
+
+def write_pcap(path, packets):
+    """ Write packets (bytes) to a pcap file """
+    with open(path, 'wb') as f:
+        f.write(pcap_header)
+        for p in packets:
+            f.write(struct.pack("<IIII", 0, 0, len(p), len(p)))
+            f.write(p)
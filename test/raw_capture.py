@@ -0,0 +1,230 @@
+""" verification of captured packets without dissecting them
+
+Dissecting a captured packet with scapy takes much longer than checking
+the few header fields and checksums most tests look at. A RawCapture holds
+the captured frames as bytes, locates the Ethernet, IP and L4 headers of
+each frame once and reads the requested fields at their offsets with
+struct. The IPv4 header and TCP, UDP, ICMP and ICMPv6 checksums are
+verified on the raw bytes as well; scapy only dissects the packets which
+are reported as invalid.
+"""
+
+import socket
+import struct
+
+from six import indexbytes
+
+from scapy.layers.l2 import Ether
+from scapy.layers.inet import IP, TCP, UDP, ICMP
+from scapy.layers.inet6 import IPv6, ICMPv6EchoRequest, ICMPv6EchoReply
+from scapy.plist import PacketList
+from packet_stream import FIELDS, INTEGER_FORMATS, L4_CHECKSUMS, sum16, \
+    fold16
+from util import ppp
+
+#: ethertypes of VLAN tags
+VLAN_ETHERTYPES = (0x8100, 0x88a8, 0x9100)
+
+#: IPv6 extension headers with the generic length format
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+#: IP protocol -> L4 layer
+L4_LAYERS = {
+    socket.IPPROTO_TCP: TCP,
+    socket.IPPROTO_UDP: UDP,
+}
+
+#: ICMPv6 type -> layer
+ICMPV6_LAYERS = {
+    128: ICMPv6EchoRequest,
+    129: ICMPv6EchoReply,
+}
+
+
+def mac_ntop(data):
+    return ':'.join('%02x' % b for b in bytearray(data))
+
+
+def parse(frame):
+    """ Locate the headers of an Ethernet frame
+
+    :param frame: frame as bytes
+    :returns: dictionary layer -> offset of its header and the checksummed
+              L4 area: (L3 offset, L4 offset, L4 length, protocol) or None
+              if the packet has no L4 checksum or it can't be checked
+    """
+    layers = {Ether: 0}
+    offset = 14
+    if len(frame) < offset:
+        return layers, None
+    ethertype = struct.unpack_from("!H", frame, 12)[0]
+    while ethertype in VLAN_ETHERTYPES and len(frame) >= offset + 4:
+        ethertype = struct.unpack_from("!H", frame, offset + 2)[0]
+        offset += 4
+    l3 = offset
+    if ethertype == 0x0800 and len(frame) >= l3 + 20:
+        layers[IP] = l3
+        version_ihl, total_length, fragment, proto = struct.unpack_from(
+            "!BxHxxHxB", frame, l3)
+        l4 = l3 + (version_ihl & 0xf) * 4
+        l4_length = total_length - (l4 - l3)
+        layer = ICMP if proto == socket.IPPROTO_ICMP else L4_LAYERS.get(proto)
+        # only the first fragment has the L4 header
+        if layer is not None and fragment & 0x1fff == 0:
+            layers[layer] = l4
+        if fragment & 0x3fff:
+            # the L4 checksum covers the whole datagram
+            return layers, None
+    elif ethertype == 0x86dd and len(frame) >= l3 + 40:
+        layers[IPv6] = l3
+        payload_length = struct.unpack_from("!H", frame, l3 + 4)[0]
+        proto = indexbytes(frame, l3 + 6)
+        l4 = l3 + 40
+        while proto in IPV6_EXTENSION_HEADERS and len(frame) >= l4 + 2:
+            proto = indexbytes(frame, l4)
+            l4 += (indexbytes(frame, l4 + 1) + 1) * 8
+        l4_length = payload_length - (l4 - l3 - 40)
+        if proto == socket.IPPROTO_ICMPV6 and len(frame) > l4:
+            layer = ICMPV6_LAYERS.get(indexbytes(frame, l4))
+            if layer is not None:
+                layers[layer] = l4
+        elif proto in L4_LAYERS:
+            layers[L4_LAYERS[proto]] = l4
+    else:
+        return layers, None
+    if proto not in L4_CHECKSUMS:
+        return layers, None
+    return layers, (l3, l4, l4_length, proto)
+
+
+def checksums_valid(frame, layers, l4):
+    """ Verify the IPv4 header and L4 checksums of a frame
+
+    :param frame: frame as bytes
+    :param layers: headers of the frame, as returned by parse()
+    :param l4: checksummed L4 area, as returned by parse()
+    """
+    if IP in layers:
+        l3 = layers[IP]
+        ihl = (indexbytes(frame, l3) & 0xf) * 4
+        if len(frame) < l3 + ihl or fold16(sum16(frame[l3:l3 + ihl])):
+            return False
+    if l4 is None:
+        return True
+    l3, offset, length, proto = l4
+    checksum, _, pseudo = L4_CHECKSUMS[proto]
+    if len(frame) < offset + length or length < checksum + 2:
+        return False
+    ip4 = IP in layers
+    if ip4 and proto == socket.IPPROTO_UDP and \
+            struct.unpack_from("!H", frame, offset + checksum)[0] == 0:
+        # no checksum
+        return True
+    s = sum16(frame[offset:offset + length])
+    if pseudo:
+        addresses = frame[l3 + 12:l3 + 20] if ip4 else frame[l3 + 8:l3 + 40]
+        s += sum16(addresses) + proto + length
+    return fold16(s) == 0
+
+
+class RawCapture(object):
+    """
+    Captured packets as bytes
+    """
+
+    def __init__(self, frames, name=None):
+        """
+        :param frames: captured Ethernet frames as bytes
+        :param name: name of the capture
+        """
+        self.frames = frames
+        self.name = name
+        self._parsed = [parse(f) for f in frames]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def packet(self, index):
+        """ Return a captured packet dissected by scapy """
+        return Ether(self.frames[index])
+
+    def dissect(self, indices=None):
+        """ Return captured packets dissected by scapy
+
+        :param indices: indices of the packets, all the packets by default
+        """
+        if indices is None:
+            indices = range(len(self.frames))
+        return PacketList([self.packet(i) for i in indices], name=self.name)
+
+    def having(self, layer):
+        """ Return the indices of the packets having a layer """
+        return [i for i, (layers, l4) in enumerate(self._parsed)
+                if layer in layers]
+
+    def fields(self, layer, name):
+        """ Return the values of a field in all the packets
+
+        Addresses are returned as text, the other fields as integers.
+
+        :param layer: scapy layer class, e.g. IP
+        :param name: name of the field, see packet_stream.FIELDS
+        :returns: list of the values, None for the packets without the layer
+        """
+        try:
+            offset, size = FIELDS[layer][name]
+        except KeyError:
+            raise ValueError("Field %s.%s is not supported" %
+                             (layer.__name__, name))
+        if size == 6:
+            def value(f, o):
+                return mac_ntop(f[o:o + size])
+        elif layer in (IP, IPv6) and name in ('src', 'dst'):
+            family = socket.AF_INET if layer is IP else socket.AF_INET6
+
+            def value(f, o):
+                return socket.inet_ntop(family, f[o:o + size])
+        else:
+            unpack_from = struct.Struct(INTEGER_FORMATS[size]).unpack_from
+
+            def value(f, o):
+                return unpack_from(f, o)[0]
+        values = []
+        for frame, (layers, l4) in zip(self.frames, self._parsed):
+            start = layers.get(layer)
+            if start is None or len(frame) < start + offset + size:
+                values.append(None)
+            else:
+                values.append(value(frame, start + offset))
+        return values
+
+    def bad_checksums(self, indices=None):
+        """ Return the indices of the packets with an invalid IPv4 header or
+        L4 checksum
+
+        Zero UDP checksums of IPv4 packets are valid, the L4 checksum of
+        fragments isn't verified.
+
+        :param indices: indices of the packets to verify, all the packets by
+                        default
+        """
+        if indices is None:
+            indices = range(len(self.frames))
+        return [i for i in indices
+                if not checksums_valid(self.frames[i], *self._parsed[i])]
+
+    def report(self, headline, indices, limit=10):
+        """ Return the printout of some packets dissected by scapy
+
+        :param headline: printed as first line of output
+        :param indices: indices of the packets to print
+        :param limit: limit the print to # of packets
+        """
+        indices = sorted(set(indices))
+        body = "".join(ppp("Packet #%s:" % i, self.packet(i))
+                       for i in indices[:limit])
+        tail = ""
+        if limit < len(indices):
+            tail = "\nPrint limit reached, %s out of %s packets printed" % (
+                limit, len(indices))
+        return "%s\n%s%s" % (headline, body, tail)
@@ -348,6 +348,9 @@ class RemoteVppTestCase(VppTestCase):
             super(MyTestCase, cls).tearDownClass()
     """
 
+    # the memif sockets live in the runtime directory of the test case
+    vpp_pool = False
+
     def __init__(self):
         super(RemoteVppTestCase, self).__init__("emptyTest")
 
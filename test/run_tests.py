@@ -11,6 +11,7 @@ import threading
 import signal
 import psutil
 import re
+import tempfile
 from multiprocessing import Process, Pipe, cpu_count
 from multiprocessing.queues import Queue
 from multiprocessing.managers import BaseManager
@@ -23,6 +24,7 @@ from log import get_parallel_logger, double_line_delim, RED, YELLOW, GREEN, \
 from discover_tests import discover_tests
 from subprocess import check_output, CalledProcessError
 from util import check_core_path, get_core_path, is_core_present
+import vpp_pool
 
 # timeout which controls how long the child has to finish after seeing
 # a core dump in test temporary directory. If this is exceeded, parent assumes
@@ -809,12 +811,23 @@ if __name__ == '__main__':
         sys.exit(not was_successful)
     else:
         exit_code = 0
-        while len(suites) > 0 and attempts > 0:
-            results = run_forked(suites)
-            exit_code, suites = parse_results(results)
-            attempts -= 1
-            if exit_code == 0:
-                print('Test run was successful')
-            else:
-                print('%s attempt(s) left.' % attempts)
+        pool_size = parse_digit_env(vpp_pool.pool_size_env, 0)
+        if pool_size > 0:
+            # test classes lease running VPPs from the pool
+            pool_dir = tempfile.mkdtemp(prefix='vpp-pool-')
+            os.environ[vpp_pool.pool_dir_env] = pool_dir
+            print('Using a pool of up to %s running VPP instances in %s'
+                  % (pool_size, pool_dir))
+        try:
+            while len(suites) > 0 and attempts > 0:
+                results = run_forked(suites)
+                exit_code, suites = parse_results(results)
+                attempts -= 1
+                if exit_code == 0:
+                    print('Test run was successful')
+                else:
+                    print('%s attempt(s) left.' % attempts)
+        finally:
+            if pool_size > 0:
+                vpp_pool.shutdown(pool_dir)
         sys.exit(exit_code)
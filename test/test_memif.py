@@ -11,6 +11,9 @@ from vpp_memif import *
 class TestMemif(VppTestCase):
     """ Memif Test Case """
 
+    # the default memif socket is in the vpp runtime directory
+    vpp_pool = False
+
     @classmethod
     def setUpClass(cls):
         # fork new process before client connects to VPP
@@ -15,6 +15,8 @@ from scapy.layers.l2 import Ether, ARP, GRE
 from scapy.data import IP_PROTOS
 from scapy.packet import bind_layers, Raw
 from util import ppp
+from raw_capture import RawCapture
+from packet_stream import PacketTemplate
 from ipfix import IPFIX, Set, Template, Data, IPFIXDecoder
 from time import sleep
 from util import ip4_range
@@ -433,7 +435,8 @@ class MethodHolder(VppTestCase):
 
         :param capture: Captured packets
         :param nat_ip: Translated IP address (Default use global NAT address)
-        :param same_port: Sorce port number is not translated (Default False)
+        :param same_port: Sorce port number is not translated (Default False,
+                          None do not verify)
         :param dst_ip: Destination IP address (Default do not verify)
         :param is_ip6: If L3 protocol is IPv6 (Default False)
         """
@@ -445,6 +448,9 @@ class MethodHolder(VppTestCase):
             ICMP46 = ICMP
         if nat_ip is None:
             nat_ip = self.nat_addr
+        if isinstance(capture, RawCapture):
+            return self.verify_raw_capture_out(capture, nat_ip, same_port,
+                                               dst_ip, IP46, ICMP46)
         for packet in capture:
             try:
                 if not is_ip6:
@@ -455,7 +461,7 @@ class MethodHolder(VppTestCase):
                 if packet.haslayer(TCP):
                     if same_port:
                         self.assertEqual(packet[TCP].sport, self.tcp_port_in)
-                    else:
+                    elif same_port is not None:
                         self.assertNotEqual(
                             packet[TCP].sport, self.tcp_port_in)
                     self.tcp_port_out = packet[TCP].sport
@@ -463,14 +469,14 @@ class MethodHolder(VppTestCase):
                 elif packet.haslayer(UDP):
                     if same_port:
                         self.assertEqual(packet[UDP].sport, self.udp_port_in)
-                    else:
+                    elif same_port is not None:
                         self.assertNotEqual(
                             packet[UDP].sport, self.udp_port_in)
                     self.udp_port_out = packet[UDP].sport
                 else:
                     if same_port:
                         self.assertEqual(packet[ICMP46].id, self.icmp_id_in)
-                    else:
+                    elif same_port is not None:
                         self.assertNotEqual(packet[ICMP46].id, self.icmp_id_in)
                     self.icmp_id_out = packet[ICMP46].id
                     self.assert_packet_checksums_valid(packet)
@@ -479,6 +485,49 @@ class MethodHolder(VppTestCase):
                                       "(outside network):", packet))
                 raise
 
+    def verify_raw_capture_out(self, capture, nat_ip, same_port, dst_ip,
+                               IP46, ICMP46):
+        """
+        Verify packets captured on outside network without dissecting them,
+        see verify_capture_out
+
+        :param capture: raw_capture.RawCapture
+        :param IP46: IP or IPv6
+        :param ICMP46: ICMP or ICMPv6EchoRequest
+        """
+        invalid = [i for i, src in enumerate(capture.fields(IP46, 'src'))
+                   if src != nat_ip]
+        if dst_ip is not None:
+            invalid.extend(i for i, dst in
+                           enumerate(capture.fields(IP46, 'dst'))
+                           if dst != dst_ip)
+        tcp = capture.having(TCP)
+        udp = capture.having(UDP)
+        icmp = capture.having(ICMP46)
+        invalid.extend(set(range(len(capture))) - set(tcp + udp + icmp))
+        if IP46 is IP:
+            invalid.extend(capture.bad_checksums())
+        else:
+            invalid.extend(capture.bad_checksums(tcp + icmp))
+        for layer, name, value_in in ((TCP, 'sport', self.tcp_port_in),
+                                      (UDP, 'sport', self.udp_port_in),
+                                      (ICMP46, 'id', self.icmp_id_in)):
+            values = capture.fields(layer, name)
+            indices = [i for i, v in enumerate(values) if v is not None]
+            if same_port:
+                invalid.extend(i for i in indices if values[i] != value_in)
+            elif same_port is not None:
+                invalid.extend(i for i in indices if values[i] == value_in)
+            if indices:
+                value_out = values[indices[-1]]
+                if layer is TCP:
+                    self.tcp_port_out = value_out
+                elif layer is UDP:
+                    self.udp_port_out = value_out
+                else:
+                    self.icmp_id_out = value_out
+        self.assert_raw_capture_valid(capture, invalid, "outside network")
+
     def verify_capture_out_ip6(self, capture, nat_ip, same_port=False,
                                dst_ip=None):
         """
@@ -499,6 +548,8 @@ class MethodHolder(VppTestCase):
         :param capture: Captured packets
         :param in_if: Inside interface
         """
+        if isinstance(capture, RawCapture):
+            return self.verify_raw_capture_in(capture, in_if)
         for packet in capture:
             try:
                 self.assert_packet_checksums_valid(packet)
@@ -514,6 +565,29 @@ class MethodHolder(VppTestCase):
                                       "(inside network):", packet))
                 raise
 
+    def verify_raw_capture_in(self, capture, in_if):
+        """
+        Verify packets captured on inside network without dissecting them,
+        see verify_capture_in
+
+        :param capture: raw_capture.RawCapture
+        :param in_if: Inside interface
+        """
+        invalid = capture.bad_checksums()
+        invalid.extend(i for i, dst in enumerate(capture.fields(IP, 'dst'))
+                       if dst != in_if.remote_ip4)
+        found = set()
+        for layer, name, value_in in ((TCP, 'dport', self.tcp_port_in),
+                                      (UDP, 'dport', self.udp_port_in),
+                                      (ICMP, 'id', self.icmp_id_in)):
+            for i, v in enumerate(capture.fields(layer, name)):
+                if v is not None:
+                    found.add(i)
+                    if v != value_in:
+                        invalid.append(i)
+        invalid.extend(set(range(len(capture))) - found)
+        self.assert_raw_capture_valid(capture, invalid, "inside network")
+
     def verify_capture_in_ip6(self, capture, src_ip, dst_ip):
         """
         Verify captured IPv6 packets on inside network
@@ -1530,7 +1604,7 @@ class TestNAT44(MethodHolder):
         self.pg0.add_stream(pkts)
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
-        capture = self.pg1.get_capture(len(pkts))
+        capture = self.pg1.get_raw_capture(len(pkts))
         self.verify_capture_out(capture)
 
         err = self.statistics.get_counter(
@@ -1557,7 +1631,7 @@ class TestNAT44(MethodHolder):
         self.pg1.add_stream(pkts)
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
-        capture = self.pg0.get_capture(len(pkts))
+        capture = self.pg0.get_raw_capture(len(pkts))
         self.verify_capture_in(capture, self.pg0)
 
         err = self.statistics.get_counter('/err/nat44-out2in/TCP packets')
@@ -2488,18 +2562,20 @@ class TestNAT44(MethodHolder):
 
         # send more than maximum number of translations per user packets
         pkts_num = nat44_config.max_translations_per_user + 5
-        pkts = []
-        for port in range(0, pkts_num):
-            p = (Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
-                 IP(src=self.pg0.remote_ip4, dst=self.pg1.remote_ip4) /
-                 TCP(sport=1025 + port))
-            pkts.append(p)
-        self.pg0.add_stream(pkts)
+        template = PacketTemplate(
+            Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
+            IP(src=self.pg0.remote_ip4, dst=self.pg1.remote_ip4) /
+            TCP())
+        sports = [1025 + port for port in range(0, pkts_num)]
+        self.pg0.add_stream(template.packets(pkts_num,
+                                             {(TCP, 'sport'): sports}))
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
 
         # verify number of translated packet
-        self.pg1.get_capture(pkts_num)
+        capture = self.pg1.get_raw_capture(pkts_num)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
 
         users = self.vapi.nat44_user_dump()
         for user in users:
@@ -2739,18 +2815,20 @@ class TestNAT44(MethodHolder):
         nat44_config = self.vapi.nat_show_config()
         max_sessions = 10 * nat44_config.translation_buckets
 
-        pkts = []
-        for i in range(0, max_sessions):
-            src = "10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
-            p = (Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
-                 IP(src=src, dst=self.pg1.remote_ip4) /
-                 TCP(sport=1025))
-            pkts.append(p)
-        self.pg0.add_stream(pkts)
+        template = PacketTemplate(
+            Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
+            IP(dst=self.pg1.remote_ip4) /
+            TCP(sport=1025))
+        srcs = ["10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
+                for i in range(0, max_sessions)]
+        self.pg0.add_stream(template.packets(max_sessions,
+                                             {(IP, 'src'): srcs}))
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
 
-        self.pg1.get_capture(max_sessions)
+        capture = self.pg1.get_raw_capture(max_sessions)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
         self.vapi.set_ipfix_exporter(collector_address=self.pg3.remote_ip4n,
                                      src_address=self.pg3.local_ip4n,
                                      path_mtu=512,
@@ -3717,31 +3795,35 @@ class TestNAT44(MethodHolder):
         self.vapi.nat_set_timeouts(udp=5)
 
         max_sessions = 1000
-        pkts = []
-        for i in range(0, max_sessions):
-            src = "10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
-            p = (Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
-                 IP(src=src, dst=self.pg1.remote_ip4) /
-                 UDP(sport=1025, dport=53))
-            pkts.append(p)
-        self.pg0.add_stream(pkts)
-        self.pg_enable_capture(self.pg_interfaces)
-        self.pg_start()
-        self.pg1.get_capture(max_sessions)
+        template = PacketTemplate(
+            Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
+            IP(dst=self.pg1.remote_ip4) /
+            UDP(sport=1025, dport=53))
+        srcs = ["10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
+                for i in range(0, max_sessions)]
+        self.pg0.add_stream(template.packets(max_sessions,
+                                             {(IP, 'src'): srcs}))
+        self.pg_enable_capture(self.pg_interfaces)
+        self.pg_start()
+        capture = self.pg1.get_raw_capture(max_sessions)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
 
         sleep(6)
 
-        pkts = []
-        for i in range(0, max_sessions):
-            src = "10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
-            p = (Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
-                 IP(src=src, dst=self.pg1.remote_ip4) /
-                 UDP(sport=1026, dport=53))
-            pkts.append(p)
-        self.pg0.add_stream(pkts)
+        template = PacketTemplate(
+            Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
+            IP(dst=self.pg1.remote_ip4) /
+            UDP(sport=1026, dport=53))
+        srcs = ["10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
+                for i in range(0, max_sessions)]
+        self.pg0.add_stream(template.packets(max_sessions,
+                                             {(IP, 'src'): srcs}))
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
-        self.pg1.get_capture(max_sessions)
+        capture = self.pg1.get_raw_capture(max_sessions)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
 
         nsessions = 0
         users = self.vapi.nat44_user_dump()
@@ -5877,31 +5959,35 @@ class TestNAT44EndpointDependent(MethodHolder):
         self.vapi.nat_set_timeouts(icmp=5)
 
         max_sessions = 1000
-        pkts = []
-        for i in range(0, max_sessions):
-            src = "10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
-            p = (Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
-                 IP(src=src, dst=self.pg1.remote_ip4) /
-                 ICMP(id=1025, type='echo-request'))
-            pkts.append(p)
-        self.pg0.add_stream(pkts)
-        self.pg_enable_capture(self.pg_interfaces)
-        self.pg_start()
-        self.pg1.get_capture(max_sessions)
+        template = PacketTemplate(
+            Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
+            IP(dst=self.pg1.remote_ip4) /
+            ICMP(id=1025, type='echo-request'))
+        srcs = ["10.10.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
+                for i in range(0, max_sessions)]
+        self.pg0.add_stream(template.packets(max_sessions,
+                                             {(IP, 'src'): srcs}))
+        self.pg_enable_capture(self.pg_interfaces)
+        self.pg_start()
+        capture = self.pg1.get_raw_capture(max_sessions)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
 
         sleep(10)
 
-        pkts = []
-        for i in range(0, max_sessions):
-            src = "10.11.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
-            p = (Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
-                 IP(src=src, dst=self.pg1.remote_ip4) /
-                 ICMP(id=1026, type='echo-request'))
-            pkts.append(p)
-        self.pg0.add_stream(pkts)
+        template = PacketTemplate(
+            Ether(dst=self.pg0.local_mac, src=self.pg0.remote_mac) /
+            IP(dst=self.pg1.remote_ip4) /
+            ICMP(id=1026, type='echo-request'))
+        srcs = ["10.11.%u.%u" % ((i & 0xFF00) >> 8, i & 0xFF)
+                for i in range(0, max_sessions)]
+        self.pg0.add_stream(template.packets(max_sessions,
+                                             {(IP, 'src'): srcs}))
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
-        self.pg1.get_capture(max_sessions)
+        capture = self.pg1.get_raw_capture(max_sessions)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
 
         nsessions = 0
         users = self.vapi.nat44_user_dump()
@@ -7839,7 +7925,9 @@ class TestNAT64(MethodHolder):
         self.pg0.add_stream(pkts)
         self.pg_enable_capture(self.pg_interfaces)
         self.pg_start()
-        self.pg1.get_capture(max_sessions)
+        capture = self.pg1.get_raw_capture(max_sessions)
+        self.verify_capture_out(capture, same_port=None,
+                                dst_ip=self.pg1.remote_ip4)
 
         self.vapi.set_ipfix_exporter(collector_address=self.pg3.remote_ip4n,
                                      src_address=self.pg3.local_ip4n,
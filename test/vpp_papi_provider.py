@@ -2,6 +2,7 @@ import fnmatch
 import os
 import time
 from collections import deque
+from threading import Condition
 
 from six import moves
 from vpp_papi import mac_pton
@@ -15,6 +16,7 @@ from vpp_l2 import L2_PORT_TYPE
 
 try:
     from vpp_papi import VPP
+    from vpp_papi.vpp_papi import api_bundle_name
 except ImportError:
     if not os.getenv("NO_VPP_PAPI") == 1:
         raise
@@ -81,10 +83,18 @@ class VppPapiProvider(object):
         for root, dirnames, filenames in os.walk(install_dir):
             for filename in fnmatch.filter(filenames, '*.api.json'):
                 jsonfiles.append(os.path.join(root, filename))
+        # The schema bundle holds the API definitions built with VPP, loaded
+        # at once, the files it doesn't hold are loaded after it
+        bundle = os.path.join(install_dir, 'vpp', 'share', 'vpp', 'api',
+                              api_bundle_name)
+        if os.path.isfile(bundle):
+            jsonfiles.insert(0, bundle)
 
         self.vpp = VPP(jsonfiles, logger=test_class.logger,
                        read_timeout=read_timeout)
         self._events = deque()
+        # notified by the event callback, which runs in the papi thread
+        self._events_condition = Condition()
 
     def __enter__(self):
         return self
@@ -123,8 +133,9 @@ class VppPapiProvider(object):
 
     def collect_events(self):
         """ Collect all events from the internal queue and clear the queue. """
-        e = self._events
-        self._events = deque()
+        with self._events_condition:
+            e = self._events
+            self._events = deque()
         return e
 
     def wait_for_event(self, timeout, name=None):
@@ -138,25 +149,28 @@ class VppPapiProvider(object):
         if self._events:
             self.test_class.logger.debug("Not waiting, event already queued")
         limit = time.time() + timeout
-        while time.time() < limit:
-            if self._events:
-                e = self._events.popleft()
-                if name and type(e).__name__ != name:
-                    raise Exception(
-                        "Unexpected event received: %s, expected: %s" %
-                        (type(e).__name__, name))
-                self.test_class.logger.debug("Returning event %s:%s" %
-                                             (name, e))
-                return e
-            time.sleep(0)  # yield
-        raise Exception("Event did not occur within timeout")
+        with self._events_condition:
+            while not self._events:
+                remaining = limit - time.time()
+                if remaining <= 0:
+                    raise Exception("Event did not occur within timeout")
+                self._events_condition.wait(remaining)
+            e = self._events.popleft()
+        if name and type(e).__name__ != name:
+            raise Exception(
+                "Unexpected event received: %s, expected: %s" %
+                (type(e).__name__, name))
+        self.test_class.logger.debug("Returning event %s:%s" % (name, e))
+        return e
 
     def __call__(self, name, event):
         """ Enqueue event in the internal event queue. """
         # FIXME use the name instead of relying on type(e).__name__ ?
         # FIXME #2 if this throws, it is eaten silently, Ole?
         self.test_class.logger.debug("New event: %s: %s" % (name, event))
-        self._events.append(event)
+        with self._events_condition:
+            self._events.append(event)
+            self._events_condition.notify_all()
 
     def connect(self):
         """Connect the API to VPP"""
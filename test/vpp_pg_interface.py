@@ -1,11 +1,18 @@
+import ctypes
+import errno
 import os
+import select
 import time
 import socket
 import struct
 from traceback import format_exc, format_stack
-from scapy.utils import wrpcap, rdpcap, PcapReader
+from scapy.config import conf
+from scapy.packet import Raw
+from scapy.utils import wrpcap
 from scapy.plist import PacketList
 from vpp_interface import VppInterface
+from packet_stream import write_pcap
+import raw_capture
 
 from scapy.layers.l2 import Ether, ARP
 from scapy.layers.inet6 import IPv6, ICMPv6ND_NS, ICMPv6ND_NA,\
@@ -33,6 +40,251 @@ def is_ipv6_misc(p):
     return False
 
 
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+except (OSError, AttributeError):
+    _inotify_init1 = None
+
+# from linux/inotify.h
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+
+class FileWatch(object):
+    """
+    Wait for a file to change
+
+    The directory of the file is watched with inotify, so that waiting takes
+    no CPU and ends as soon as the file is written. Where inotify isn't
+    available, the condition is polled with a delay growing from 1ms to 50ms.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._name = os.path.basename(path).encode('utf8')
+        self._fd = None
+        if _inotify_init1 is None:
+            return
+        fd = _inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+            IN_CREATE | IN_DELETE
+        directory = os.path.dirname(path) or "."
+        if _inotify_add_watch(fd, directory.encode('utf8'), mask) < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        # backstop for the watches which aren't closed explicitly
+        self.close()
+
+    def _read_events(self):
+        """ Read the queued events
+
+        :returns: True if one of them is about the watched file
+        """
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return changed
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = struct.unpack(
+                    "iIII", data[offset:offset + 16])
+                name = data[offset + 16:offset + 16 + length]
+                if name.split(b'\0', 1)[0] == self._name:
+                    changed = True
+                offset += 16 + length
+
+    def wait(self, condition, deadline):
+        """ Wait until a condition holds
+
+        :param condition: function checking the condition, called whenever
+                          the file changes
+        :param deadline: time to stop waiting at
+        :returns: the last value returned by condition
+        """
+        delay = 0.001
+        while True:
+            result = condition()
+            now = time.time()
+            if result or now >= deadline:
+                return result
+            if self._fd is None:
+                time.sleep(min(delay, deadline - now))
+                delay = min(delay * 2, 0.05)
+                continue
+            # events queued since the condition was checked wake us up
+            # right away, others are about other files in the directory
+            while now < deadline:
+                if select.select([self._fd], [], [], deadline - now)[0] and \
+                        self._read_events():
+                    break
+                now = time.time()
+
+
+class CaptureReader(object):
+    """
+    Incremental reader of a pcap file being written by VPP
+
+    Remembers how far the file was read and parses only the records appended
+    since the previous read. The frames are dissected by scapy when the
+    packets are first asked for, so polling a growing capture costs at most
+    one dissection per packet.
+    """
+
+    #: size of the pcap file header
+    file_header_size = 24
+    #: size of the header of a pcap record
+    record_header_size = 16
+
+    def __init__(self, path):
+        self.path = path
+        #: all the frames read so far, as bytes
+        self.frames = []
+        self._times = []
+        self._packets = []
+        self._file = None
+        self._inode = None
+        self._endian = None
+        self._packet_class = None
+        self._pending = b''
+        self._position = 0
+        self._watch = FileWatch(path)
+
+    def _open(self):
+        """ Open the file and parse its header
+
+        :returns: True if the file has a complete header
+        """
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return False
+        header = f.read(self.file_header_size)
+        if len(header) < self.file_header_size:
+            f.close()
+            self._position = len(header)
+            return False
+        magic = header[:4]
+        if magic == b'\xd4\xc3\xb2\xa1':
+            self._endian = '<'
+        elif magic == b'\xa1\xb2\xc3\xd4':
+            self._endian = '>'
+        else:
+            f.close()
+            raise Exception("%s is not a pcap file" % self.path)
+        linktype = struct.unpack(self._endian + "I", header[20:24])[0]
+        self._packet_class = conf.l2types.get(linktype, Raw)
+        self._inode = os.fstat(f.fileno()).st_ino
+        self._file = f
+        self._position = f.tell()
+        return True
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._close_file()
+        self._watch.close()
+
+    def reset(self):
+        """ Forget everything read, the file is read again from its start """
+        self._close_file()
+        self.frames = []
+        self._times = []
+        self._packets = []
+        self._pending = b''
+        self._position = 0
+
+    def read(self):
+        """ Read the records appended to the file since the previous read
+
+        :returns: number of the new frames
+        """
+        try:
+            if self._file is not None and \
+                    os.stat(self.path).st_ino != self._inode:
+                # capture restarted in a new file
+                self.reset()
+        except OSError:
+            return 0
+        if self._file is None and not self._open():
+            return 0
+        data = self._pending + self._file.read()
+        self._position = self._file.tell()
+        count = len(self.frames)
+        offset = 0
+        while len(data) - offset >= self.record_header_size:
+            sec, usec, caplen, wirelen = struct.unpack(
+                self._endian + "IIII",
+                data[offset:offset + self.record_header_size])
+            start = offset + self.record_header_size
+            if len(data) < start + caplen:
+                break
+            self.frames.append(data[start:start + caplen])
+            self._times.append(sec + usec / 1000000.0)
+            offset = start + caplen
+        self._pending = data[offset:]
+        return len(self.frames) - count
+
+    def dissect(self, frame):
+        """ Return a frame dissected by scapy """
+        return self._packet_class(frame)
+
+    @property
+    def packets(self):
+        """ All the packets read so far, dissected when first asked for """
+        for i in range(len(self._packets), len(self.frames)):
+            p = self.dissect(self.frames[i])
+            p.time = self._times[i]
+            self._packets.append(p)
+        return self._packets
+
+    def _has_data(self):
+        try:
+            return os.path.getsize(self.path) != self._position
+        except OSError:
+            return False
+
+    def wait_for_data(self, deadline):
+        """ Wait until the file holds data which wasn't read yet
+
+        :param deadline: time to stop waiting at
+        :returns: True if there is new data, False on timeout
+        """
+        return self._watch.wait(self._has_data, deadline)
+
+    def wait_for_file(self, deadline):
+        """ Wait until the file exists
+
+        :param deadline: time to stop waiting at
+        :returns: True if the file exists, False on timeout
+        """
+        return self._watch.wait(lambda: os.path.isfile(self.path), deadline)
+
+
 class VppPGInterface(VppInterface):
     """
     VPP packet-generator interface
@@ -93,6 +345,7 @@ class VppPGInterface(VppInterface):
         self._out_history_counter = 0
         self._out_assert_counter = 0
         self._pg_index = pg_index
+        self._capture_reader = None
         self._out_file = "pg%u_out.pcap" % self.pg_index
         self._out_path = self.test.tempdir + "/" + self._out_file
         self._in_file = "pg%u_in.pcap" % self.pg_index
@@ -121,13 +374,29 @@ class VppPGInterface(VppInterface):
             pass
         # FIXME this should be an API, but no such exists atm
         self.test.vapi.cli(self.capture_cli)
-        self._pcap_reader = None
+        self._new_capture_reader()
+
+    def _new_capture_reader(self):
+        """ Start reading the capture from its beginning """
+        if self._capture_reader is not None:
+            self._capture_reader.close()
+        self._capture_reader = CaptureReader(self.out_path)
+        self._capture_filter = None
+        self._raw_capture_filter = None
+        self._next_packet = 0
+
+    def close_capture(self):
+        """ Close the capture file and its watch """
+        if self._capture_reader is not None:
+            self._capture_reader.close()
+            self._capture_reader = None
 
     def add_stream(self, pkts):
         """
         Add a stream of packets to this packet-generator
 
-        :param pkts: iterable packets
+        :param pkts: iterable packets, scapy packets or serialized packets
+                     (bytes) as generated by packet_stream.PacketTemplate
 
         """
         try:
@@ -143,7 +412,11 @@ class VppPGInterface(VppInterface):
                 os.rename(self.in_path, name)
         except:
             pass
-        wrpcap(self.in_path, pkts)
+        if isinstance(pkts, (list, tuple)) and pkts and \
+                isinstance(pkts[0], (bytes, bytearray)):
+            write_pcap(self.in_path, pkts)
+        else:
+            wrpcap(self.in_path, pkts)
         self.test.register_capture(self.cap_name)
         # FIXME this should be an API, but no such exists atm
         self.test.vapi.cli(self.input_cli)
@@ -165,25 +438,79 @@ class VppPGInterface(VppInterface):
         self._out_assert_counter += 1
 
     def _get_capture(self, timeout, filter_out_fn=is_ipv6_misc):
-        """ Helper method to get capture and filter it """
+        """ Helper method to get capture and filter it
+
+        Only the packets captured since the previous call are parsed and
+        filtered, the earlier ones are kept from the previous calls.
+        """
         try:
             if not self.wait_for_capture_file(timeout):
                 return None
-            output = rdpcap(self.out_path)
-            self.test.logger.debug("Capture has %s packets" % len(output.res))
+            reader = self._capture_reader
+            reader.read()
+            self.test.logger.debug("Capture has %s packets" %
+                                   len(reader.packets))
         except:
-            self.test.logger.debug("Exception in scapy.rdpcap (%s): %s" %
+            self.test.logger.debug("Exception reading capture (%s): %s" %
                                    (self.out_path, format_exc()))
             return None
-        before = len(output.res)
+        # packets kept by the filter: (filter, packets checked, packets kept)
+        if self._capture_filter is not None and \
+                self._capture_filter[0] is filter_out_fn and \
+                self._capture_filter[1] <= len(reader.packets):
+            checked, kept = self._capture_filter[1:]
+        else:
+            checked, kept = 0, []
+        new = reader.packets[checked:]
         if filter_out_fn:
-            output.res = [p for p in output.res if not filter_out_fn(p)]
-        removed = before - len(output.res)
+            new = [p for p in new if not filter_out_fn(p)]
+        kept.extend(new)
+        self._capture_filter = (filter_out_fn, len(reader.packets), kept)
+        removed = len(reader.packets) - len(kept)
+        if removed:
+            self.test.logger.debug(
+                "Filtered out %s packets from capture (returning %s)" %
+                (removed, len(kept)))
+        return PacketList(list(kept), name=os.path.basename(self.out_path))
+
+    def _get_raw_capture(self, timeout, filter_out_fn=is_ipv6_misc):
+        """ Helper method to get the captured frames and filter them
+
+        Only the frames captured since the previous call are filtered. With
+        the default filter, only the IPv6 frames are dissected.
+        """
+        try:
+            if not self.wait_for_capture_file(timeout):
+                return None
+            reader = self._capture_reader
+            reader.read()
+            self.test.logger.debug("Capture has %s packets" %
+                                   len(reader.frames))
+        except:
+            self.test.logger.debug("Exception reading capture (%s): %s" %
+                                   (self.out_path, format_exc()))
+            return None
+        if self._raw_capture_filter is not None and \
+                self._raw_capture_filter[0] is filter_out_fn and \
+                self._raw_capture_filter[1] <= len(reader.frames):
+            checked, kept = self._raw_capture_filter[1:]
+        else:
+            checked, kept = 0, []
+        new = reader.frames[checked:]
+        if filter_out_fn is is_ipv6_misc:
+            new = [f for f in new if IPv6 not in raw_capture.parse(f)[0] or
+                   not filter_out_fn(reader.dissect(f))]
+        elif filter_out_fn:
+            new = [f for f in new if not filter_out_fn(reader.dissect(f))]
+        kept.extend(new)
+        self._raw_capture_filter = (filter_out_fn, len(reader.frames), kept)
+        removed = len(reader.frames) - len(kept)
         if removed:
             self.test.logger.debug(
                 "Filtered out %s packets from capture (returning %s)" %
-                (removed, len(output.res)))
-        return output
+                (removed, len(kept)))
+        return raw_capture.RawCapture(list(kept),
+                                      name=os.path.basename(self.out_path))
 
     def get_capture(self, expected_count=None, remark=None, timeout=1,
                     filter_out_fn=is_ipv6_misc):
@@ -198,7 +525,31 @@ class VppPGInterface(VppInterface):
                               the filter returns True are removed from capture
         :returns: iterable packets
         """
-        remaining_time = timeout
+        return self._wait_for_capture(self._get_capture, PacketList,
+                                      expected_count, remark, timeout,
+                                      filter_out_fn)
+
+    def get_raw_capture(self, expected_count=None, remark=None, timeout=1,
+                        filter_out_fn=is_ipv6_misc):
+        """ Get captured packets without dissecting them
+
+        Same as get_capture, but returns a RawCapture, whose fields and
+        checksums are verified on the raw frames.
+
+        :returns: raw_capture.RawCapture
+        """
+        return self._wait_for_capture(self._get_raw_capture,
+                                      raw_capture.RawCapture,
+                                      expected_count, remark, timeout,
+                                      filter_out_fn)
+
+    def _wait_for_capture(self, get, empty, expected_count, remark, timeout,
+                          filter_out_fn):
+        """ Wait until the expected number of packets is captured
+
+        :param get: method getting the capture
+        :param empty: class of the capture returned when nothing is expected
+        """
         capture = None
         name = self.name if remark is None else "%s (%s)" % (self.name, remark)
         based_on = "based on provided argument"
@@ -212,32 +563,39 @@ class VppPGInterface(VppInterface):
                     name)
         self.test.logger.debug("Expecting to capture %s (%s) packets on %s" % (
             expected_count, based_on, name))
-        while remaining_time > 0:
-            before = time.time()
-            capture = self._get_capture(remaining_time, filter_out_fn)
-            elapsed_time = time.time() - before
+        deadline = time.time() + timeout
+        while True:
+            capture = get(max(deadline - time.time(), 0), filter_out_fn)
             if capture:
-                if len(capture.res) == expected_count:
+                if len(capture) == expected_count:
                     # bingo, got the packets we expected
                     return capture
-                elif len(capture.res) > expected_count:
-                    self.test.logger.error(
-                        ppc("Unexpected packets captured:", capture))
+                elif len(capture) > expected_count:
+                    if isinstance(capture, raw_capture.RawCapture):
+                        self.test.logger.error(capture.report(
+                            "Unexpected packets captured:",
+                            range(len(capture))))
+                    else:
+                        self.test.logger.error(
+                            ppc("Unexpected packets captured:", capture))
                     break
                 else:
                     self.test.logger.debug("Partial capture containing %s "
                                            "packets doesn't match expected "
                                            "count %s (yet?)" %
-                                           (len(capture.res), expected_count))
+                                           (len(capture), expected_count))
             elif expected_count == 0:
                 # bingo, got None as we expected - return empty capture
-                return PacketList()
-            remaining_time -= elapsed_time
+                return empty([])
+            # wait for VPP to append more packets to the capture
+            if self._capture_reader is None or \
+                    not self._capture_reader.wait_for_data(deadline):
+                break
         if capture:
             self.generate_debug_aid("count-mismatch")
             raise Exception("Captured packets mismatch, captured %s packets, "
                             "expected %s packets on %s" %
-                            (len(capture.res), expected_count, name))
+                            (len(capture), expected_count, name))
         else:
             raise Exception("No packets captured on %s" % name)
 
@@ -275,6 +633,8 @@ class VppPGInterface(VppInterface):
         :returns: True/False if the file is present or appears within timeout
         """
         deadline = time.time() + timeout
+        if self._capture_reader is None:
+            self._new_capture_reader()
         if not os.path.isfile(self.out_path):
             self.test.logger.debug("Waiting for capture file %s to appear, "
                                    "timeout is %ss" % (self.out_path, timeout))
@@ -282,11 +642,7 @@ class VppPGInterface(VppInterface):
             self.test.logger.debug("Capture file %s already exists" %
                                    self.out_path)
             return True
-        while time.time() < deadline:
-            if os.path.isfile(self.out_path):
-                break
-            time.sleep(0)  # yield
-        if os.path.isfile(self.out_path):
+        if self._capture_reader.wait_for_file(deadline):
             self.test.logger.debug("Capture file appeared after %fs" %
                                    (time.time() - (deadline - timeout)))
         else:
@@ -294,31 +650,6 @@ class VppPGInterface(VppInterface):
             return False
         return True
 
-    def verify_enough_packet_data_in_pcap(self):
-        """
-        Check if enough data is available in file handled by internal pcap
-        reader so that a whole packet can be read.
-
-        :returns: True if enough data present, else False
-        """
-        orig_pos = self._pcap_reader.f.tell()  # save file position
-        enough_data = False
-        # read packet header from pcap
-        packet_header_size = 16
-        caplen = None
-        end_pos = None
-        hdr = self._pcap_reader.f.read(packet_header_size)
-        if len(hdr) == packet_header_size:
-            # parse the capture length - caplen
-            sec, usec, caplen, wirelen = struct.unpack(
-                self._pcap_reader.endian + "IIII", hdr)
-            self._pcap_reader.f.seek(0, 2)  # seek to end of file
-            end_pos = self._pcap_reader.f.tell()  # get position at end
-            if end_pos >= orig_pos + len(hdr) + caplen:
-                enough_data = True  # yay, we have enough data
-        self._pcap_reader.f.seek(orig_pos, 0)  # restore original position
-        return enough_data
-
     def wait_for_packet(self, timeout, filter_out_fn=is_ipv6_misc):
         """
         Wait for next packet captured with a timeout
@@ -329,35 +660,27 @@ class VppPGInterface(VppInterface):
         :raises Exception: if no packet arrives within timeout
         """
         deadline = time.time() + timeout
-        if self._pcap_reader is None:
-            if not self.wait_for_capture_file(timeout):
-                raise CaptureTimeoutError("Capture file %s did not appear "
-                                          "within timeout" % self.out_path)
-            while time.time() < deadline:
-                try:
-                    self._pcap_reader = PcapReader(self.out_path)
-                    break
-                except:
-                    self.test.logger.debug(
-                        "Exception in scapy.PcapReader(%s): %s" %
-                        (self.out_path, format_exc()))
-        if not self._pcap_reader:
+        if not self.wait_for_capture_file(timeout):
             raise CaptureTimeoutError("Capture file %s did not appear within "
                                       "timeout" % self.out_path)
+        reader = self._capture_reader
 
-        poll = False
         if timeout > 0:
             self.test.logger.debug("Waiting for packet")
         else:
-            poll = True
             self.test.logger.debug("Polling for packet")
-        while time.time() < deadline or poll:
-            if not self.verify_enough_packet_data_in_pcap():
-                time.sleep(0)  # yield
-                poll = False
-                continue
-            p = self._pcap_reader.recv()
-            if p is not None:
+        while True:
+            try:
+                reader.read()
+            except:
+                self.test.logger.debug("Exception reading capture (%s): %s" %
+                                       (self.out_path, format_exc()))
+            if self._next_packet > len(reader.packets):
+                # the capture file was replaced
+                self._next_packet = 0
+            while self._next_packet < len(reader.packets):
+                p = reader.packets[self._next_packet]
+                self._next_packet += 1
                 if filter_out_fn is not None and filter_out_fn(p):
                     self.test.logger.debug(
                         "Packet received after %ss was filtered out" %
@@ -367,8 +690,8 @@ class VppPGInterface(VppInterface):
                         "Packet received after %fs" %
                         (time.time() - (deadline - timeout)))
                     return p
-            time.sleep(0)  # yield
-            poll = False
+            if not reader.wait_for_data(deadline):
+                break
         self.test.logger.debug("Timeout - no packets received")
         raise CaptureTimeoutError("Packet didn't arrive within timeout")
 
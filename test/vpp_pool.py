@@ -0,0 +1,352 @@
+""" pool of running VPP instances leased by test classes
+
+Starting VPP, loading the API definitions and waiting for the stats socket
+is a large part of the time a test class takes. When the test runner is
+asked for a pool (VPP_POOL_SIZE), it exports VPP_POOL_DIR and test classes
+lease a running VPP from it instead of starting their own. Each slot of the
+pool is a directory holding:
+
+  lock              - locked by the test process leasing the slot
+  info.json         - pid, shm prefix and command line signature of the VPP,
+                      whether it is leased and the state of the VPP after
+                      startup
+  vpp_stdout.txt    - VPP output, the leasing class reads what it appends
+  vpp_stderr.txt
+
+A VPP is only leased to a class starting VPP with the same command line,
+apart from the per-instance values (runtime directory, shm prefix, stats
+socket and main core). The leasing class resets the VPP when done, the
+instance is killed instead when the reset fails, leaves state which differs
+from the state after startup, or VPP died. A VPP still
+marked as leased when its slot is locked again was not reset, because its
+test process died or was killed, and is killed as well.
+"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import time
+
+import psutil
+
+from util import get_core_path, is_core_present
+
+pool_dir_env = 'VPP_POOL_DIR'
+pool_size_env = 'VPP_POOL_SIZE'
+
+
+def pool_dir():
+    """ Return the pool directory or None if pooling is disabled """
+    return os.getenv(pool_dir_env)
+
+
+def pool_size():
+    try:
+        return int(os.getenv(pool_size_env, "0"))
+    except ValueError:
+        return 0
+
+
+def signature(cmdline, private):
+    """ Hash of a VPP command line without the per-instance values
+
+    :param cmdline: VPP command line
+    :param private: arguments private to the instance
+    """
+    args = []
+    for i, arg in enumerate(cmdline):
+        if arg in private or (i > 0 and cmdline[i - 1] == "main-core"):
+            arg = "-"
+        args.append(arg)
+    return hashlib.sha1(" ".join(args).encode('utf8')).hexdigest()
+
+
+def _alive(info):
+    """ Is the VPP described by info still running """
+    try:
+        p = psutil.Process(info['pid'])
+        return p.create_time() == info['create_time'] and \
+            p.status() != psutil.STATUS_ZOMBIE
+    except (psutil.Error, KeyError, TypeError):
+        return False
+
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        return
+    try:
+        # reap it if it is our child, wait for it to go away otherwise
+        os.waitpid(pid, 0)
+    except OSError:
+        try:
+            psutil.Process(pid).wait(5)
+        except (psutil.Error, psutil.TimeoutExpired):
+            pass
+
+
+class VppPoolProcess(object):
+    """ Popen-like handle of a pooled VPP
+
+    The process is not necessarily a child of the leasing process and its
+    output goes to files, which are read from the end they had when leased.
+    """
+
+    def __init__(self, info, stdout_path, stderr_path, offsets=None):
+        self.pid = info['pid']
+        self.returncode = None
+        self._info = info
+        self.stdout = open(stdout_path, 'rb')
+        self.stderr = open(stderr_path, 'rb')
+        if offsets is None:
+            self.stdout.seek(0, os.SEEK_END)
+            self.stderr.seek(0, os.SEEK_END)
+        else:
+            self.stdout.seek(offsets[0])
+            self.stderr.seek(offsets[1])
+
+    def poll(self):
+        if self.returncode is None and not _alive(self._info):
+            self.returncode = -1
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+                if pid and os.WIFSIGNALED(status):
+                    self.returncode = -os.WTERMSIG(status)
+                elif pid:
+                    self.returncode = os.WEXITSTATUS(status)
+            except OSError:
+                pass
+        return self.returncode
+
+    def kill(self):
+        if self.poll() is None:
+            _kill(self.pid)
+            self.returncode = -signal.SIGKILL
+
+    terminate = kill
+
+    def communicate(self):
+        while self.poll() is None:
+            time.sleep(0.1)
+        self.close()
+        return None, None
+
+    def close(self):
+        self.stdout.close()
+        self.stderr.close()
+
+
+class VppPoolInstance(object):
+    """ Slot of the pool leased by a test class """
+
+    def __init__(self, directory, lock, info):
+        self.directory = directory
+        self.shm_prefix = "%s-%s" % (os.path.basename(pool_dir()),
+                                     os.path.basename(directory))
+        self.stats_sock = "%s/stats.sock" % directory
+        self.stdout_path = "%s/vpp_stdout.txt" % directory
+        self.stderr_path = "%s/vpp_stderr.txt" % directory
+        self._lock = lock
+        self._info = info
+        self._core_link = None
+
+    @property
+    def running(self):
+        """ The slot holds a running VPP with the requested signature """
+        return self._info is not None
+
+    def process(self, offsets=None):
+        """ Return the handle of the running VPP
+
+        :param offsets: offsets the output files are read from (default is
+                        their end)
+        """
+        return VppPoolProcess(self._info, self.stdout_path, self.stderr_path,
+                              offsets)
+
+    def start(self, cmdline, sig, private):
+        """ Start VPP in this slot and return its handle
+
+        :param cmdline: VPP command line of the leasing class
+        :param sig: signature of the command line
+        :param private: per-instance arguments of the command line mapped to
+                        the values of this slot
+        """
+        cmdline = [private.get(arg, arg) for arg in cmdline]
+        offsets = [os.path.getsize(path) if os.path.exists(path) else 0
+                   for path in (self.stdout_path, self.stderr_path)]
+        with open(self.stdout_path, 'ab') as stdout, \
+                open(self.stderr_path, 'ab') as stderr:
+            # own session, so that the VPP outlives the test process
+            vpp = subprocess.Popen(cmdline, stdout=stdout, stderr=stderr,
+                                   cwd=self.directory, close_fds=True,
+                                   preexec_fn=os.setsid)
+        self._info = {'pid': vpp.pid, 'shm_prefix': self.shm_prefix,
+                      'stats_sock': self.stats_sock, 'signature': sig,
+                      'create_time': psutil.Process(vpp.pid).create_time()}
+        self._write_info(leased=True)
+        return self.process(offsets)
+
+    @property
+    def baseline(self):
+        """ State of the VPP after startup, None if not recorded yet """
+        return self._info.get('baseline')
+
+    def set_baseline(self, state):
+        """ Record the state of the VPP after startup
+
+        :param state: JSON serializable state, compared by the leasing
+                      classes when they reset the VPP
+        """
+        self._info['baseline'] = state
+        self._write_info(leased=True)
+
+    def _write_info(self, leased):
+        self._info['leased'] = leased
+        path = "%s/info.json" % self.directory
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self._info, f)
+        os.rename(path + ".tmp", path)
+
+    def link_core(self, tempdir):
+        """ Make a core file left by VPP appear in tempdir as well
+
+        :param tempdir: temporary directory of the leasing class
+        """
+        link = get_core_path(tempdir)
+        try:
+            os.symlink(get_core_path(self.directory), link)
+        except OSError:
+            return
+        self._core_link = link
+
+    def _unlink_core(self):
+        if self._core_link is not None:
+            if os.path.islink(self._core_link):
+                os.unlink(self._core_link)
+            self._core_link = None
+
+    def release(self):
+        """ Give the running VPP, reset by the leasing class, back to the
+        pool """
+        self._write_info(leased=False)
+        self._unlink_core()
+        self._unlock()
+
+    def discard(self, tempdir=None):
+        """ Kill the VPP of this slot and give the slot back to the pool
+
+        :param tempdir: directory a core file left by VPP is moved to
+        """
+        if self._lock is None:
+            return
+        self._unlink_core()
+        self._kill(tempdir)
+        self._unlock()
+
+    def _kill(self, tempdir=None):
+        if self._info is not None and _alive(self._info):
+            _kill(self._info['pid'])
+        _clear(self.directory)
+        if tempdir is not None and is_core_present(self.directory):
+            shutil.move(get_core_path(self.directory), get_core_path(tempdir))
+        self._info = None
+
+    def _unlock(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+
+def _clear(directory):
+    """ Forget the VPP of a slot """
+    for name in ("info.json", "stats.sock"):
+        try:
+            os.unlink("%s/%s" % (directory, name))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def _lock(directory):
+    """ Lock a slot, return the lock file or None if it is leased """
+    if not os.path.isdir(directory):
+        try:
+            os.mkdir(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    f = open("%s/lock" % directory, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        f.close()
+        return None
+    return f
+
+
+def _read_info(directory):
+    try:
+        with open("%s/info.json" % directory) as f:
+            info = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not _alive(info):
+        _clear(directory)
+        return None
+    if info.get('leased'):
+        # the leasing process went away without resetting the VPP
+        _kill(info['pid'])
+        _clear(directory)
+        return None
+    return info
+
+
+def lease(sig):
+    """ Lease a slot of the pool
+
+    Prefers a slot running a VPP with the requested signature, then an empty
+    slot and finally kills the VPP of an idle slot with another signature.
+
+    :param sig: signature of the VPP command line of the class
+    :returns: VppPoolInstance, or None if all the slots are leased
+    """
+    free = []
+    try:
+        for n in range(pool_size()):
+            directory = "%s/vpp-%d" % (pool_dir(), n)
+            lock = _lock(directory)
+            if lock is None:
+                continue
+            info = _read_info(directory)
+            if info is not None and info['signature'] == sig:
+                instance = VppPoolInstance(directory, lock, info)
+                instance._write_info(leased=True)
+                return instance
+            free.append((info is not None, directory, lock, info))
+        if not free:
+            return None
+        free.sort(key=lambda slot: slot[0])
+        running, directory, lock, info = free.pop(0)
+        instance = VppPoolInstance(directory, lock, info)
+        if running:
+            instance._kill()
+        return instance
+    finally:
+        for running, directory, lock, info in free:
+            lock.close()
+
+
+def shutdown(directory):
+    """ Kill the VPPs of a pool and remove its directory """
+    for name in os.listdir(directory):
+        info = _read_info("%s/%s" % (directory, name))
+        if info is not None:
+            _kill(info['pid'])
+    shutil.rmtree(directory, ignore_errors=True)